@@ -0,0 +1,186 @@
+"""In-process benchmark of the service handlers with each data backend.
+
+Calls the gRPC servicer methods (plus SerializeToString) and executes the
+GraphQL queries of locust/load_test.py against the Strawberry schema (plus the
+JSON encoding of the result), with no transport in between, so the numbers
+are the server-side cost of one request: fetch, object building, encoding.
+
+    python bench/backend_bench.py --backends sql jsonagg matview --requests 200
+
+For every service, backend and operation the script records Python CPU time
+per request (time.process_time, so Postgres' own CPU is not included), wall
+time per request, and the allocations of one request (tracemalloc peak bytes
+and allocs/op, the blocks still held by the response). Each service/backend pair runs in its
+own process, because the services pick their backend when imported.
+
+Needs the requirements of grpc/ and graphql/ and the same DB_* env vars the
+services use; the matview backend also needs the matview schema variant.
+Results go to bench/results/backends.json.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+sys.path.insert(0, ROOT)
+
+import proto_stubs
+from serialization_bench import measure_allocations
+
+proto_stubs.add_to_path()  # demo_pb2 for grpc/server.py
+
+DEFAULT_OUTPUT = os.path.join(ROOT, "bench", "results", "backends.json")
+SERVICES = {"grpc": "grpc/server.py", "graphql": "graphql/main.py"}
+BACKENDS = ["sql", "prepared", "psycopg", "jsonagg", "matview", "fixture"]
+GRPC_ONLY_BACKENDS = {"prepared", "psycopg"}
+
+# Same queries as GraphqlApiUser in locust/load_test.py
+GRAPHQL_QUERIES = {
+    "List Users": "{ users { id name } }",
+    "List Songs": "{ songs { id title } }",
+    "User Playlists": "{ userPlaylists(userId: %d) { id name } }",
+    "Playlist Songs": "{ playlistSongs(playlistId: %d) { id title } }",
+    "Playlists by Song": "{ playlistsBySong(songId: %d) { id name } }",
+}
+
+
+def load_module(name, relpath):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relpath))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module  # Strawberry resolves annotations through sys.modules
+    spec.loader.exec_module(module)
+    return module
+
+
+def grpc_operations(item_id):
+    import demo_pb2
+
+    server = load_module("grpc_server", SERVICES["grpc"])
+    service = server.UserService(server.make_backend(server.BACKENDS))
+    empty, by_id = demo_pb2.Empty(), demo_pb2.IdRequest(id=item_id)
+    calls = {
+        "GetAllUsers": (service.GetAllUsers, empty),
+        "GetAllSongs": (service.GetAllSongs, empty),
+        "GetUserPlaylists": (service.GetUserPlaylists, by_id),
+        "GetPlaylistSongs": (service.GetPlaylistSongs, by_id),
+        "GetPlaylistsBySong": (service.GetPlaylistsBySong, by_id),
+    }
+    return {
+        name: (lambda method=method, request=request: method(request, None).SerializeToString())
+        for name, (method, request) in calls.items()
+    }
+
+
+def graphql_operations(item_id):
+    main = load_module("graphql_main", SERVICES["graphql"])
+
+    def run(query):
+        result = main.schema.execute_sync(query)
+        if result.errors:
+            raise RuntimeError(result.errors[0])
+        return json.dumps({"data": result.data}).encode()
+
+    return {
+        name: (lambda query=(q % item_id if "%d" in q else q): run(query))
+        for name, q in GRAPHQL_QUERIES.items()
+    }
+
+
+def measure(name, fn, requests, warmup):
+    for _ in range(warmup):
+        fn()
+    cpu, wall = time.process_time(), time.perf_counter()
+    for _ in range(requests):
+        body = fn()
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    alloc = measure_allocations(fn)
+    return {
+        "operation": name,
+        "bytes": len(body),
+        "cpu_ms": 1000 * cpu / requests,
+        "wall_ms": 1000 * wall / requests,
+        **alloc,
+    }
+
+
+def worker(args):
+    """Runs in the child process; prints one JSON line with the results."""
+    operations = grpc_operations(args.id) if args.service == "grpc" else graphql_operations(args.id)
+    results = [measure(name, fn, args.requests, args.warmup) for name, fn in operations.items()]
+    print(json.dumps(results))
+
+
+def run_pair(service, backend, args):
+    cmd = [sys.executable, __file__, "--worker", service,
+           "--requests", str(args.requests), "--warmup", str(args.warmup), "--id", str(args.id)]
+    env = dict(os.environ, DATA_BACKEND=backend)
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"[bench] {service}/{backend} failed:\n{proc.stderr.strip()}")
+        return []
+    results = json.loads(proc.stdout.strip().splitlines()[-1])
+    for r in results:
+        r.update(service=service, backend=backend)
+    return results
+
+
+def print_table(results):
+    reference = {(r["service"], r["operation"]): r for r in results if r["backend"] == "sql"}
+    print(f"{'service':<8} {'backend':<8} {'operation':<19} {'bytes':>8} {'cpu ms':>8} {'wall ms':>8} "
+          f"{'peak KiB':>9} {'allocs':>8} {'cpu vs sql':>10}")
+    for r in results:
+        ref = reference.get((r["service"], r["operation"]))
+        ratio = f"{r['cpu_ms'] / ref['cpu_ms']:.2f}x" if ref else "-"
+        print(f"{r['service']:<8} {r['backend']:<8} {r['operation']:<19} {r['bytes']:>8} "
+              f"{r['cpu_ms']:>8.2f} {r['wall_ms']:>8.2f} {r['peak_alloc_bytes'] / 1024:>9.1f} "
+              f"{r['allocs_per_op']:>8.0f} {ratio:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--services", nargs="+", default=list(SERVICES), choices=list(SERVICES))
+    parser.add_argument("--backends", nargs="+", default=["sql", "jsonagg"], choices=BACKENDS)
+    parser.add_argument("--requests", type=int, default=100, help="timed requests per operation")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--id", type=int, default=1, help="user/playlist/song id, as in the Locust tests")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT, help="JSON file for the results")
+    parser.add_argument("--worker", choices=list(SERVICES), dest="service", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.service:
+        worker(args)
+        return 0
+
+    results = []
+    for service in args.services:
+        for backend in args.backends:
+            if backend in GRPC_ONLY_BACKENDS and service != "grpc":
+                continue
+            print(f"[bench] {service} / {backend}")
+            results.extend(run_pair(service, backend, args))
+    if not results:
+        return 1
+    print_table(results)
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "results": results,
+        }, f, indent=2)
+    print("[bench] Results written to", args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
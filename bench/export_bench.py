@@ -0,0 +1,222 @@
+"""Bulk-transfer benchmark: ExportTable (Arrow IPC) vs repeated protobuf messages.
+
+Pulls whole tables from a running gRPC server the two ways an analytics job
+can, and measures what the client pays for each:
+
+    songs           ExportTable("songs")           vs GetAllSongs
+    playlist_songs  ExportTable("playlist_songs")  vs GetPlaylistChanges from
+                    version 0 (paged, one message per row) and vs one
+                    GetPlaylistSongs call per playlist
+
+Every path ends with the rows in a usable form on the client: a pyarrow
+Table for Arrow, a list of row tuples for the message paths (read field by
+field from the decoded messages); --pandas goes on to a DataFrame for both.
+For each path the script records rows/s, wall time, client CPU
+(time.process_time, so the gRPC core threads are included and the server is
+not), and the bytes received. With --server-pid (a server on this host) it
+also records the CPU the server process spent on each path, read with psutil
+before and after every run (in clock ticks, 10 ms on Linux): the database
+fetch and encode that the client numbers leave out.
+
+    python bench/export_bench.py --target localhost:50051 --repeats 5
+    python bench/export_bench.py --server-pid "$(pgrep -f grpc/server.py)"
+
+The server needs a backend with a SQLAlchemy engine (DATA_BACKEND=sql,
+jsonagg or matview) and the pyarrow of grpc/requirements.txt. Results go to
+bench/results/export.json.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+import proto_stubs
+
+proto_stubs.add_to_path()
+
+import grpc
+import demo_pb2
+import demo_pb2_grpc
+import pyarrow as pa
+from common.arrow_export import read_export
+
+DEFAULT_OUTPUT = os.path.join(ROOT, "bench", "results", "export.json")
+TABLES = ["songs", "playlist_songs"]
+# the full sync of playlist_songs in few round trips (the server's maximum)
+CHANGES_LIMIT = 10000
+# 64 MB: GetAllSongs on a --scale'd dataset is past gRPC's 4 MB default
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+# =====================================================================
+# Paths
+# =====================================================================
+# each returns (client-side result, rows, bytes received)
+def arrow_path(stub, table, batch_rows):
+    def run():
+        chunks = [c.data for c in stub.ExportTable(demo_pb2.ExportRequest(table=table, batch_rows=batch_rows))]
+        result = read_export(chunks)
+        return result, result.num_rows, sum(map(len, chunks))
+    return run
+
+
+def all_songs_path(stub):
+    def run():
+        reply = stub.GetAllSongs(demo_pb2.Empty())
+        rows = [(s.id, s.title, s.artist) for s in reply.songs]
+        return rows, len(rows), reply.ByteSize()
+    return run
+
+
+def playlist_changes_path(stub):
+    def run():
+        rows, nbytes, since = [], 0, 0
+        while True:
+            reply = stub.GetPlaylistChanges(demo_pb2.ChangesRequest(since_version=since, limit=CHANGES_LIMIT))
+            nbytes += reply.ByteSize()
+            rows += [(c.playlist_id, c.song_id) for c in reply.songs]
+            since = reply.version
+            if not reply.has_more:
+                return rows, len(rows), nbytes
+    return run
+
+
+def per_playlist_path(stub, playlist_ids):
+    def run():
+        rows, nbytes = [], 0
+        for pid in playlist_ids:
+            reply = stub.GetPlaylistSongs(demo_pb2.IdRequest(id=pid))
+            nbytes += reply.ByteSize()
+            rows += [(pid, s.id) for s in reply.songs]
+        return rows, len(rows), nbytes
+    return run
+
+
+def paths_for(stub, table, args):
+    paths = {"arrow": arrow_path(stub, table, args.batch_rows)}
+    if table == "songs":
+        paths["GetAllSongs"] = all_songs_path(stub)
+    elif table == "playlist_songs":
+        paths["GetPlaylistChanges"] = playlist_changes_path(stub)
+        if not args.skip_per_playlist:
+            ids = read_export([c.data for c in stub.ExportTable(
+                demo_pb2.ExportRequest(table="playlists", columns=["id"]))]).column("id").to_pylist()
+            paths["GetPlaylistSongs x N"] = per_playlist_path(stub, ids)
+    return paths
+
+
+def to_pandas(result):
+    if isinstance(result, pa.Table):
+        return result.to_pandas()
+    import pandas as pd
+
+    return pd.DataFrame.from_records(result)
+
+
+# =====================================================================
+# Measurement
+# =====================================================================
+def cpu_seconds(process):
+    times = process.cpu_times()
+    return times.user + times.system
+
+
+def measure(run, repeats, pandas, server=None):
+    # warm-up: connection, server-side caches, pages in memory, and the lazy
+    # pandas import, which would otherwise land in the first timed run
+    result, _, _ = run()
+    if pandas:
+        to_pandas(result)
+    walls, cpus, server_cpus = [], [], []
+    for _ in range(repeats):
+        server_cpu = cpu_seconds(server) if server else None
+        cpu, wall = time.process_time(), time.perf_counter()
+        result, rows, nbytes = run()
+        if pandas:
+            to_pandas(result)
+        cpus.append(time.process_time() - cpu)
+        walls.append(time.perf_counter() - wall)
+        if server:
+            server_cpus.append(cpu_seconds(server) - server_cpu)
+    wall, cpu = statistics.median(walls), statistics.median(cpus)
+    server_cpu = statistics.median(server_cpus) if server_cpus else None
+    return {
+        "rows": rows,
+        "bytes": nbytes,
+        "wall_ms": 1000 * wall,
+        "cpu_ms": 1000 * cpu,
+        "rows_per_s": rows / wall if wall else None,
+        "cpu_us_per_row": 1e6 * cpu / rows if rows else None,
+        "server_cpu_ms": 1000 * server_cpu if server_cpu is not None else None,
+        "server_cpu_us_per_row": 1e6 * server_cpu / rows if server_cpu is not None and rows else None,
+    }
+
+
+def print_table(results):
+    reference = {r["table"]: r for r in results if r["path"] == "arrow"}
+    print(f"{'table':<15} {'path':<21} {'rows':>8} {'MB':>7} {'wall ms':>9} {'rows/s':>11} "
+          f"{'cpu ms':>9} {'us/row':>7} {'cpu vs arrow':>12} {'server ms':>10} {'srv us/row':>10}")
+    for r in results:
+        ref = reference.get(r["table"])
+        ratio = f"{r['cpu_ms'] / ref['cpu_ms']:.1f}x" if ref and ref["cpu_ms"] else "-"
+        server = (f"{r['server_cpu_ms']:>10.1f} {r['server_cpu_us_per_row']:>10.2f}"
+                  if r["server_cpu_ms"] is not None else f"{'-':>10} {'-':>10}")
+        print(f"{r['table']:<15} {r['path']:<21} {r['rows']:>8} {r['bytes'] / 1e6:>7.2f} {r['wall_ms']:>9.1f} "
+              f"{r['rows_per_s']:>11,.0f} {r['cpu_ms']:>9.1f} {r['cpu_us_per_row']:>7.2f} {ratio:>12} {server}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--target", default="localhost:50051", help="gRPC server")
+    parser.add_argument("--tables", nargs="+", default=TABLES, choices=TABLES)
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per path (median reported)")
+    parser.add_argument("--batch-rows", type=int, default=0, help="ExportTable batch size (0: server default)")
+    parser.add_argument("--pandas", action="store_true", help="also build a pandas DataFrame on the client")
+    parser.add_argument("--skip-per-playlist", action="store_true",
+                        help="skip the one-call-per-playlist path (slow on large datasets)")
+    parser.add_argument("--server-pid", type=int,
+                        help="pid of the gRPC server, to also measure its CPU per path (needs psutil)")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT, help="JSON file for the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    channel = grpc.insecure_channel(args.target, options=[("grpc.max_receive_message_length", MAX_MESSAGE_BYTES)])
+    grpc.channel_ready_future(channel).result(timeout=30)
+    stub = demo_pb2_grpc.UserServiceStub(channel)
+    server = None
+    if args.server_pid:
+        import psutil
+
+        server = psutil.Process(args.server_pid)
+
+    results = []
+    for table in args.tables:
+        for path, run in paths_for(stub, table, args).items():
+            print(f"[bench] {table} / {path}")
+            results.append({"table": table, "path": path, **measure(run, args.repeats, args.pandas, server)})
+    print_table(results)
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "pyarrow": pa.__version__,
+            "repeats": args.repeats,
+            "pandas": args.pandas,
+            "results": results,
+        }, f, indent=2)
+    print("[bench] Results written to", args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
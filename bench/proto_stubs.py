@@ -0,0 +1,35 @@
+"""demo_pb2 / demo_pb2_grpc for the bench scripts, which run on the host.
+
+The stubs are not committed: the gRPC and Locust images compile demo.proto
+at build time. Here they are compiled from locust/demo.proto into
+bench/.stubs/ on first use, and again whenever the proto is newer, so the
+benchmarks always match the proto the services are built from.
+
+    import proto_stubs
+    proto_stubs.add_to_path()
+    import demo_pb2
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROTO = os.path.join(ROOT, "locust", "demo.proto")
+STUBS_DIR = os.path.join(ROOT, "bench", ".stubs")
+
+
+def compile_stubs(proto=PROTO, out=STUBS_DIR):
+    target = os.path.join(out, "demo_pb2_grpc.py")
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(proto):
+        return out
+    os.makedirs(out, exist_ok=True)
+    subprocess.run([sys.executable, "-m", "grpc_tools.protoc", f"-I{os.path.dirname(proto)}",
+                    f"--python_out={out}", f"--grpc_python_out={out}", proto],
+                   check=True)
+    return out
+
+
+def add_to_path():
+    out = compile_stubs()
+    if out not in sys.path:
+        sys.path.insert(0, out)
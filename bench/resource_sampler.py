@@ -0,0 +1,275 @@
+"""Samples CPU, memory, context switches and Postgres connections of the
+benchmark containers while a Locust run is in progress.
+
+Reads cgroup and /proc counters from the host, so it has to run on the Docker
+host (Linux) next to the Locust run. Targets are given as docker container
+names, resolved through `docker inspect`, or as NAME=PID pairs:
+
+    python bench/resource_sampler.py --service grpc-api --postgres demo_postgres \
+        --out testes-locust/grpc-50-recursos.csv
+
+Stops on SIGINT/SIGTERM or after --duration seconds. Counters are written raw
+(cumulative CPU seconds, context switches and network bytes); graficos_locust.py
+turns them into rates. Network bytes are those of the target's network
+namespace (the container's own interfaces; the whole host for a NAME=PID
+target outside a container), loopback excluded.
+"""
+import argparse
+import csv
+import glob
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+# "postgres: demo demo 172.18.0.3(45678) idle" -> client backend
+PG_BACKEND_RE = re.compile(r"^postgres: \S+ \S+ (\S+\(\d+\)|\[local\]) ?(.*)$")
+
+FIELDS = [
+    "timestamp", "target", "role", "cpu_seconds", "mem_bytes", "rss_bytes",
+    "ctx_switches", "processes", "pg_connections", "pg_active",
+    "net_rx_bytes", "net_tx_bytes",
+]
+
+
+def resolve_container_pid(name):
+    out = subprocess.run(
+        ["docker", "inspect", "-f", "{{.State.Pid}}", name],
+        check=True, capture_output=True, text=True,
+    )
+    pid = int(out.stdout.strip())
+    if pid <= 0:
+        raise RuntimeError(f"container {name} is not running")
+    return pid
+
+
+def cgroup_paths(pid):
+    """Returns {controller: absolute path} for the cgroup of pid (v1 and v2).
+
+    Controllers where the process sits in the root cgroup are left out: their
+    counters cover the whole host, not the container.
+    """
+    paths = {}
+    with open(f"/proc/{pid}/cgroup") as f:
+        for line in f:
+            _, controllers, rel = line.rstrip("\n").split(":", 2)
+            if rel == "/":
+                continue
+            if controllers == "":
+                paths["unified"] = os.path.join(CGROUP_ROOT, rel.lstrip("/"))
+            for c in controllers.split(","):
+                if c:
+                    paths[c] = os.path.join(CGROUP_ROOT, c, rel.lstrip("/"))
+    return paths
+
+
+def read_int(path):
+    try:
+        with open(path) as f:
+            return int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Target:
+    def __init__(self, name, role, root_pid):
+        self.name = name
+        self.role = role
+        self.root_pid = root_pid
+        self.cgroups = cgroup_paths(root_pid)
+
+    def pids(self):
+        for key in ("unified", "cpu", "cpuacct", "memory"):
+            path = self.cgroups.get(key)
+            if path and os.path.exists(os.path.join(path, "cgroup.procs")):
+                with open(os.path.join(path, "cgroup.procs")) as f:
+                    pids = [int(p) for p in f.read().split()]
+                if pids:
+                    return pids
+        return [self.root_pid] + self._children(self.root_pid)
+
+    def _children(self, pid):
+        found = []
+        for path in glob.glob(f"/proc/{pid}/task/*/children"):
+            try:
+                with open(path) as f:
+                    kids = [int(p) for p in f.read().split()]
+            except OSError:
+                continue
+            for kid in kids:
+                found.append(kid)
+                found.extend(self._children(kid))
+        return found
+
+    def cpu_seconds(self, pids):
+        unified = self.cgroups.get("unified")
+        if unified:
+            try:
+                with open(os.path.join(unified, "cpu.stat")) as f:
+                    for line in f:
+                        key, value = line.split()
+                        if key == "usage_usec":
+                            return int(value) / 1e6
+            except OSError:
+                pass
+        if "cpuacct" in self.cgroups:
+            usage_ns = read_int(os.path.join(self.cgroups["cpuacct"], "cpuacct.usage"))
+            if usage_ns is not None:
+                return usage_ns / 1e9
+
+        ticks = 0
+        for pid in pids:
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                ticks += int(fields[11]) + int(fields[12])
+            except (OSError, IndexError, ValueError):
+                continue
+        return ticks / CLK_TCK
+
+    def mem_bytes(self):
+        unified = self.cgroups.get("unified")
+        if unified:
+            value = read_int(os.path.join(unified, "memory.current"))
+            if value is not None:
+                return value
+        if "memory" in self.cgroups:
+            return read_int(os.path.join(self.cgroups["memory"], "memory.usage_in_bytes"))
+        return None
+
+    def sample(self):
+        pids = self.pids()
+        rss = 0
+        ctx = 0
+        pg_connections = 0
+        pg_active = 0
+        alive = 0
+
+        for pid in pids:
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            rss += int(line.split()[1]) * 1024
+                for status in glob.glob(f"/proc/{pid}/task/*/status"):
+                    with open(status) as f:
+                        for line in f:
+                            if line.startswith(("voluntary_ctxt_switches", "nonvoluntary_ctxt_switches")):
+                                ctx += int(line.split()[1])
+                alive += 1
+            except OSError:
+                continue
+
+            if self.role == "postgres":
+                try:
+                    with open(f"/proc/{pid}/cmdline", "rb") as f:
+                        title = f.read().replace(b"\0", b" ").decode(errors="replace").strip()
+                except OSError:
+                    continue
+                m = PG_BACKEND_RE.match(title)
+                if m:
+                    pg_connections += 1
+                    if not m.group(2).startswith("idle"):
+                        pg_active += 1
+
+        net_rx, net_tx = read_net_bytes(self.root_pid)
+        return {
+            "target": self.name,
+            "role": self.role,
+            "cpu_seconds": round(self.cpu_seconds(pids), 4),
+            "mem_bytes": self.mem_bytes(),
+            "rss_bytes": rss,
+            "ctx_switches": ctx,
+            "processes": alive,
+            "pg_connections": pg_connections if self.role == "postgres" else "",
+            "pg_active": pg_active if self.role == "postgres" else "",
+            "net_rx_bytes": net_rx,
+            "net_tx_bytes": net_tx,
+        }
+
+
+def read_net_bytes(pid):
+    """(received, sent) bytes of the network namespace of pid, lo excluded."""
+    rx = tx = 0
+    try:
+        with open(f"/proc/{pid}/net/dev") as f:
+            for line in f.readlines()[2:]:
+                iface, counters = line.split(":", 1)
+                if iface.strip() == "lo":
+                    continue
+                fields = counters.split()
+                rx += int(fields[0])
+                tx += int(fields[8])
+    except (OSError, ValueError, IndexError):
+        return None, None
+    return rx, tx
+
+
+def build_target(spec, role):
+    if "=" in spec:
+        name, pid = spec.split("=", 1)
+        return Target(name, role, int(pid))
+    return Target(spec, role, resolve_container_pid(spec))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--service", action="append", default=[],
+                        help="service container name or NAME=PID (repeatable)")
+    parser.add_argument("--postgres", action="append", default=[],
+                        help="postgres container name or NAME=PID")
+    parser.add_argument("--out", required=True, help="CSV file to write")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between samples")
+    parser.add_argument("--duration", type=float, default=None, help="stop after N seconds")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    targets = [build_target(s, "service") for s in args.service]
+    targets += [build_target(s, "postgres") for s in args.postgres]
+    if not targets:
+        print("[sampler] Nothing to sample: pass --service and/or --postgres")
+        return 2
+
+    running = True
+
+    def stop(signum, frame):
+        nonlocal running
+        running = False
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    started = time.monotonic()
+    next_tick = started
+
+    with open(args.out, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        while running:
+            now = time.time()
+            for target in targets:
+                try:
+                    writer.writerow({"timestamp": round(now, 3), **target.sample()})
+                except OSError as e:
+                    print(f"[sampler] {target.name}: {e}")
+            f.flush()
+
+            if args.duration is not None and time.monotonic() - started >= args.duration:
+                break
+            next_tick += args.interval
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+
+    print(f"[sampler] Samples written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+"""Runs the Locust scenarios from the README end to end, one technology at a
+time, with the resource sampler running next to every load level.
+
+    python bench/run_benchmark.py --techs grpc graphql --loads 50:1m 200:2m
+
+Each run lands in testes-locust/runs/<timestamp>/ using the same file names as
+the committed results (<tech>-<users>.csv), plus <tech>-<users>-recursos.csv
+from the sampler and <tech>-<users>-metricas.csv with the per-phase server
+times of the Python services, and finishes by calling graficos_locust.py on that folder.
+Must run on the Docker host, from the repository root.
+
+With --schema-variants the whole battery is repeated once per schema variant
+(db/variants/<name>.sql, applied to the running database with psql), each into
+runs/<timestamp>/<variant>/, and graficos_locust.py --variantes compares them.
+--pool-configs does the same for connection pool sizes of the Python services
+(runs/<timestamp>/pool-<size>-<overflow>[-<workers>]/), and --transport-modes
+for the compression and channel settings of common/transport.py
+(runs/<timestamp>/<mode>/): the service and the Locust client get the same
+env, the sampler records the bytes the service sends, and the comparison
+puts KB sent per request next to service CPU per request and p95.
+--write-shares runs the mixed read/write workload of load_test.py once per
+share of playlist edits (runs/<timestamp>/escrita-<pct>/, gRPC and GraphQL
+only); the comparison shows how the playlist-read latency degrades as the
+share grows. The edits stay in the database: recreate the postgres volume to
+get back to db/init.sql.
+
+With --profile-peak SECONDS the Python services start with PROFILING=1 and,
+halfway through the highest load level, their /debug/profile endpoint
+(common/profiling.py) is called for SECONDS: <tech>-<users>-perfil.json
+(stacks and tracemalloc top allocations) and <tech>-<users>-perfil.folded
+(collapsed stacks for flamegraph.pl / speedscope).
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "testes-locust")
+SAMPLER = os.path.join(ROOT, "bench", "resource_sampler.py")
+REPORT = os.path.join(RESULTS_DIR, "graficos_locust.py")
+
+# tech -> (compose service, container name)
+SERVICES = {
+    "rest": ("rest-service", "rest-api"),
+    "soap": ("soap-service", "soap-api"),
+    "graphql": ("graphql-service", "graphql-api"),
+    "grpc": ("grpc-service", "grpc-api"),
+}
+POSTGRES_CONTAINER = "demo_postgres"
+SCHEMA_VARIANTS = ["baseline", "indexes", "matview"]
+# Python services that can read the playlist_with_songs view
+MATVIEW_TECHS = {"grpc", "graphql"}
+
+# profiling endpoints of the Python services, as published on the Docker host
+PROFILE_URLS = {
+    "grpc": "http://localhost:9100/debug/profile",
+    "graphql": "http://localhost:8083/debug/profile",
+}
+
+# --transport-modes presets (common/transport.py); NAME:KEY=VALUE[,KEY=VALUE...]
+# defines others. GRPC_* settings only apply to gRPC, HTTP_* ones to GraphQL.
+TRANSPORT_MODES = {
+    "none": {},
+    "gzip": {"GRPC_COMPRESSION": "gzip", "HTTP_COMPRESSION": "gzip"},
+    "deflate": {"GRPC_COMPRESSION": "deflate"},
+    "brotli": {"HTTP_COMPRESSION": "brotli"},
+    # fixed 1 MiB stream windows instead of BDP-probed ones
+    "window": {"GRPC_HTTP2_BDP_PROBE": "0", "GRPC_HTTP2_WINDOW_BYTES": str(1 << 20)},
+    "keepalive": {"GRPC_KEEPALIVE_MS": "10000", "GRPC_KEEPALIVE_TIMEOUT_MS": "5000"},
+}
+TRANSPORT_TECHS = {"GRPC_": "grpc", "HTTP_": "graphql"}
+
+# --write-shares: the services with playlist edits, and the backends that take them
+WRITE_TECHS = {"grpc", "graphql"}
+WRITE_BACKENDS = {"sql", "jsonagg"}
+
+# users:duration, as in section 5 of the README
+DEFAULT_LOADS = ["50:1m", "200:2m", "500:3m"]
+
+
+def compose(*args, env=None, check=True):
+    cmd = ["docker", "compose", *args]
+    print("[bench] $", " ".join(cmd))
+    return subprocess.run(cmd, cwd=ROOT, env=env, check=check)
+
+
+def apply_schema_variant(variant):
+    cmd = ["docker", "exec", POSTGRES_CONTAINER,
+           "psql", "-U", "demo", "-d", "demo", "-q", "-v", "ON_ERROR_STOP=1", "-f", f"/variants/{variant}.sql"]
+    print("[bench] $", " ".join(cmd))
+    subprocess.run(cmd, check=True)
+
+
+def run_locust(tech, users, duration, run_name, spawn_rate, extra_env):
+    prefix = f"/mnt/results/runs/{run_name}/{tech}-{users}"
+    env_args = ["-e", "LOCUST_DISCOVERY_TTL=0"]
+    for key, value in extra_env.items():
+        env_args += ["-e", f"{key}={value}"]
+
+    compose(
+        "run", "--rm", *env_args, "locust",
+        "-f", "load_test.py", "--headless",
+        "-u", str(users), "-r", str(spawn_rate or users), "-t", duration,
+        "--csv", prefix, "--only-summary",
+        check=False,
+    )
+
+
+def start_sampler(tech, users, run_dir):
+    out = os.path.join(run_dir, f"{tech}-{users}-recursos.csv")
+    return subprocess.Popen([
+        sys.executable, SAMPLER,
+        "--service", SERVICES[tech][1],
+        "--postgres", POSTGRES_CONTAINER,
+        "--out", out,
+    ])
+
+
+def stop_process(proc, timeout=10):
+    if proc is None or proc.poll() is not None:
+        return
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def collect_stats(tech, users, run_dir):
+    """Locust writes <prefix>_stats.csv; the report expects <tech>-<users>.csv.
+    The service metrics scraped by load_test.py become <tech>-<users>-metricas.*
+    and the generator self-check <tech>-<users>-gerador.json."""
+    stats = os.path.join(run_dir, f"{tech}-{users}_stats.csv")
+    if os.path.exists(stats):
+        shutil.copyfile(stats, os.path.join(run_dir, f"{tech}-{users}.csv"))
+    else:
+        print(f"[bench] Locust produced no stats for {tech}-{users}")
+    for ext in ("csv", "prom"):
+        metrics = os.path.join(run_dir, f"{tech}-{users}_metrics.{ext}")
+        if os.path.exists(metrics):
+            shutil.copyfile(metrics, os.path.join(run_dir, f"{tech}-{users}-metricas.{ext}"))
+    generator = os.path.join(run_dir, f"{tech}-{users}_generator.json")
+    if os.path.exists(generator):
+        shutil.copyfile(generator, os.path.join(run_dir, f"{tech}-{users}-gerador.json"))
+        with open(generator) as f:
+            if json.load(f).get("saturated"):
+                print(f"[bench] {tech}-{users}: the Locust process was saturated; "
+                      f"latencies include generator delay (see {tech}-{users}-gerador.json)")
+
+
+def parse_load(spec):
+    users, duration = spec.split(":", 1)
+    return int(users), duration
+
+
+def parse_duration(spec):
+    """Locust's -t format (90, 90s, 3m, 1h30m) in seconds."""
+    if spec.isdigit():
+        return int(spec)
+    parts = re.fullmatch(r"(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?", spec)
+    if not parts or not any(parts.groups()):
+        raise ValueError(f"invalid duration: {spec}")
+    h, m, s = (int(g or 0) for g in parts.groups())
+    return 3600 * h + 60 * m + s
+
+
+def capture_profile(tech, users, run_dir, delay, seconds):
+    """Sleeps `delay` seconds into the Locust run, then profiles the service
+    for `seconds` and stores <tech>-<users>-perfil.json / .folded."""
+    time.sleep(delay)
+    url = f"{PROFILE_URLS[tech]}?seconds={seconds}"
+    print(f"[bench] Profiling {tech} for {seconds}s at {users} users")
+    try:
+        with urllib.request.urlopen(url, timeout=seconds + 60) as response:
+            result = json.load(response)
+    except (OSError, ValueError) as e:
+        print(f"[bench] Could not profile {tech}: {e}")
+        return
+    base = os.path.join(run_dir, f"{tech}-{users}-perfil")
+    with open(base + ".json", "w") as f:
+        json.dump(result, f, indent=2)
+    with open(base + ".folded", "w") as f:
+        f.write(result["collapsed"])
+    print(f"[bench] Profile: {result['samples']} samples in {result['ticks']} ticks -> {base}.folded")
+
+
+def start_profile(args, tech, users, duration, run_dir):
+    """Thread that profiles the middle of the run, or None when not asked for."""
+    if not args.profile_peak or tech not in PROFILE_URLS or users != args.peak_users:
+        return None
+    total = parse_duration(duration)
+    ramp = users / args.spawn_rate if args.spawn_rate else 0
+    seconds = min(args.profile_peak, max(total - ramp, 1))
+    delay = max(ramp, (total - seconds) / 2)
+    thread = threading.Thread(target=capture_profile, args=(tech, users, run_dir, delay, seconds), daemon=True)
+    thread.start()
+    return thread
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--techs", nargs="+", default=list(SERVICES), choices=list(SERVICES))
+    parser.add_argument("--loads", nargs="+", default=DEFAULT_LOADS, help="users:duration pairs")
+    parser.add_argument("--spawn-rate", type=int, default=None, help="users spawned per second (default: all at once)")
+    parser.add_argument("--run-name", default=None, help="folder name under testes-locust/runs/")
+    parser.add_argument("--warmup", type=float, default=10.0, help="seconds to wait after the service is up")
+    parser.add_argument("--data-backend", choices=["sql", "prepared", "psycopg", "fixture", "jsonagg", "matview"], default=None,
+                        help="DATA_BACKEND for the Python services (default: compose default, sql)")
+    parser.add_argument("--schema-variants", nargs="+", choices=SCHEMA_VARIANTS, default=None,
+                        help="repeat the battery once per schema variant; on matview, gRPC and "
+                             "GraphQL read the view unless --data-backend is given")
+    parser.add_argument("--pool-configs", nargs="+", default=None, metavar="SIZE:OVERFLOW[:WORKERS]",
+                        help="repeat the battery once per DB pool size / max overflow (and gRPC worker "
+                             "threads) of the Python services, with the pool warmed up at startup")
+    parser.add_argument("--transport-modes", nargs="+", default=None, metavar="MODE",
+                        help="repeat the battery once per compression/channel setting: "
+                             f"{', '.join(TRANSPORT_MODES)} or NAME:KEY=VALUE[,KEY=VALUE...]; "
+                             "each mode only runs on the services it configures")
+    parser.add_argument("--write-shares", nargs="+", type=float, default=None, metavar="SHARE",
+                        help="repeat the battery once per share (0-0.99) of playlist writes in the "
+                             "gRPC/GraphQL workload, e.g. 0 0.1 0.3 0.5")
+    parser.add_argument("--profile-peak", type=float, default=0, metavar="SECONDS",
+                        help="profile the gRPC/GraphQL service for SECONDS in the middle of the "
+                             "highest load level (starts them with PROFILING=1)")
+    parser.add_argument("--no-sampler", action="store_true", help="skip resource sampling")
+    parser.add_argument("--no-build", action="store_true", help="do not rebuild images")
+    args = parser.parse_args(argv)
+    if sum(bool(v) for v in (args.schema_variants, args.pool_configs, args.transport_modes,
+                             args.write_shares)) > 1:
+        parser.error("--schema-variants, --pool-configs, --transport-modes and --write-shares are run separately")
+    if args.write_shares:
+        if any(not 0 <= share < 1 for share in args.write_shares):
+            parser.error("--write-shares must be between 0 and 0.99")
+        if args.data_backend and args.data_backend not in WRITE_BACKENDS:
+            parser.error(f"--write-shares needs a backend that takes writes: {', '.join(sorted(WRITE_BACKENDS))}")
+    return args
+
+
+def parse_pool_config(spec):
+    """SIZE:OVERFLOW[:WORKERS] -> (folder name, service env)."""
+    parts = spec.split(":")
+    size, overflow = int(parts[0]), int(parts[1])
+    env = {"DB_POOL_SIZE": str(size), "DB_MAX_OVERFLOW": str(overflow), "DB_POOL_WARMUP": "all"}
+    name = f"pool-{size}-{overflow}"
+    if len(parts) > 2:
+        env["GRPC_WORKERS"] = parts[2]
+        name += f"-{parts[2]}"
+    return name, env
+
+
+def parse_transport_mode(spec):
+    """Preset name or NAME:KEY=VALUE[,KEY=VALUE...] -> (folder name, env)."""
+    if ":" not in spec:
+        if spec not in TRANSPORT_MODES:
+            raise SystemExit(f"[bench] unknown transport mode {spec!r}; one of {', '.join(TRANSPORT_MODES)}")
+        return spec, dict(TRANSPORT_MODES[spec])
+    name, pairs = spec.split(":", 1)
+    return name, dict(pair.split("=", 1) for pair in pairs.split(","))
+
+
+def transport_techs(env, techs):
+    """The techs a transport mode changes; all of them for the reference mode."""
+    if not env:
+        return techs
+    touched = {tech for key in env for prefix, tech in TRANSPORT_TECHS.items() if key.startswith(prefix)}
+    return [t for t in techs if t in touched]
+
+
+def run_battery(args, run_name, run_dir, loads, overrides=None, variant=None, client_env=None, techs=None):
+    for tech in techs or args.techs:
+        service, _ = SERVICES[tech]
+        service_env = dict(os.environ, **(overrides or {}))
+        if args.data_backend:
+            service_env["DATA_BACKEND"] = args.data_backend
+        if args.profile_peak:
+            service_env["PROFILING"] = "1"
+        up_args = ["--profile", tech, "up", "-d"]
+        if not args.no_build:
+            up_args.append("--build")
+        if variant:
+            # the variant must be in place before the service warms up
+            compose("--profile", tech, "up", "-d", "--wait", "postgres", env=service_env)
+            apply_schema_variant(variant)
+        compose(*up_args, "postgres", service, env=service_env)
+        time.sleep(args.warmup)
+
+        try:
+            for users, duration in loads:
+                sampler = None if args.no_sampler else start_sampler(tech, users, run_dir)
+                profiler = start_profile(args, tech, users, duration, run_dir)
+                try:
+                    run_locust(tech, users, duration, run_name, args.spawn_rate, client_env or {})
+                finally:
+                    stop_process(sampler)
+                    if profiler is not None:
+                        profiler.join()
+                collect_stats(tech, users, run_dir)
+        finally:
+            compose("--profile", tech, "stop", service, check=False)
+
+
+def report(*args):
+    subprocess.run([sys.executable, REPORT, *args], check=False)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    run_name = args.run_name or datetime.now().strftime("%Y%m%d-%H%M%S")
+    run_dir = os.path.join(RESULTS_DIR, "runs", run_name)
+    os.makedirs(run_dir, exist_ok=True)
+    loads = [parse_load(spec) for spec in args.loads]
+    args.peak_users = max(users for users, _ in loads)
+
+    if args.schema_variants:
+        variants = [
+            (v, {"DATA_BACKEND": "matview"} if v == "matview" else {}, v) for v in args.schema_variants
+        ]
+        if "matview" in args.schema_variants and not set(args.techs) & MATVIEW_TECHS:
+            print("[bench] matview: no selected service reads the view; only the indexes apply")
+    elif args.pool_configs:
+        variants = [(*parse_pool_config(spec), None) for spec in args.pool_configs]
+    elif args.transport_modes:
+        variants = [(*parse_transport_mode(spec), None) for spec in args.transport_modes]
+    elif args.write_shares:
+        # only the Locust client changes; the services run as in the reference
+        variants = [(f"escrita-{round(share * 100)}", {}, None) for share in args.write_shares]
+        client_envs = {name: {"LOCUST_WRITE_SHARE": str(share)}
+                       for (name, _, _), share in zip(variants, args.write_shares)}
+    else:
+        run_battery(args, run_name, run_dir, loads)
+        report("--dados", run_dir, "--saida", os.path.join(run_dir, "outputs"))
+        print("[bench] Results in", run_dir)
+        return 0
+
+    variant_dirs = []
+    try:
+        for name, overrides, schema in variants:
+            if args.transport_modes:
+                techs = transport_techs(overrides, args.techs)
+            elif args.write_shares:
+                techs = [t for t in args.techs if t in WRITE_TECHS]
+            else:
+                techs = args.techs
+            if not techs:
+                print(f"[bench] {name}: changes none of {', '.join(args.techs)}; skipped")
+                continue
+            variant_dir = os.path.join(run_dir, name)
+            os.makedirs(variant_dir, exist_ok=True)
+            # transport modes: the Locust client reads the same settings (compression, channel options)
+            client_env = overrides if args.transport_modes else None
+            if args.write_shares:
+                client_env = client_envs[name]
+            run_battery(args, f"{run_name}/{name}", variant_dir, loads, overrides, schema, client_env, techs)
+            report("--dados", variant_dir, "--saida", os.path.join(variant_dir, "outputs"))
+            variant_dirs.append(variant_dir)
+    finally:
+        if args.schema_variants:
+            # leave the database as docker-compose.yaml describes it
+            apply_schema_variant(os.getenv("SCHEMA_VARIANT", "baseline"))
+
+    report("--variantes", *variant_dirs, "--saida", os.path.join(run_dir, "outputs"))
+    print("[bench] Results in", run_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
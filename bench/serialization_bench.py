@@ -0,0 +1,305 @@
+"""Offline serialization micro-benchmark: protobuf vs JSON vs SOAP XML vs
+GraphQL response JSON, on the same payloads the services return.
+
+No network or database: the dataset is read from db/init.sql and turned into
+the SongList / PlaylistList / UserList shapes of demo.proto. For every format,
+payload kind and size the script records encode and decode ns/op, the encoded
+size, and Python allocations (tracemalloc: peak bytes during one operation,
+and allocs/op, the blocks one operation allocates that are still alive when
+it returns).
+
+    python bench/serialization_bench.py --sizes 1 10 100 1000 all
+
+Notes on what is timed:
+  * encode starts from plain dicts (what a service has after the DB call), so
+    protobuf encode includes building the messages, like grpc/server.py does;
+  * decode is bytes -> parsed object (protobuf message, json objects,
+    ElementTree), i.e. what a client gets before reading fields;
+  * tracemalloc only sees Python's allocator, so memory inside the upb arena
+    used by protobuf is not counted;
+  * tracemalloc only traces live blocks, so allocs/op counts what the result
+    holds (one bytes object for an encode, the parsed objects for a decode),
+    not temporaries freed before the call returns; their cost shows in the
+    peak bytes.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+import proto_stubs
+
+proto_stubs.add_to_path()
+
+import demo_pb2
+from google.protobuf import __version__ as protobuf_version
+from common.dataset import DEFAULT_DATASET, load_dataset
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+DEMO_NS = "http://example.com/demo"
+DEFAULT_OUTPUT = os.path.join(ROOT, "bench", "results", "serialization.json")
+
+# kind -> (SOAP response element, GraphQL root field)
+KINDS = {
+    "songs": ("getAllSongsResponse", "songs"),
+    "playlists": ("getUserPlaylistsResponse", "userPlaylists"),
+    "users": ("getAllUsersResponse", "users"),
+}
+
+
+# =====================================================================
+# Payloads
+# =====================================================================
+def build_payloads(ds):
+    songs = {s.id: {"id": s.id, "title": s.title, "artist": s.artist} for s in ds.songs}
+
+    songs_by_playlist = {}
+    for pid, sid in ds.playlist_songs:
+        songs_by_playlist.setdefault(pid, []).append(songs[sid])
+
+    playlists = {}
+    playlists_by_user = {}
+    for p in ds.playlists:
+        pl = {"id": p.id, "name": p.name, "songs": songs_by_playlist.get(p.id, [])}
+        playlists[p.id] = pl
+        playlists_by_user.setdefault(p.user_id, []).append(pl)
+
+    users = [
+        {"id": u.id, "name": u.name, "age": u.age, "playlists": playlists_by_user.get(u.id, [])}
+        for u in ds.users
+    ]
+    return {
+        "songs": list(songs.values()),
+        "playlists": list(playlists.values()),
+        "users": users,
+    }
+
+
+# =====================================================================
+# Codecs: each returns (encode(rows) -> bytes, decode(bytes) -> object)
+# =====================================================================
+def _pb_song(s):
+    return demo_pb2.Song(id=s["id"], title=s["title"], artist=s["artist"])
+
+
+def _pb_playlist(p):
+    return demo_pb2.Playlist(id=p["id"], name=p["name"], songs=[_pb_song(s) for s in p["songs"]])
+
+
+def protobuf_codec(kind):
+    if kind == "songs":
+        return (lambda rows: demo_pb2.SongList(songs=[_pb_song(s) for s in rows]).SerializeToString(),
+                demo_pb2.SongList.FromString)
+    if kind == "playlists":
+        return (lambda rows: demo_pb2.PlaylistList(playlists=[_pb_playlist(p) for p in rows]).SerializeToString(),
+                demo_pb2.PlaylistList.FromString)
+    return (lambda rows: demo_pb2.UserList(users=[
+                demo_pb2.UserResponse(id=u["id"], name=u["name"], age=u["age"],
+                                      playlists=[_pb_playlist(p) for p in u["playlists"]])
+                for u in rows]).SerializeToString(),
+            demo_pb2.UserList.FromString)
+
+
+def json_codec(kind):
+    return (lambda rows: json.dumps({kind: rows}).encode("utf-8"), json.loads)
+
+
+def orjson_codec(kind):
+    return (lambda rows: orjson.dumps({kind: rows}), orjson.loads)
+
+
+def graphql_codec(kind):
+    field = KINDS[kind][1]
+    return (lambda rows: json.dumps({"data": {field: rows}}).encode("utf-8"), json.loads)
+
+
+def _xml_song(out, s, tag="songs"):
+    out.append(f"<ns2:{tag}><ns2:id>{s['id']}</ns2:id><ns2:title>{escape(s['title'])}</ns2:title>"
+               f"<ns2:artist>{escape(s['artist'])}</ns2:artist></ns2:{tag}>")
+
+
+def _xml_playlist(out, p):
+    out.append(f"<ns2:playlists><ns2:id>{p['id']}</ns2:id><ns2:name>{escape(p['name'])}</ns2:name>")
+    for s in p["songs"]:
+        _xml_song(out, s)
+    out.append("</ns2:playlists>")
+
+
+def soap_codec(kind):
+    """Spring-WS/JAXB style envelope for the response types in users.xsd."""
+    element = KINDS[kind][0]
+
+    def encode(rows):
+        out = [f'<SOAP-ENV:Envelope xmlns:SOAP-ENV="{SOAP_NS}"><SOAP-ENV:Header/><SOAP-ENV:Body>'
+               f'<ns2:{element} xmlns:ns2="{DEMO_NS}">']
+        for row in rows:
+            if kind == "songs":
+                _xml_song(out, row)
+            elif kind == "playlists":
+                _xml_playlist(out, row)
+            else:
+                out.append(f"<ns2:users><ns2:id>{row['id']}</ns2:id><ns2:name>{escape(row['name'])}</ns2:name>"
+                           f"<ns2:age>{row['age']}</ns2:age>")
+                for p in row["playlists"]:
+                    _xml_playlist(out, p)
+                out.append("</ns2:users>")
+        out.append(f"</ns2:{element}></SOAP-ENV:Body></SOAP-ENV:Envelope>")
+        return "".join(out).encode("utf-8")
+
+    return encode, ET.fromstring
+
+
+FORMATS = {
+    "protobuf": protobuf_codec,
+    "json": json_codec,
+    "orjson": orjson_codec,
+    "soap_xml": soap_codec,
+    "graphql_json": graphql_codec,
+}
+
+
+# =====================================================================
+# Measurement
+# =====================================================================
+def time_ns_per_op(fn, repeats):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    samples = [t / number * 1e9 for t in timer.repeat(repeat=repeats, number=number)]
+    return statistics.median(samples), min(samples)
+
+
+# calls per allocation count, results kept alive, to average out the noise
+ALLOC_CALLS = 10
+# leaves out what taking the snapshots allocates
+SNAPSHOT_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<unknown>")]
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+def measure_allocations(fn, calls=ALLOC_CALLS):
+    """Peak and retained bytes of one call, and allocs_per_op: blocks a call
+    allocates that are alive when it returns, from a snapshot diff around
+    `calls` calls whose results are kept."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        del result
+
+        results = [None] * calls
+        before = _snapshot()
+        for i in range(calls):
+            results[i] = fn()
+        after = _snapshot()
+        del results
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return {
+        "peak_alloc_bytes": peak - base,
+        "retained_bytes": current - base,
+        "allocs_per_op": blocks / calls,
+    }
+
+
+def run(payloads, formats, kinds, sizes, repeats):
+    results = []
+    for kind in kinds:
+        all_rows = payloads[kind]
+        for size in sizes:
+            n = len(all_rows) if size == "all" else min(int(size), len(all_rows))
+            rows = all_rows[:n]
+
+            for fmt in formats:
+                encode, decode = FORMATS[fmt](kind)
+                data = encode(rows)
+
+                enc_med, enc_min = time_ns_per_op(lambda: encode(rows), repeats)
+                dec_med, dec_min = time_ns_per_op(lambda: decode(data), repeats)
+                enc_alloc = measure_allocations(lambda: encode(rows))
+                dec_alloc = measure_allocations(lambda: decode(data))
+
+                result = {
+                    "format": fmt,
+                    "kind": kind,
+                    "rows": n,
+                    "bytes": len(data),
+                    "encode_ns": round(enc_med),
+                    "encode_ns_min": round(enc_min),
+                    "decode_ns": round(dec_med),
+                    "decode_ns_min": round(dec_min),
+                    "encode_alloc": enc_alloc,
+                    "decode_alloc": dec_alloc,
+                }
+                results.append(result)
+                print(f"{kind:<10} {n:>6} {fmt:<13} {len(data):>10} B "
+                      f"enc {enc_med / 1e3:>11.1f} us {enc_alloc['allocs_per_op']:>8.0f} allocs  "
+                      f"dec {dec_med / 1e3:>11.1f} us {dec_alloc['allocs_per_op']:>8.0f} allocs  "
+                      f"enc peak {enc_alloc['peak_alloc_bytes']:>10} B")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="SQL dataset (default: db/init.sql)")
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=list(FORMATS))
+    parser.add_argument("--kinds", nargs="+", default=list(KINDS), choices=list(KINDS))
+    parser.add_argument("--sizes", nargs="+", default=["1", "10", "100", "1000", "all"],
+                        help="rows per payload; 'all' is the full catalog")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--out", default=DEFAULT_OUTPUT, help="JSON file for the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    formats = [f for f in args.formats if f != "orjson" or orjson is not None]
+    if len(formats) != len(args.formats):
+        print("[bench] orjson not installed; skipping it")
+
+    ds = load_dataset(args.dataset)
+    print(f"[bench] Loaded {ds}")
+    payloads = build_payloads(ds)
+
+    results = run(payloads, formats, args.kinds, args.sizes, args.repeats)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({
+            "benchmark": "serialization",
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "protobuf": protobuf_version,
+            "orjson": getattr(orjson, "__version__", None),
+            "dataset": os.path.relpath(args.dataset, ROOT),
+            "results": results,
+        }, f, indent=2)
+    print(f"[bench] Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Lists the slowest traces per endpoint from the span files of common/tracing.py.
+
+Reads every OTLP/JSON line file under the given paths (default traces/, where
+docker-compose mounts TRACE_DIR), joins the spans of each trace across the
+Locust, gRPC and GraphQL files, and prints the N slowest traces of each
+endpoint (the name of the trace's root span: the Locust request name, or the
+server span when the client span was not kept) with where the time went:
+
+    total     root span (client call, or server request)
+    server    SERVER span: queue + handler + encoding inside the service
+    queue     gRPC thread-pool queue (rpc.queue_ms)
+    sql       statements run, and their summed time
+    encode    response serialization
+    slowest   the slowest statement
+
+    python bench/slowest_traces.py traces/ --top 5
+    python bench/slowest_traces.py traces/ --endpoint "gRPC GetAllUsers" --statements
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SPAN_KIND_SERVER = 2
+
+
+def _value(any_value):
+    for kind in ("stringValue", "doubleValue", "boolValue"):
+        if kind in any_value:
+            return any_value[kind]
+    if "intValue" in any_value:
+        return int(any_value["intValue"])
+    return None
+
+
+def _attributes(items):
+    return {a["key"]: _value(a["value"]) for a in items or ()}
+
+
+def read_spans(paths):
+    """Spans from every *.jsonl under `paths`, as flat dicts."""
+    files = []
+    for path in paths:
+        files += sorted(glob.glob(os.path.join(path, "*.jsonl"))) if os.path.isdir(path) else [path]
+    spans = []
+    for name in files:
+        with open(name) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                for resource_spans in json.loads(line).get("resourceSpans", []):
+                    service = _attributes(resource_spans.get("resource", {}).get("attributes")).get("service.name", "")
+                    for scope in resource_spans.get("scopeSpans", []):
+                        for s in scope.get("spans", []):
+                            start, end = int(s["startTimeUnixNano"]), int(s["endTimeUnixNano"])
+                            spans.append({
+                                "trace": s["traceId"], "id": s["spanId"], "parent": s.get("parentSpanId", ""),
+                                "name": s["name"], "kind": s.get("kind", 0), "service": service,
+                                "start": start, "ms": (end - start) / 1e6,
+                                "attrs": _attributes(s.get("attributes")),
+                                "error": s.get("status", {}).get("code") == 2,
+                            })
+    return spans
+
+
+def summarize_trace(spans):
+    ids = {s["id"] for s in spans}
+    roots = [s for s in spans if not s["parent"] or s["parent"] not in ids]
+    root = min(roots, key=lambda s: s["start"])
+    servers = [s for s in spans if s["kind"] == SPAN_KIND_SERVER]
+    statements = [s for s in spans if "db.statement" in s["attrs"]]
+    slowest = max(statements, key=lambda s: s["ms"]) if statements else None
+    queue = [s["attrs"]["rpc.queue_ms"] for s in servers if "rpc.queue_ms" in s["attrs"]]
+    return {
+        "trace": root["trace"],
+        "endpoint": root["name"],
+        "services": sorted({s["service"] for s in spans}),
+        "total_ms": root["ms"],
+        "server_ms": max((s["ms"] for s in servers), default=None),
+        "queue_ms": max(queue) if queue else None,
+        "sql_count": len(statements),
+        "sql_ms": sum(s["ms"] for s in statements),
+        "encode_ms": sum(s["ms"] for s in spans if s["name"] == "encode"),
+        "error": any(s["error"] for s in spans),
+        "slowest_sql_ms": slowest["ms"] if slowest else None,
+        "slowest_sql": slowest["attrs"]["db.statement"] if slowest else "",
+        "statements": sorted(statements, key=lambda s: s["start"]),
+    }
+
+
+def slowest_by_endpoint(spans, top):
+    by_trace = {}
+    for s in spans:
+        by_trace.setdefault(s["trace"], []).append(s)
+    by_endpoint = {}
+    for trace_spans in by_trace.values():
+        t = summarize_trace(trace_spans)
+        by_endpoint.setdefault(t["endpoint"], []).append(t)
+    return {
+        endpoint: sorted(traces, key=lambda t: t["total_ms"], reverse=True)[:top]
+        for endpoint, traces in sorted(by_endpoint.items())
+    }, {endpoint: len(traces) for endpoint, traces in by_endpoint.items()}
+
+
+def _ms(value):
+    return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+
+
+def print_report(report, counts, show_statements=False, width=70):
+    for endpoint, traces in report.items():
+        print(f"\n{endpoint}  ({counts[endpoint]} traces kept)")
+        print(f"  {'trace':<32} {'total':>9} {'server':>9} {'queue':>9} {'sql':>5} {'sql ms':>9} "
+              f"{'encode':>9}  slowest statement")
+        for t in traces:
+            flag = " ERROR" if t["error"] else ""
+            statement = t["slowest_sql"][:width]
+            slowest = f"{t['slowest_sql_ms']:.1f} ms {statement}" if t["slowest_sql_ms"] is not None else ""
+            print(f"  {t['trace']:<32} {_ms(t['total_ms'])} {_ms(t['server_ms'])} {_ms(t['queue_ms'])} "
+                  f"{t['sql_count']:>5} {_ms(t['sql_ms'])} {_ms(t['encode_ms'])}  {slowest}{flag}")
+            if show_statements:
+                for s in t["statements"]:
+                    print(f"      {s['ms']:8.2f} ms  {s['attrs']['db.statement'][:width * 2]}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="*", default=[os.path.join(ROOT, "traces")],
+                        help="span files or folders of *.jsonl (default traces/)")
+    parser.add_argument("--top", type=int, default=5, help="traces listed per endpoint")
+    parser.add_argument("--endpoint", action="append", help="only these endpoints (root span names)")
+    parser.add_argument("--statements", action="store_true", help="list every statement of each trace")
+    parser.add_argument("--json", dest="json_out", help="also write the report to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    spans = read_spans(args.paths)
+    if not spans:
+        print("[traces] No spans found in", ", ".join(args.paths))
+        return 1
+    report, counts = slowest_by_endpoint(spans, args.top)
+    if args.endpoint:
+        report = {e: t for e, t in report.items() if e in args.endpoint}
+    print(f"[traces] {len(spans)} spans, {sum(counts.values())} traces")
+    print_report(report, counts, args.statements)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({e: [{k: v for k, v in t.items() if k != "statements"} for t in traces]
+                       for e, traces in report.items()}, f, indent=2)
+        print("[traces] Report written to", args.json_out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Code shared by the Python services (grpc/, graphql/) and the bench tools."""
@@ -0,0 +1,135 @@
+"""Data-access interface shared by the Python services.
+
+Each service keeps its own SQL implementation (grpc/server.py uses raw
+SQLAlchemy text queries, graphql/main.py the ORM) so the protocol comparison
+still measures what it always did. FixtureBackend serves the same data from
+memory, which takes Postgres out of the picture and leaves only the transport
+and serialization cost of the service.
+
+The backend is picked with the DATA_BACKEND env var (default "sql"); the
+fixture file comes from FIXTURE_PATH (default db/init.sql).
+"""
+import os
+from collections import namedtuple
+
+from common.dataset import DEFAULT_DATASET, load_dataset
+
+Song = namedtuple("Song", "id title artist")
+Playlist = namedtuple("Playlist", "id name songs")
+User = namedtuple("User", "id name age playlists")
+
+
+class DataBackend:
+    """The five operations every protocol exposes, plus the nested user tree
+    GraphQL's `users` field returns. Results are Song/Playlist/User tuples or
+    any objects with the same attributes (e.g. eagerly loaded ORM models).
+
+    Backends with returns_dicts set return dicts with the same keys instead
+    (see common/json_backend.py); the services map those without copying.
+    """
+
+    returns_dicts = False
+
+    def all_users(self):
+        """Users without their playlists."""
+        raise NotImplementedError
+
+    def all_users_with_playlists(self):
+        raise NotImplementedError
+
+    def all_songs(self):
+        raise NotImplementedError
+
+    def user_playlists(self, user_id):
+        raise NotImplementedError
+
+    def playlist_songs(self, playlist_id):
+        raise NotImplementedError
+
+    def playlists_by_song(self, song_id):
+        raise NotImplementedError
+
+    def song_changes(self, since, limit):
+        """Songs changed after version `since`, as a common.changes.ChangeBatch.
+        Only the SQL backends keep row versions (common/changes.py)."""
+        raise NotImplementedError
+
+    def playlist_changes(self, since, limit):
+        raise NotImplementedError
+
+    def create_playlist(self, user_id, name, song_ids=()):
+        """Playlist edits, as common.writes.WriteResult; ValueError for
+        unknown ids. Only the SQL backends write (common/writes.py)."""
+        raise NotImplementedError
+
+    def add_playlist_songs(self, playlist_id, song_ids):
+        raise NotImplementedError
+
+    def remove_playlist_songs(self, playlist_id, song_ids):
+        raise NotImplementedError
+
+
+class FixtureBackend(DataBackend):
+    """Serves a dataset loaded once into memory, with the lookups the SQL
+    queries do precomputed as dicts."""
+
+    def __init__(self, dataset):
+        self.songs = [Song(s.id, s.title, s.artist) for s in dataset.songs]
+        songs_by_id = {s.id: s for s in self.songs}
+
+        self._songs_by_playlist = {}
+        self._playlist_ids_by_song = {}
+        for pid, sid in dataset.playlist_songs:
+            self._songs_by_playlist.setdefault(pid, []).append(songs_by_id[sid])
+            self._playlist_ids_by_song.setdefault(sid, []).append(pid)
+
+        self._playlists = {}
+        self._playlists_by_user = {}
+        for p in dataset.playlists:
+            pl = Playlist(p.id, p.name, self._songs_by_playlist.get(p.id, []))
+            self._playlists[p.id] = pl
+            self._playlists_by_user.setdefault(p.user_id, []).append(pl)
+
+        self.users = [User(u.id, u.name, u.age, []) for u in dataset.users]
+        self._nested_users = [
+            User(u.id, u.name, u.age, self._playlists_by_user.get(u.id, [])) for u in dataset.users
+        ]
+
+    def all_users(self):
+        return self.users
+
+    def all_users_with_playlists(self):
+        return self._nested_users
+
+    def all_songs(self):
+        return self.songs
+
+    def user_playlists(self, user_id):
+        return self._playlists_by_user.get(user_id, [])
+
+    def playlist_songs(self, playlist_id):
+        return self._songs_by_playlist.get(playlist_id, [])
+
+    def playlists_by_song(self, song_id):
+        return [self._playlists[pid] for pid in self._playlist_ids_by_song.get(song_id, [])]
+
+
+def load_fixture_backend(path=None):
+    path = path or os.getenv("FIXTURE_PATH", DEFAULT_DATASET)
+    dataset = load_dataset(path)
+    print(f"Fixture backend loaded from {path}: {dataset}")
+    return FixtureBackend(dataset)
+
+
+def make_backend(factories, default="sql"):
+    """Builds the backend named by DATA_BACKEND.
+
+    `factories` maps names to zero-argument callables provided by the service
+    (e.g. {"sql": ...}); "fixture" is always available.
+    """
+    factories = {"fixture": load_fixture_backend, **factories}
+    kind = os.getenv("DATA_BACKEND", default).strip().lower()
+    if kind not in factories:
+        raise ValueError(f"Unknown DATA_BACKEND={kind!r}; expected one of {sorted(factories)}")
+    print(f"Using data backend: {kind}")
+    return factories[kind]()
@@ -0,0 +1,97 @@
+"""Delta sync over the row versions kept by the schema (ROW_VERSIONING in
+init_sql-gen.py, also at the end of db/init.sql).
+
+Every row of songs, playlists and playlist_songs carries the version of its
+last insert or update and every delete leaves a row_tombstones entry, all
+numbered by one sequence. A client that has applied everything up to
+version N asks for the changes above N and gets, oldest first, the rows
+inserted or updated since (INSERT when the row was created after N) and the
+keys deleted since, at most `limit` of them; the reply's version is the one
+to ask from next time. Each query walks the version indexes from N, so the
+cost follows the number of changes, not the size of the catalog; version 0
+returns the whole catalog as INSERTs.
+
+Versions are taken when a row is written, not when its transaction commits:
+a long write transaction can commit a version lower than one a client has
+already passed. Applying a change twice is harmless, so clients that sync
+while others write should ask from a little behind their last version.
+"""
+from collections import namedtuple
+
+from sqlalchemy import text
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+
+INSERT, UPDATE, DELETE = "INSERT", "UPDATE", "DELETE"
+
+SongChange = namedtuple("SongChange", "kind version id title artist")
+PlaylistChange = namedtuple("PlaylistChange", "kind version id user_id name")
+PlaylistSongChange = namedtuple("PlaylistSongChange", "kind version playlist_id song_id")
+# `changes` oldest first; `version` is the since_version of the next call
+ChangeBatch = namedtuple("ChangeBatch", "changes version has_more")
+
+SONG_CHANGES = """
+    (SELECT version, created_version, id, title, artist
+     FROM songs WHERE version > :since ORDER BY version LIMIT :n)
+    UNION ALL
+    (SELECT version, NULL, row_key[1], NULL, NULL
+     FROM row_tombstones WHERE table_name = 'songs' AND version > :since ORDER BY version LIMIT :n)
+    ORDER BY version LIMIT :n
+"""
+
+# playlists and their song lists in one stream, so both follow one version
+PLAYLIST_CHANGES = """
+    (SELECT version, created_version, 'playlists' AS tbl, id AS a, user_id AS b, name
+     FROM playlists WHERE version > :since ORDER BY version LIMIT :n)
+    UNION ALL
+    (SELECT version, created_version, 'playlist_songs', playlist_id, song_id, NULL
+     FROM playlist_songs WHERE version > :since ORDER BY version LIMIT :n)
+    UNION ALL
+    (SELECT version, NULL, table_name, row_key[1], row_key[2], NULL
+     FROM row_tombstones WHERE table_name IN ('playlists', 'playlist_songs') AND version > :since
+     ORDER BY version LIMIT :n)
+    ORDER BY version LIMIT :n
+"""
+
+
+def clamp_limit(limit):
+    return min(limit, MAX_LIMIT) if limit and limit > 0 else DEFAULT_LIMIT
+
+
+def _kind(created_version, since):
+    if created_version is None:
+        return DELETE
+    return INSERT if created_version > since else UPDATE
+
+
+def _batch(changes, since, limit):
+    # one row more than asked tells whether there is more
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    return ChangeBatch(changes, changes[-1].version if changes else since, has_more)
+
+
+class SqlChangeFeed:
+    """song_changes/playlist_changes for backends with a SQLAlchemy `engine`."""
+
+    def _rows(self, sql, since, limit):
+        with self.engine.connect() as conn:
+            return conn.execute(text(sql), {"since": since, "n": limit + 1}).fetchall()
+
+    def song_changes(self, since, limit):
+        limit = clamp_limit(limit)
+        changes = [
+            SongChange(_kind(r[1], since), r[0], r[2], r[3], r[4])
+            for r in self._rows(SONG_CHANGES, since, limit)
+        ]
+        return _batch(changes, since, limit)
+
+    def playlist_changes(self, since, limit):
+        limit = clamp_limit(limit)
+        changes = [
+            PlaylistChange(_kind(r[1], since), r[0], r[3], r[4], r[5]) if r[2] == "playlists"
+            else PlaylistSongChange(_kind(r[1], since), r[0], r[3], r[4])
+            for r in self._rows(PLAYLIST_CHANGES, since, limit)
+        ]
+        return _batch(changes, since, limit)
@@ -0,0 +1,93 @@
+"""Loads the benchmark dataset into plain Python rows, without a database.
+
+Reads the psql scripts produced by init_sql-gen.py: either multi-row INSERTs
+(db/init.sql) or COPY ... FROM stdin blocks. When the id column is not in the
+data, ids follow insertion order starting at 1, like the SERIAL columns do.
+"""
+import os
+import re
+from collections import namedtuple
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db", "init.sql")
+
+UserRow = namedtuple("UserRow", "id name age")
+SongRow = namedtuple("SongRow", "id title artist")
+PlaylistRow = namedtuple("PlaylistRow", "id user_id name")
+
+INSERT_RE = re.compile(r"INSERT INTO (\w+) \(([^)]*)\) VALUES\s*(.*?);\s*$", re.S | re.M)
+COPY_RE = re.compile(r"^COPY (\w+) \(([^)]*)\) FROM stdin;\n(.*?)^\\\.$", re.S | re.M)
+ROW_RE = re.compile(r"\(((?:'(?:[^']|'')*'|[^'()])*)\)")
+FIELD_RE = re.compile(r"'((?:[^']|'')*)'|([^,\s]+)")
+COPY_UNESCAPE_RE = re.compile(r"\\(.)")
+COPY_UNESCAPES = {"t": "\t", "n": "\n", "r": "\r", "\\": "\\"}
+INT_COLUMNS = {"id", "age", "user_id", "playlist_id", "song_id"}
+
+
+def _parse_value(quoted, bare):
+    if quoted is not None:
+        return quoted.replace("''", "'")
+    if bare.upper() == "NULL":
+        return None
+    return int(bare)
+
+
+def _parse_copy_value(raw, is_int):
+    if raw == "\\N":
+        return None
+    if is_int:
+        return int(raw)
+    if "\\" in raw:
+        return COPY_UNESCAPE_RE.sub(lambda m: COPY_UNESCAPES.get(m.group(1), m.group(1)), raw)
+    return raw
+
+
+class Dataset:
+    def __init__(self, users, songs, playlists, playlist_songs):
+        self.users = users
+        self.songs = songs
+        self.playlists = playlists
+        self.playlist_songs = playlist_songs
+
+    def __repr__(self):
+        return (f"Dataset(users={len(self.users)}, songs={len(self.songs)}, "
+                f"playlists={len(self.playlists)}, playlist_songs={len(self.playlist_songs)})")
+
+
+def parse_sql_dataset(sql):
+    """Returns {table: (columns, [tuple, ...])} for every INSERT ... VALUES
+    and COPY ... FROM stdin block in sql."""
+    tables = {}
+    for m in INSERT_RE.finditer(sql):
+        table, columns, values = m.group(1), m.group(2), m.group(3)
+        _, rows = tables.setdefault(table, ([c.strip() for c in columns.split(",")], []))
+        for row in ROW_RE.finditer(values):
+            rows.append(tuple(_parse_value(*f.groups()) for f in FIELD_RE.finditer(row.group(1))))
+    for m in COPY_RE.finditer(sql):
+        table, columns, data = m.group(1), m.group(2), m.group(3)
+        columns, rows = tables.setdefault(table, ([c.strip() for c in columns.split(",")], []))
+        int_flags = [c in INT_COLUMNS for c in columns]
+        for line in data.splitlines():
+            rows.append(tuple(_parse_copy_value(v, f) for v, f in zip(line.split("\t"), int_flags)))
+    return tables
+
+
+def _records(tables, table, record):
+    columns, rows = tables.get(table, ((), []))
+    fields = record._fields
+    if "id" not in columns:
+        columns = ["id", *columns]
+        rows = ((i, *row) for i, row in enumerate(rows, 1))
+    index = [columns.index(f) for f in fields]
+    return [record(*(row[i] for i in index)) for row in rows]
+
+
+def load_dataset(path=DEFAULT_DATASET):
+    with open(path, encoding="utf-8") as f:
+        tables = parse_sql_dataset(f.read())
+
+    users = _records(tables, "users", UserRow)
+    songs = _records(tables, "songs", SongRow)
+    playlists = _records(tables, "playlists", PlaylistRow)
+    ps_columns, ps_rows = tables.get("playlist_songs", (["playlist_id", "song_id"], []))
+    pi, si = ps_columns.index("playlist_id"), ps_columns.index("song_id")
+    return Dataset(users, songs, playlists, [(row[pi], row[si]) for row in ps_rows])
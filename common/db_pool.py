@@ -0,0 +1,120 @@
+"""SQLAlchemy connection pool shared by the Python services: sizing from env
+vars, warm-up at startup and Prometheus metrics for the pool.
+
+    DB_POOL_SIZE       connections kept open (default 5, SQLAlchemy's default)
+    DB_MAX_OVERFLOW    extra connections opened under load (default 10)
+    DB_POOL_TIMEOUT    seconds to wait for a connection before failing (30)
+    DB_POOL_PRE_PING   1 to test each connection on checkout (default 0)
+    DB_POOL_RECYCLE    seconds after which a connection is replaced (-1: never)
+    DB_POOL_WARMUP     connections opened at startup, up to DB_POOL_SIZE;
+                       "all" = DB_POOL_SIZE (default 0)
+
+Metrics: db_pool_checkout_wait_seconds (time blocked in the pool, including
+opening a new connection), db_pool_overflow_events_total, db_pool_timeouts_total
+and the db_pool_connections{state=active|idle|overflow} gauges, read from the
+pool on every scrape.
+"""
+import os
+import time
+
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import create_engine
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.pool import QueuePool
+
+from common import tracing
+from common.metrics import instrument_engine
+from common.util import flag
+
+CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled DB connection",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+OVERFLOW_EVENTS = Counter("db_pool_overflow_events", "Connections opened beyond DB_POOL_SIZE")
+TIMEOUTS = Counter("db_pool_timeouts", "Checkouts that gave up after DB_POOL_TIMEOUT")
+
+
+class InstrumentedQueuePool(QueuePool):
+    def _do_get(self):
+        overflow = self._overflow
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except sa_exc.TimeoutError:
+            TIMEOUTS.inc()
+            raise
+        CHECKOUT_WAIT.observe(time.perf_counter() - start)
+        if self._overflow > overflow and self._overflow > 0:
+            OVERFLOW_EVENTS.inc()
+        return conn
+
+
+class PoolCollector:
+    """Reports the live state of the engines' pools at scrape time."""
+
+    def __init__(self):
+        self.engines = []
+
+    def collect(self):
+        gauge = GaugeMetricFamily("db_pool_connections", "DB connections by pool state", labels=["state"])
+        size = GaugeMetricFamily("db_pool_size", "Configured DB_POOL_SIZE")
+        active = idle = overflow = configured = 0
+        for engine in self.engines:
+            pool = engine.pool  # replaced by engine.dispose()
+            active += pool.checkedout()
+            idle += pool.checkedin()
+            overflow += max(pool.overflow(), 0)
+            configured += pool.size()
+        gauge.add_metric(["active"], active)
+        gauge.add_metric(["idle"], idle)
+        gauge.add_metric(["overflow"], overflow)
+        size.add_metric([], configured)
+        yield gauge
+        yield size
+
+
+POOL_COLLECTOR = PoolCollector()
+REGISTRY.register(POOL_COLLECTOR)
+
+
+def pool_settings():
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_pre_ping": flag("DB_POOL_PRE_PING"),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "-1")),
+    }
+
+
+def warm_up(engine, count):
+    """Opens `count` connections at once and returns them to the pool, so the
+    first requests do not pay for the connection handshakes."""
+    start = time.perf_counter()
+    conns = []
+    try:
+        for _ in range(count):
+            conns.append(engine.connect())
+    finally:
+        for conn in conns:
+            conn.close()
+    print(f"Warmed up {len(conns)} DB connections in {time.perf_counter() - start:.2f}s")
+
+
+def create_pooled_engine(url):
+    settings = pool_settings()
+    engine = instrument_engine(create_engine(url, poolclass=InstrumentedQueuePool, **settings))
+    tracing.instrument_engine(engine)
+    POOL_COLLECTOR.engines.append(engine)
+    print("DB pool:", ", ".join(f"{k}={v}" for k, v in settings.items()))
+
+    warmup = os.getenv("DB_POOL_WARMUP", "0").strip().lower()
+    count = settings["pool_size"] if warmup == "all" else int(warmup)
+    if count > 0:
+        try:
+            # connections beyond pool_size would be closed again on return
+            warm_up(engine, min(count, settings["pool_size"]))
+        except Exception as e:
+            print(f"DB pool warm-up failed: {e}")
+    return engine
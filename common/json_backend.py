@@ -0,0 +1,136 @@
+"""Backends that let Postgres build the nested playlist -> songs structure.
+
+Both return plain dicts shaped like the API responses ({"id", "title",
+"artist"} songs, {"id", "name", "songs"} playlists, {"id", "name", "age"[,
+"playlists"]} users), decoded by the driver's C JSON parser, so the services
+can hand them straight to the demo_pb2 constructors or the Strawberry types
+instead of copying Row objects field by field (see DataBackend.returns_dicts).
+
+JsonAggBackend (DATA_BACKEND=jsonagg) builds every response as a single JSON
+value with json_agg/json_build_object on the plain schema: one query and one
+row per request, where the row path does one query per playlist. json rather
+than jsonb, since the value is only serialized once and never queried.
+
+MatviewBackend (DATA_BACKEND=matview) reads the playlist_with_songs
+materialized view created by the "matview" schema variant
+(init_sql-gen.py --schema-variant matview, or db/variants/matview.sql on a
+running database): one row per playlist with its songs already aggregated.
+The view is a snapshot; after changing the playlist tables run
+REFRESH MATERIALIZED VIEW CONCURRENTLY playlist_with_songs. For the same
+reason it does not take the playlist edits of common/writes.py: its reads
+would not see them.
+"""
+from sqlalchemy import text
+
+from common.backend import DataBackend
+from common.changes import SqlChangeFeed
+from common.writes import SqlPlaylistWrites
+
+SONG_JSON = "json_build_object('id', s.id, 'title', s.title, 'artist', s.artist)"
+
+# songs of the playlist whose id is {pid}, as a JSON array
+SONGS_OF = f"""(
+    SELECT COALESCE(json_agg({SONG_JSON}), '[]'::json)
+    FROM playlist_songs ps JOIN songs s ON s.id = ps.song_id
+    WHERE ps.playlist_id = {{pid}})"""
+
+PLAYLIST_JSON = f"json_build_object('id', p.id, 'name', p.name, 'songs', {SONGS_OF.format(pid='p.id')})"
+USER_JSON = "json_build_object('id', u.id, 'name', u.name, 'age', u.age)"
+
+
+class JsonBackend(SqlChangeFeed, SqlPlaylistWrites, DataBackend):
+    returns_dicts = True
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def _value(self, sql, params=None):
+        """Runs a query returning one JSON value and gives back the decoded value."""
+        with self.engine.connect() as conn:
+            return conn.execute(text(sql), params or {}).scalar()
+
+    def all_users(self):
+        return self._value(f"SELECT COALESCE(json_agg({USER_JSON}), '[]'::json) FROM users u")
+
+    def all_songs(self):
+        return self._value(f"SELECT COALESCE(json_agg({SONG_JSON}), '[]'::json) FROM songs s")
+
+
+class JsonAggBackend(JsonBackend):
+    def all_users_with_playlists(self):
+        # grouped joins instead of SONGS_OF per playlist: one pass over each table
+        return self._value(f"""
+            WITH pl AS (
+                SELECT p.user_id, p.id, json_build_object(
+                    'id', p.id, 'name', p.name,
+                    'songs', COALESCE(json_agg({SONG_JSON}) FILTER (WHERE s.id IS NOT NULL), '[]'::json)
+                ) AS playlist
+                FROM playlists p
+                LEFT JOIN playlist_songs ps ON ps.playlist_id = p.id
+                LEFT JOIN songs s ON s.id = ps.song_id
+                GROUP BY p.id
+            ), by_user AS (
+                SELECT user_id, json_agg(playlist ORDER BY id) AS playlists FROM pl GROUP BY user_id
+            )
+            SELECT COALESCE(json_agg(json_build_object(
+                'id', u.id, 'name', u.name, 'age', u.age,
+                'playlists', COALESCE(b.playlists, '[]'::json)
+            ) ORDER BY u.id), '[]'::json)
+            FROM users u LEFT JOIN by_user b ON b.user_id = u.id
+        """)
+
+    def user_playlists(self, user_id):
+        return self._value(f"""
+            SELECT COALESCE(json_agg({PLAYLIST_JSON} ORDER BY p.id), '[]'::json)
+            FROM playlists p WHERE p.user_id = :uid
+        """, {"uid": user_id})
+
+    def playlist_songs(self, playlist_id):
+        return self._value("SELECT " + SONGS_OF.format(pid=":pid"), {"pid": playlist_id})
+
+    def playlists_by_song(self, song_id):
+        return self._value(f"""
+            SELECT COALESCE(json_agg({PLAYLIST_JSON}), '[]'::json)
+            FROM playlists p JOIN playlist_songs x ON x.playlist_id = p.id
+            WHERE x.song_id = :sid
+        """, {"sid": song_id})
+
+
+class MatviewBackend(JsonBackend):
+    create_playlist = DataBackend.create_playlist
+    add_playlist_songs = DataBackend.add_playlist_songs
+    remove_playlist_songs = DataBackend.remove_playlist_songs
+
+    def _playlists(self, sql, params=None):
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(sql), params or {}).fetchall()
+        return [{"id": r[0], "name": r[1], "songs": r[2]} for r in rows]
+
+    def all_users_with_playlists(self):
+        with self.engine.connect() as conn:
+            users = conn.execute(text("SELECT id, name, age FROM users ORDER BY id")).fetchall()
+            playlists = conn.execute(text(
+                "SELECT user_id, id, name, songs FROM playlist_with_songs ORDER BY id"
+            )).fetchall()
+        by_user = {}
+        for r in playlists:
+            by_user.setdefault(r[0], []).append({"id": r[1], "name": r[2], "songs": r[3]})
+        return [{"id": u[0], "name": u[1], "age": u[2], "playlists": by_user.get(u[0], [])} for u in users]
+
+    def user_playlists(self, user_id):
+        return self._playlists(
+            "SELECT id, name, songs FROM playlist_with_songs WHERE user_id = :uid ORDER BY id",
+            {"uid": user_id},
+        )
+
+    def playlist_songs(self, playlist_id):
+        songs = self._value("SELECT songs FROM playlist_with_songs WHERE id = :pid", {"pid": playlist_id})
+        return songs if songs is not None else []
+
+    def playlists_by_song(self, song_id):
+        return self._playlists("""
+            SELECT v.id, v.name, v.songs
+            FROM playlist_with_songs v
+            JOIN playlist_songs ps ON ps.playlist_id = v.id
+            WHERE ps.song_id = :sid
+        """, {"sid": song_id})
@@ -0,0 +1,271 @@
+"""Per-request latency breakdown for the Python services, in Prometheus format.
+
+Every request is split into phases:
+
+    queue   accepted by the server -> handler starts (gRPC thread pool queue,
+            or waiting for the event loop in the GraphQL app)
+    db      time inside SQL statements (SQLAlchemy cursor events, or
+            db_timer() around other drivers)
+    build   the rest of the handler/resolver: turning rows into messages or
+            Strawberry objects
+    encode  protobuf serialization / JSON encoding of the response
+
+exported as rpc_phase_seconds{service,method,phase}, next to
+rpc_request_seconds{service,method} (whole request) and
+rpc_in_flight{service,method}. For gRPC `method` is the RPC name; for GraphQL
+it is the root field(s) of the operation, except for rpc_in_flight, which is
+counted per HTTP path by the ASGI middleware before the query is parsed.
+
+grpc/server.py wires this through MetricsInterceptor; graphql/main.py through
+MetricsMiddleware, MetricsExtension and MetricsGraphQLRouter.
+"""
+import contextvars
+import time
+import weakref
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+
+from common import tracing
+from common.util import once, optional_import
+
+# up to the 30 s+ GraphQL p95 seen at 500 users
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_SECONDS = Histogram("rpc_request_seconds", "Whole request, queue to encoded response",
+                            ["service", "method"], buckets=BUCKETS)
+PHASE_SECONDS = Histogram("rpc_phase_seconds", "Request time by phase (queue, db, build, encode)",
+                          ["service", "method", "phase"], buckets=BUCKETS)
+IN_FLIGHT = Gauge("rpc_in_flight", "Requests accepted and not yet answered", ["service", "method"])
+ERRORS = Counter("rpc_errors", "Requests that raised", ["service", "method"])
+
+
+class PhaseClock:
+    """DB time accumulated by the statements of the current request/field."""
+    __slots__ = ("db",)
+
+    def __init__(self):
+        self.db = 0.0
+
+
+_clock = contextvars.ContextVar("phase_clock", default=None)
+
+
+def start_clock():
+    clock = PhaseClock()
+    return clock, _clock.set(clock)
+
+
+def stop_clock(token):
+    _clock.reset(token)
+
+
+def add_db_time(seconds):
+    clock = _clock.get()
+    if clock is not None:
+        clock.db += seconds
+
+
+@contextmanager
+def db_timer():
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_db_time(time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    """Counts the time of every statement run through `engine` as DB time."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        add_db_time(time.perf_counter() - conn.info["query_start"].pop())
+
+    return engine
+
+
+def observe_phases(service, method, queue=None, db=None, build=None, encode=None):
+    for phase, seconds in (("queue", queue), ("db", db), ("build", build), ("encode", encode)):
+        if seconds is not None:
+            PHASE_SECONDS.labels(service, method, phase).observe(seconds)
+
+
+# =====================================================================
+# gRPC
+# =====================================================================
+grpc = optional_import("grpc")
+
+if grpc is not None:
+    class MetricsInterceptor(grpc.ServerInterceptor):
+        """Wraps unary-unary handlers. intercept_service runs on the server's
+        polling thread, before the call is queued for a worker, which is what
+        makes the queue phase measurable. The response serializer is wrapped
+        too, since grpc encodes the message after the handler returns.
+
+        Not every call gets that far: the client may cancel or hit its
+        deadline, in the queue or in the handler, and a handler may set an
+        error code and return nothing. The end of the request (request time,
+        in-flight gauge) is therefore released once, by whichever comes
+        first: the serializer, grpc's termination callback, or the handler
+        being dropped by grpc unrun (cancelled while still queued)."""
+
+        def __init__(self, service="grpc"):
+            self.service = service
+
+        def intercept_service(self, continuation, handler_call_details):
+            handler = continuation(handler_call_details)
+            if handler is None or handler.unary_unary is None:
+                return handler
+
+            arrived = time.perf_counter()
+            method = handler_call_details.method.rsplit("/", 1)[-1]
+            in_flight = IN_FLIGHT.labels(self.service, method)
+            in_flight.inc()
+            behavior, serializer = handler.unary_unary, handler.response_serializer
+            service = self.service
+
+            @once
+            def finish():
+                REQUEST_SECONDS.labels(service, method).observe(time.perf_counter() - arrived)
+                in_flight.dec()
+
+            def timed_behavior(request, context):
+                context.add_callback(finish)
+                started = time.perf_counter()
+                clock, token = start_clock()
+                try:
+                    response = behavior(request, context)
+                except Exception:
+                    ERRORS.labels(service, method).inc()
+                    raise
+                finally:
+                    stop_clock(token)
+                handled = time.perf_counter()
+                observe_phases(service, method, queue=started - arrived, db=clock.db,
+                               build=handled - started - clock.db)
+                return response
+
+            def timed_serializer(message):
+                start = time.perf_counter()
+                try:
+                    return serializer(message)
+                finally:
+                    observe_phases(service, method, encode=time.perf_counter() - start)
+                    finish()
+
+            # grpc drops the handler once the call is over; when it was
+            # cancelled before a worker took it, the behavior never ran
+            weakref.finalize(timed_behavior, finish)
+            return handler._replace(unary_unary=timed_behavior, response_serializer=timed_serializer)
+
+
+# =====================================================================
+# GraphQL (ASGI + Strawberry)
+# =====================================================================
+class MetricsMiddleware:
+    """Plain ASGI middleware: stamps the arrival time on the scope (read by
+    MetricsExtension for the queue phase), counts requests in flight and
+    observes the whole request once the response is sent."""
+
+    def __init__(self, app, service="graphql"):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        scope["arrived_at"] = time.perf_counter()
+        in_flight = IN_FLIGHT.labels(self.service, scope["path"])
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight.dec()
+            # set by MetricsExtension when the request was a GraphQL operation
+            method = scope.get("graphql_method")
+            if method is not None:
+                REQUEST_SECONDS.labels(self.service, method).observe(time.perf_counter() - scope["arrived_at"])
+
+
+try:
+    from strawberry.extensions import SchemaExtension
+    from strawberry.fastapi import GraphQLRouter
+except ImportError:  # the gRPC image does not ship strawberry
+    SchemaExtension = GraphQLRouter = None
+
+if SchemaExtension is not None:
+    from graphql import FieldNode, OperationDefinitionNode
+
+    # root fields of the request's operation, for the encode phase timed by the router
+    _graphql_method = contextvars.ContextVar("graphql_method", default="unknown")
+
+    def _root_fields(execution_context):
+        """Root field names of the executed operation, read from the parsed
+        document rather than the result: a failed operation has no data."""
+        document = execution_context.graphql_document
+        name = execution_context.operation_name
+        operation = next((d for d in (document.definitions if document else ())
+                          if isinstance(d, OperationDefinitionNode)
+                          and (name is None or (d.name is not None and d.name.value == name))), None)
+        if operation is None:
+            return "unknown"
+        fields = dict.fromkeys(s.name.value for s in operation.selection_set.selections if isinstance(s, FieldNode))
+        return "+".join(fields) or "unknown"
+
+    class MetricsExtension(SchemaExtension):
+        """Times the execution of the operation (db + build) and its queue
+        phase. No per-field resolve hook: it would run for every nested field
+        of a response and cost more than what it measures."""
+
+        service = "graphql"
+
+        def on_operation(self):
+            started = time.perf_counter()
+            request = (self.execution_context.context or {}).get("request")
+            self.db = self.execute = None
+            yield
+            result = self.execution_context.result
+            # only validated operations execute; the others stay "unknown", so
+            # clients cannot add label values with made-up field names
+            method = _root_fields(self.execution_context) if self.execute is not None else "unknown"
+            _graphql_method.set(method)
+            arrived = request.scope.get("arrived_at") if request is not None else None
+            observe_phases(self.service, method,
+                           queue=started - arrived if arrived is not None else None,
+                           db=self.db,
+                           build=self.execute - self.db if self.execute is not None else None)
+            if result is not None and result.errors:
+                ERRORS.labels(self.service, method).inc()
+            # the whole request is observed by MetricsMiddleware after the response
+            if request is not None:
+                request.scope["graphql_method"] = method
+
+        def on_execute(self):
+            # runs in the request's context, so the statements executed by the
+            # (synchronous) resolvers add to this clock
+            clock, token = start_clock()
+            start = time.perf_counter()
+            yield
+            self.execute = time.perf_counter() - start
+            self.db = clock.db
+            stop_clock(token)
+
+    class MetricsGraphQLRouter(GraphQLRouter):
+        """Times the JSON encoding of the response (and traces it when
+        tracing is on)."""
+
+        service = "graphql"
+
+        def encode_json(self, data):
+            start = time.perf_counter()
+            with tracing.span("encode"):
+                body = super().encode_json(data)
+            done = time.perf_counter()
+            observe_phases(self.service, _graphql_method.get(), encode=done - start)
+            return body
@@ -0,0 +1,277 @@
+"""On-demand sampling profiler for the Python services.
+
+Off unless PROFILING=1. Then each service answers
+
+    GET /debug/profile?seconds=10&interval_ms=5&memory=1&idle=0[&format=collapsed]
+
+on its metrics port (gRPC: 9100, next to /metrics) or its HTTP port
+(GraphQL: 8000). For `seconds` the profiler:
+
+- samples the Python stack of every thread every `interval_ms`
+  (sys._current_frames from a background thread, so nothing is patched and
+  the cost is one stack walk per thread per tick), and with an event loop the
+  chain of awaits of every suspended asyncio task, prefixed "[await]";
+- traces the allocations made meanwhile with tracemalloc (memory=1; slows
+  allocations down while it runs, so it is only on during the window).
+
+The JSON answer holds the samples as collapsed stacks ("thread;outer;...;leaf
+count", the input of flamegraph.pl / speedscope / inferno) and the top
+allocation sites: live at the end of the window and grown during it.
+format=collapsed returns only the stacks, as text. Threads parked in a
+known wait (idle gRPC workers, the selector of an idle event loop, tasks
+sleeping or reading a queue) are left out unless idle=1.
+
+PROFILING_TRACEMALLOC=N starts tracemalloc with N frames at startup
+instead, so the snapshot also covers what was allocated before the window.
+
+Only one profile runs at a time; a second request gets an error.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from urllib.parse import parse_qs
+
+from common.util import flag
+
+MAX_SECONDS = 120
+TOP_ALLOCATIONS = 25
+
+# (file, function) of the Python frame a thread sits in while it waits for work
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),  # concurrent.futures worker blocked on its queue
+    ("_server.py", "_serve"),  # grpc polling thread
+    # suspended asyncio tasks waiting for a timer or a queue
+    ("tasks.py", "sleep"),
+    ("queues.py", "get"),
+}
+
+_lock = threading.Lock()
+
+
+def enabled():
+    return flag("PROFILING")
+
+
+def setup_profiling():
+    frames = int(os.getenv("PROFILING_TRACEMALLOC", "0"))
+    if enabled() and frames > 0 and not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+# =====================================================================
+# Stack sampling
+# =====================================================================
+def _short_path(filename):
+    parts = filename.replace("\\", "/").split("/")
+    if "site-packages" in parts:
+        return "/".join(parts[parts.index("site-packages") + 1:])
+    return "/".join(parts[-2:])
+
+
+class _Labels:
+    """Frame labels, cached per code object: the same function always gets
+    the same label, so its samples merge in the flame graph."""
+
+    def __init__(self):
+        self._cache = {}
+
+    def __call__(self, code):
+        label = self._cache.get(code)
+        if label is None:
+            label = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+            self._cache[code] = label
+        return label
+
+
+def _frame_stack(frame, label):
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return codes, [label(c) for c in codes]
+
+
+def _is_idle(code):
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES
+
+
+def _await_stack(coro, label):
+    """Outermost-first code objects and labels of a suspended coroutine and
+    what it awaits."""
+    codes = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        codes.append(frame.f_code)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return codes, [label(c) for c in codes]
+
+
+def sample_stacks(seconds, interval=0.005, loop=None, idle=False):
+    """Samples every thread (and the tasks of `loop`) for `seconds`.
+    Returns ({collapsed stack: count}, number of ticks)."""
+    me = threading.get_ident()
+    label = _Labels()
+    counts = {}
+    ticks = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            codes, labels = _frame_stack(frame, label)
+            if not idle and codes and _is_idle(codes[-1]):
+                continue
+            key = ";".join([names.get(ident, f"thread-{ident}"), *labels])
+            counts[key] = counts.get(key, 0) + 1
+        if loop is not None:
+            try:
+                tasks = asyncio.all_tasks(loop)
+            except RuntimeError:  # the loop changed the task set under us
+                tasks = ()
+            for task in tasks:
+                codes, labels = _await_stack(task.get_coro(), label)
+                if codes and (idle or not _is_idle(codes[-1])):
+                    key = ";".join(["[await] " + task.get_name(), *labels])
+                    counts[key] = counts.get(key, 0) + 1
+        ticks += 1
+        time.sleep(interval)
+    return counts, ticks
+
+
+def collapsed(counts):
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items(), key=lambda kv: -kv[1]))
+
+
+# =====================================================================
+# Allocations
+# =====================================================================
+def _allocation_rows(stats, limit):
+    rows = []
+    for stat in stats[:limit]:
+        frames = stat.traceback  # oldest frame first
+        row = {
+            "where": f"{_short_path(frames[-1].filename)}:{frames[-1].lineno}",
+            "traceback": [f"{_short_path(f.filename)}:{f.lineno}" for f in frames],
+            "kib": round(stat.size / 1024, 1),
+            "blocks": stat.count,
+        }
+        if hasattr(stat, "size_diff"):
+            row.update(kib_diff=round(stat.size_diff / 1024, 1), blocks_diff=stat.count_diff)
+        rows.append(row)
+    return rows
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+
+
+# =====================================================================
+# Profile
+# =====================================================================
+def profile(seconds=10.0, interval=0.005, memory=True, idle=False, loop=None, service=""):
+    """Runs the sampler (and tracemalloc) for `seconds`; returns a dict."""
+    seconds = min(max(float(seconds), 0.1), MAX_SECONDS)
+    if not _lock.acquire(blocking=False):
+        raise RuntimeError("a profile is already running")
+    try:
+        started_tracing = memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(int(os.getenv("PROFILING_TRACEMALLOC", "0")) or 10)
+        before = _snapshot() if memory else None
+        cpu, wall = time.process_time(), time.perf_counter()
+        counts, ticks = sample_stacks(seconds, interval, loop=loop, idle=idle)
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+        result = {
+            "service": service,
+            "pid": os.getpid(),
+            "seconds": round(wall, 3),
+            "interval_ms": interval * 1000,
+            "ticks": ticks,
+            # whole process, sampler included
+            "cpu_seconds": round(cpu, 3),
+            "samples": sum(counts.values()),
+            "collapsed": collapsed(counts),
+        }
+        if memory:
+            after = _snapshot()
+            result["allocations"] = {
+                "traced_kib": round(tracemalloc.get_traced_memory()[0] / 1024, 1),
+                "top": _allocation_rows(after.statistics("traceback"), TOP_ALLOCATIONS),
+                "growth": _allocation_rows(after.compare_to(before, "traceback"), TOP_ALLOCATIONS),
+            }
+            if started_tracing:
+                tracemalloc.stop()
+        return result
+    finally:
+        _lock.release()
+
+
+def parse_params(params):
+    """Query string values -> profile() keyword arguments."""
+    return {
+        "seconds": float(params.get("seconds", 10)),
+        "interval": float(params.get("interval_ms", 5)) / 1000,
+        "memory": params.get("memory", "1") not in ("0", "false", "no"),
+        "idle": params.get("idle", "0") in ("1", "true", "yes"),
+    }
+
+
+# =====================================================================
+# HTTP (gRPC: metrics port)
+# =====================================================================
+def wsgi_app(fallback, service=""):
+    """Serves /debug/profile when PROFILING=1 and hands every other path to
+    `fallback` (the Prometheus app)."""
+
+    def app(environ, start_response):
+        if not enabled() or environ.get("PATH_INFO") != "/debug/profile":
+            return fallback(environ, start_response)
+        params = {k: v[-1] for k, v in parse_qs(environ.get("QUERY_STRING", "")).items()}
+        try:
+            kwargs = parse_params(params)
+        except ValueError as e:
+            start_response("400 Bad Request", [("Content-Type", "text/plain")])
+            return [str(e).encode()]
+        try:
+            result = profile(service=service, **kwargs)
+        except RuntimeError as e:
+            start_response("409 Conflict", [("Content-Type", "text/plain")])
+            return [str(e).encode()]
+        if params.get("format") == "collapsed":
+            start_response("200 OK", [("Content-Type", "text/plain; charset=utf-8")])
+            return [result["collapsed"].encode()]
+        start_response("200 OK", [("Content-Type", "application/json")])
+        return [json.dumps(result).encode()]
+
+    return app
+
+
+def start_http_server(port, service=""):
+    """prometheus_client.start_http_server, plus /debug/profile."""
+    from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+    from prometheus_client import make_wsgi_app
+    from prometheus_client.exposition import ThreadingWSGIServer
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    httpd = make_server("0.0.0.0", port, wsgi_app(make_wsgi_app(), service), ThreadingWSGIServer,
+                        handler_class=QuietHandler)
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    return httpd
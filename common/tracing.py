@@ -0,0 +1,414 @@
+"""OpenTelemetry tracing from the Locust client through the Python services
+down to each SQL statement, exported to local files.
+
+Off unless TRACING=1. Settings:
+
+    TRACE_DIR           where the span files go (default "traces")
+    TRACE_SLOW_MS       traces whose local root took at least this long are
+                        always kept (default 200)
+    TRACE_SAMPLE_RATIO  share of the other traces kept (default 0.01)
+    TRACE_MAX_PENDING   traces buffered while their root span is still open
+                        (default 20000; the oldest are dropped beyond that)
+
+The trace context travels as a W3C `traceparent` header (HTTP) or gRPC
+metadata entry. Each process writes <TRACE_DIR>/<service>-<pid>.jsonl, one
+OTLP/JSON ExportTraceServiceRequest per line, the same format as the
+collector's file exporter, so the files can be fed to an OpenTelemetry
+collector (otlpjsonfile receiver) or read by bench/slowest_traces.py.
+
+Sampling is done at the tail: every request is traced, the spans of a trace
+are held in memory until its local root ends, and only then is the trace
+kept or dropped (TailSamplingProcessor), so slow and failed requests are
+always exported while the rest cost a few span objects. The ratio test uses
+the trace id, so the client and the services keep the same sampled traces;
+slow traces are decided per process (a request that was only slow on the
+client side keeps its client span only).
+
+grpc/server.py wires this through TracingInterceptor, graphql/main.py through
+TracingMiddleware, common/db_pool.py through instrument_engine, and
+locust/load_test.py through client_span.
+"""
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+from common.util import flag, once, optional_import
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # images built without the opentelemetry packages
+    trace = None
+
+_tracer = None
+
+
+def enabled():
+    return _tracer is not None
+
+
+# =====================================================================
+# Export: OTLP/JSON lines
+# =====================================================================
+def _any_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attrs):
+    return [{"key": k, "value": _any_value(v)} for k, v in (attrs or {}).items()]
+
+
+def span_json(span):
+    ctx = span.get_span_context()
+    out = {
+        "traceId": format(ctx.trace_id, "032x"),
+        "spanId": format(ctx.span_id, "016x"),
+        "parentSpanId": format(span.parent.span_id, "016x") if span.parent is not None else "",
+        "name": span.name,
+        "kind": span.kind.value + 1,  # OTLP numbers SPAN_KIND_INTERNAL as 1
+        "startTimeUnixNano": str(span.start_time),
+        "endTimeUnixNano": str(span.end_time),
+        "attributes": _attributes(span.attributes),
+        "status": {"code": span.status.status_code.value},
+    }
+    if span.status.description:
+        out["status"]["message"] = span.status.description
+    if span.events:
+        out["events"] = [
+            {"timeUnixNano": str(e.timestamp), "name": e.name, "attributes": _attributes(e.attributes)}
+            for e in span.events
+        ]
+    return out
+
+
+if trace is not None:
+    class FileSpanExporter(SpanExporter):
+        """Appends each batch as one OTLP/JSON line."""
+
+        def __init__(self, path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.path = path
+            self._file = open(path, "a")
+            self._lock = threading.Lock()
+
+        def export(self, spans):
+            grouped = OrderedDict()
+            for span in spans:
+                scope = span.instrumentation_scope
+                key = (span.resource, scope.name if scope else "")
+                grouped.setdefault(key, []).append(span_json(span))
+            by_resource = OrderedDict()
+            for (resource, scope), items in grouped.items():
+                by_resource.setdefault(resource, []).append({"scope": {"name": scope}, "spans": items})
+            line = json.dumps({"resourceSpans": [
+                {"resource": {"attributes": _attributes(resource.attributes)}, "scopeSpans": scopes}
+                for resource, scopes in by_resource.items()
+            ]}, separators=(",", ":"))
+            with self._lock:
+                self._file.write(line + "\n")
+                self._file.flush()
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self):
+            with self._lock:
+                self._file.close()
+
+    class TailSamplingProcessor(SpanProcessor):
+        """Buffers the spans of each trace until its local root (a span with
+        no parent, or a remote one) ends, then passes the whole trace to
+        `next` if it failed, was slow or falls in the sampled ratio."""
+
+        def __init__(self, next_processor, slow_ms=200.0, ratio=0.01, max_pending=20000):
+            self.next = next_processor
+            self.slow_ns = int(slow_ms * 1e6)
+            self.ratio_bound = int(ratio * (1 << 64))
+            self.max_pending = max_pending
+            self.pending = OrderedDict()  # trace id -> finished spans
+            self.kept = self.dropped = self.evicted = 0
+            self._lock = threading.Lock()
+
+        def on_start(self, span, parent_context=None):
+            pass
+
+        def on_end(self, span):
+            trace_id = span.context.trace_id
+            local_root = span.parent is None or span.parent.is_remote
+            with self._lock:
+                if not local_root:
+                    self.pending.setdefault(trace_id, []).append(span)
+                    if len(self.pending) > self.max_pending:
+                        self.pending.popitem(last=False)
+                        self.evicted += 1
+                    return
+                spans = self.pending.pop(trace_id, [])
+            spans.append(span)
+            if self._keep(span, spans):
+                self.kept += 1
+                for s in spans:
+                    self.next.on_end(s)
+            else:
+                self.dropped += 1
+
+        def _keep(self, root, spans):
+            if root.end_time - root.start_time >= self.slow_ns:
+                return True
+            if any(s.status.status_code is StatusCode.ERROR for s in spans):
+                return True
+            # same test as TraceIdRatioBased, so every process agrees
+            return (root.context.trace_id & 0xFFFFFFFFFFFFFFFF) < self.ratio_bound
+
+        def shutdown(self):
+            self.next.shutdown()
+
+        def force_flush(self, timeout_millis=30000):
+            return self.next.force_flush(timeout_millis)
+
+
+def setup_tracing(service):
+    """Installs the tracer provider when TRACING=1; returns the tracer or None."""
+    global _tracer
+    if _tracer is not None or not flag("TRACING"):
+        return _tracer
+    if trace is None:
+        print("TRACING=1 but the opentelemetry packages are not installed")
+        return None
+
+    path = os.path.join(os.getenv("TRACE_DIR", "traces"), f"{service}-{os.getpid()}.jsonl")
+    sampler = TailSamplingProcessor(
+        BatchSpanProcessor(FileSpanExporter(path)),
+        slow_ms=float(os.getenv("TRACE_SLOW_MS", "200")),
+        ratio=float(os.getenv("TRACE_SAMPLE_RATIO", "0.01")),
+        max_pending=int(os.getenv("TRACE_MAX_PENDING", "20000")),
+    )
+    provider = TracerProvider(resource=Resource.create({"service.name": service}))
+    provider.add_span_processor(sampler)
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("demo.tracing")
+    print(f"Tracing to {path} (slow >= {sampler.slow_ns / 1e6:g} ms, ratio {sampler.ratio_bound / (1 << 64):g})")
+    return _tracer
+
+
+def flush():
+    if _tracer is not None:
+        trace.get_tracer_provider().force_flush()
+
+
+def record_error(span, exc):
+    if span is not None:
+        span.record_exception(exc)
+        span.set_status(Status(StatusCode.ERROR, str(exc)))
+
+
+# =====================================================================
+# Client side (Locust)
+# =====================================================================
+@contextmanager
+def client_span(name, **attributes):
+    """Root span around one client call. Yields (headers, span): headers holds
+    the traceparent to send (HTTP headers, or gRPC metadata via
+    tuple(headers.items())); both are empty/None with tracing off. The parent
+    is passed explicitly instead of through the current context, which gevent
+    greenlets would share."""
+    if _tracer is None:
+        yield {}, None
+        return
+    span = _tracer.start_span(name, context=otel_context.Context(), kind=SpanKind.CLIENT, attributes=attributes)
+    headers = {}
+    propagate.inject(headers, context=trace.set_span_in_context(span))
+    try:
+        yield headers, span
+    except Exception as e:
+        record_error(span, e)
+        raise
+    finally:
+        span.end()
+
+
+# =====================================================================
+# SQL statements
+# =====================================================================
+STATEMENT_LIMIT = 2000
+
+
+def _statement_attributes(statement):
+    return {"db.system": "postgresql", "db.statement": " ".join(statement.split())[:STATEMENT_LIMIT]}
+
+
+def _statement_name(statement):
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+
+
+def instrument_engine(engine):
+    """One CLIENT span per statement run through `engine`, child of the
+    request's server span. No-op with tracing off."""
+    if _tracer is None:
+        return engine
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        span = _tracer.start_span(_statement_name(statement), kind=SpanKind.CLIENT,
+                                  attributes=_statement_attributes(statement))
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        conn.info["trace_spans"].pop().end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+        if spans:
+            span = spans.pop()
+            record_error(span, context.original_exception)
+            span.end()
+
+    return engine
+
+
+def db_span(statement):
+    """Span around a statement run outside SQLAlchemy (the psycopg backends)."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(_statement_name(statement), kind=SpanKind.CLIENT,
+                                         attributes=_statement_attributes(statement))
+
+
+def span(name, **attributes):
+    """Internal span under the current one, e.g. the response encoding."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+# =====================================================================
+# gRPC
+# =====================================================================
+grpc = optional_import("grpc")
+
+if grpc is not None:
+    class TracingInterceptor(grpc.ServerInterceptor):
+        """SERVER span per unary-unary call, continuing the caller's trace from
+        the invocation metadata. It starts on the polling thread when the call
+        arrives (so it covers the thread-pool queue, recorded as
+        rpc.queue_ms), is current while the handler runs, and ends after the
+        response is serialized, with an `encode` child span for that.
+
+        Calls that end without a reply (client cancellation, deadline, an
+        error code set by the handler) end it from grpc's termination
+        callback instead, or when grpc drops a call cancelled in the queue,
+        marked as errors so tail sampling keeps them. Whichever comes first
+        ends the span; the others do nothing."""
+
+        def intercept_service(self, continuation, handler_call_details):
+            handler = continuation(handler_call_details)
+            if _tracer is None or handler is None or handler.unary_unary is None:
+                return handler
+
+            full_method = handler_call_details.method.lstrip("/")
+            service, _, method = full_method.rpartition("/")
+            parent = propagate.extract(dict(handler_call_details.invocation_metadata or ()))
+            server_span = _tracer.start_span(full_method, context=parent, kind=SpanKind.SERVER, attributes={
+                "rpc.system": "grpc", "rpc.service": service, "rpc.method": method,
+            })
+            arrived = time.perf_counter()
+            behavior, serializer = handler.unary_unary, handler.response_serializer
+            call = {}  # the ServicerContext, once a worker runs the handler
+
+            @once
+            def end(fallback_code=None):
+                context = call.get("context")
+                code = context.code() if context is not None else None
+                if code in (None, grpc.StatusCode.OK):
+                    code = fallback_code
+                if code is not None:
+                    server_span.set_attribute("rpc.grpc.status_code", code.value[0])
+                    server_span.set_status(Status(StatusCode.ERROR, code.name))
+                server_span.end()
+
+            def terminated():
+                # first only when no reply was serialized
+                remaining = call["context"].time_remaining()
+                expired = remaining is not None and remaining <= 0
+                end(grpc.StatusCode.DEADLINE_EXCEEDED if expired else grpc.StatusCode.CANCELLED)
+
+            def traced_behavior(request, context):
+                call["context"] = context
+                context.add_callback(terminated)
+                server_span.set_attribute("rpc.queue_ms", 1000 * (time.perf_counter() - arrived))
+                token = otel_context.attach(trace.set_span_in_context(server_span))
+                try:
+                    return behavior(request, context)
+                except Exception as e:
+                    record_error(server_span, e)
+                    end()
+                    raise
+                finally:
+                    otel_context.detach(token)
+
+            def traced_serializer(message):
+                parent_ctx = trace.set_span_in_context(server_span)
+                try:
+                    with _tracer.start_as_current_span("encode", context=parent_ctx) as encode:
+                        body = serializer(message)
+                        encode.set_attribute("message.bytes", len(body))
+                        return body
+                finally:
+                    end()
+
+            # grpc drops the handler once the call is over; when it was
+            # cancelled before a worker took it, the behavior never ran
+            weakref.finalize(traced_behavior, end, grpc.StatusCode.CANCELLED)
+            return handler._replace(unary_unary=traced_behavior, response_serializer=traced_serializer)
+
+
+# =====================================================================
+# GraphQL (ASGI)
+# =====================================================================
+class TracingMiddleware:
+    """Plain ASGI middleware: SERVER span per HTTP request, continuing the
+    trace from the request headers and current while the app runs, so the
+    resolvers' statements and the JSON encoding become its children. Renamed
+    after the GraphQL root field(s) once MetricsExtension has set them."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if _tracer is None or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        carrier = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", ())}
+        parent = propagate.extract(carrier)
+        name = f"{scope['method']} {scope['path']}"
+        with _tracer.start_as_current_span(name, context=parent, kind=SpanKind.SERVER, attributes={
+            "http.request.method": scope["method"], "url.path": scope["path"],
+        }) as server_span:
+            status = {}
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+                    server_span.set_attribute("http.response.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+            method = scope.get("graphql_method")
+            if method is not None:
+                server_span.update_name(f"graphql {method}")
+                server_span.set_attribute("graphql.root_fields", method)
+            if status.get("code", 200) >= 500:
+                server_span.set_status(Status(StatusCode.ERROR))
@@ -0,0 +1,134 @@
+"""Compression and connection settings of the Python services and the Locust
+clients, from env vars. Everything defaults to what the libraries do on their
+own, so unset means "as before".
+
+gRPC (grpc/server.py and GrpcApiUser in locust/load_test.py):
+
+    GRPC_COMPRESSION            none | gzip | deflate (default none). On the
+                                server it compresses the responses, on the
+                                client the requests; both sides always
+                                accept all three.
+    GRPC_MAX_MESSAGE_MB         max send/receive message size (gRPC: 4)
+    GRPC_HTTP2_BDP_PROBE        0 turns off gRPC's automatic sizing of the
+                                HTTP/2 flow-control windows (default 1)
+    GRPC_HTTP2_WINDOW_BYTES     initial per-stream window (gRPC: 64 KiB); with
+                                the BDP probe on, gRPC still grows it
+    GRPC_HTTP2_MAX_FRAME_BYTES  largest HTTP/2 frame the peer may send
+    GRPC_KEEPALIVE_MS           ping idle connections every N ms; the server
+                                accepts pings that often
+    GRPC_KEEPALIVE_TIMEOUT_MS   drop the connection when a ping goes unanswered
+                                for N ms (gRPC: 20000)
+
+GraphQL (graphql/main.py):
+
+    HTTP_COMPRESSION            none | gzip | brotli (default none); only for
+                                clients that send a matching Accept-Encoding
+    HTTP_COMPRESSION_MIN_BYTES  responses smaller than this go out as they are
+                                (default 1024: below that the saving is a few
+                                hundred bytes and not worth the CPU)
+    HTTP_COMPRESSION_LEVEL      gzip 1-9 (default 6) or brotli 0-11 (default 4)
+
+and HTTP_ACCEPT_ENCODING on the Locust side (GraphqlApiUser) sets the
+Accept-Encoding the load test sends.
+"""
+import os
+
+GRPC_COMPRESSIONS = ("none", "gzip", "deflate")
+HTTP_COMPRESSIONS = ("none", "gzip", "brotli")
+DEFAULT_HTTP_LEVELS = {"gzip": 6, "brotli": 4}
+
+
+def _choice(name, choices):
+    value = os.getenv(name, "none").strip().lower() or "none"
+    if value not in choices:
+        raise ValueError(f"{name}={value!r}; one of {', '.join(choices)}")
+    return value
+
+
+def _int(name):
+    value = os.getenv(name, "").strip()
+    return int(value) if value else None
+
+
+# =====================================================================
+# gRPC
+# =====================================================================
+def grpc_compression():
+    """The grpc.Compression of GRPC_COMPRESSION."""
+    import grpc
+
+    return {
+        "none": grpc.Compression.NoCompression,
+        "gzip": grpc.Compression.Gzip,
+        "deflate": grpc.Compression.Deflate,
+    }[_choice("GRPC_COMPRESSION", GRPC_COMPRESSIONS)]
+
+
+def grpc_options(server=False):
+    """Channel arguments for grpc.server(options=...) or grpc.*_channel(options=...)."""
+    options = []
+    max_mb = _int("GRPC_MAX_MESSAGE_MB")
+    if max_mb:
+        options += [("grpc.max_send_message_length", max_mb << 20),
+                    ("grpc.max_receive_message_length", max_mb << 20)]
+    bdp_probe = _int("GRPC_HTTP2_BDP_PROBE")
+    if bdp_probe is not None:
+        options.append(("grpc.http2.bdp_probe", bdp_probe))
+    window = _int("GRPC_HTTP2_WINDOW_BYTES")
+    if window:
+        options.append(("grpc.http2.lookahead_bytes", window))
+    frame = _int("GRPC_HTTP2_MAX_FRAME_BYTES")
+    if frame:
+        options.append(("grpc.http2.max_frame_size", frame))
+    keepalive = _int("GRPC_KEEPALIVE_MS")
+    if keepalive:
+        options += [("grpc.keepalive_time_ms", keepalive),
+                    ("grpc.keepalive_permit_without_calls", 1)]
+        if server:
+            # without this the server answers pings more frequent than 5 min with GOAWAY
+            options += [("grpc.http2.min_recv_ping_interval_without_data_ms", keepalive),
+                        ("grpc.http2.max_ping_strikes", 0)]
+        else:
+            options.append(("grpc.http2.max_pings_without_data", 0))
+    keepalive_timeout = _int("GRPC_KEEPALIVE_TIMEOUT_MS")
+    if keepalive_timeout:
+        options.append(("grpc.keepalive_timeout_ms", keepalive_timeout))
+    return options
+
+
+def grpc_channel(target, options=()):
+    """grpc.insecure_channel with the options and compression of the env,
+    plus `options`."""
+    import grpc
+
+    return grpc.insecure_channel(target, options=grpc_options() + list(options), compression=grpc_compression())
+
+
+def describe_grpc():
+    compression = _choice("GRPC_COMPRESSION", GRPC_COMPRESSIONS)
+    return f"compression={compression} options={dict(grpc_options(server=True)) or 'defaults'}"
+
+
+# =====================================================================
+# HTTP (GraphQL)
+# =====================================================================
+def add_http_compression(app):
+    """Adds the HTTP_COMPRESSION middleware to a Starlette/FastAPI app.
+    Returns the encoding used ("none" when off)."""
+    encoding = _choice("HTTP_COMPRESSION", HTTP_COMPRESSIONS)
+    if encoding == "none":
+        return encoding
+    minimum_size = _int("HTTP_COMPRESSION_MIN_BYTES") or 1024
+    level = _int("HTTP_COMPRESSION_LEVEL")
+    if level is None:
+        level = DEFAULT_HTTP_LEVELS[encoding]
+    if encoding == "gzip":
+        from starlette.middleware.gzip import GZipMiddleware
+
+        app.add_middleware(GZipMiddleware, minimum_size=minimum_size, compresslevel=level)
+    else:
+        # clients without "br" in Accept-Encoding still get gzip
+        from brotli_asgi import BrotliMiddleware
+
+        app.add_middleware(BrotliMiddleware, minimum_size=minimum_size, quality=level, gzip_fallback=True)
+    return encoding
@@ -0,0 +1,35 @@
+"""Small helpers shared by the modules of common/."""
+import importlib
+import os
+import threading
+
+
+def flag(name, default="0"):
+    """Boolean env var: 1/true/yes/on."""
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def optional_import(name):
+    """The module, or None when the image does not ship it (grpcio is not in
+    the GraphQL image, strawberry not in the gRPC one)."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def once(fn):
+    """fn, run only by the first call, whichever thread makes it; later calls
+    return None. For cleanup that more than one path may trigger."""
+    lock = threading.Lock()
+    called = False
+
+    def wrapper(*args, **kwargs):
+        nonlocal called
+        with lock:
+            if called:
+                return None
+            called = True
+        return fn(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,89 @@
+"""Playlist edits for the mixed read/write workload.
+
+Three operations, each one SQL statement in its own transaction whatever the
+number of songs: the song ids go to Postgres as one array and unnest() turns
+them into rows, so a batch costs one round trip and one plan, not one INSERT
+per song.
+
+    create_playlist(user_id, name, song_ids)   playlist + its songs (one CTE)
+    add_playlist_songs(playlist_id, song_ids)  songs already there are skipped
+    remove_playlist_songs(playlist_id, song_ids)
+
+Each returns a WriteResult with the playlist id and the number of
+playlist_songs rows written. Ids are deduplicated and sorted, so concurrent
+batches on one playlist take their row locks in the same order and cannot
+deadlock. Unknown users, playlists or songs (foreign keys), values the
+columns reject (e.g. a name too long) and batches over MAX_SONGS raise
+ValueError.
+
+The triggers of ROW_VERSIONING (init_sql-gen.py) version every written row,
+so the edits also show up in the delta-sync RPCs.
+"""
+from collections import namedtuple
+
+from sqlalchemy import exc, text
+
+MAX_SONGS = 1000
+
+WriteResult = namedtuple("WriteResult", "playlist_id rows")
+
+CREATE_PLAYLIST = """
+    WITH p AS (
+        INSERT INTO playlists (user_id, name) VALUES (:user_id, :name) RETURNING id
+    ), s AS (
+        INSERT INTO playlist_songs (playlist_id, song_id)
+        SELECT p.id, song_id FROM p, unnest(CAST(:song_ids AS integer[])) AS song_id
+        RETURNING 1
+    )
+    SELECT (SELECT id FROM p), (SELECT count(*) FROM s)
+"""
+
+ADD_PLAYLIST_SONGS = """
+    INSERT INTO playlist_songs (playlist_id, song_id)
+    SELECT :playlist_id, unnest(CAST(:song_ids AS integer[]))
+    ON CONFLICT DO NOTHING
+"""
+
+REMOVE_PLAYLIST_SONGS = """
+    DELETE FROM playlist_songs
+    WHERE playlist_id = :playlist_id AND song_id = ANY(CAST(:song_ids AS integer[]))
+"""
+
+
+def song_id_batch(song_ids):
+    ids = sorted(set(song_ids))
+    if len(ids) > MAX_SONGS:
+        raise ValueError(f"at most {MAX_SONGS} songs per call, got {len(ids)}")
+    return ids
+
+
+def _message(error):
+    """The driver's message alone; str(error) would also carry the SQL."""
+    return " ".join(str(error.orig).split())
+
+
+class SqlPlaylistWrites:
+    """create_playlist/add_playlist_songs/remove_playlist_songs for backends
+    with a SQLAlchemy `engine`."""
+
+    def _write(self, sql, params, read):
+        try:
+            with self.engine.begin() as conn:
+                return read(conn.execute(text(sql), params))
+        except exc.IntegrityError as e:
+            raise ValueError("unknown user, playlist or song: " + _message(e)) from e
+        except exc.DataError as e:
+            # e.g. a name longer than the column
+            raise ValueError("invalid value: " + _message(e)) from e
+
+    def create_playlist(self, user_id, name, song_ids=()):
+        params = {"user_id": user_id, "name": name, "song_ids": song_id_batch(song_ids)}
+        return WriteResult(*self._write(CREATE_PLAYLIST, params, lambda r: r.one()))
+
+    def add_playlist_songs(self, playlist_id, song_ids):
+        params = {"playlist_id": playlist_id, "song_ids": song_id_batch(song_ids)}
+        return WriteResult(playlist_id, self._write(ADD_PLAYLIST_SONGS, params, lambda r: r.rowcount))
+
+    def remove_playlist_songs(self, playlist_id, song_ids):
+        params = {"playlist_id": playlist_id, "song_ids": song_id_batch(song_ids)}
+        return WriteResult(playlist_id, self._write(REMOVE_PLAYLIST_SONGS, params, lambda r: r.rowcount))
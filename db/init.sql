@@ -1,8 +1,12 @@
 
+DROP MATERIALIZED VIEW IF EXISTS playlist_with_songs;
+DROP TABLE IF EXISTS row_tombstones;
 DROP TABLE IF EXISTS playlist_songs;
 DROP TABLE IF EXISTS songs;
 DROP TABLE IF EXISTS playlists;
 DROP TABLE IF EXISTS users;
+-- after the tables: their version defaults use it
+DROP SEQUENCE IF EXISTS row_version_seq;
 
 CREATE TABLE users (
     id SERIAL PRIMARY KEY,
@@ -44962,3 +44966,78 @@ INSERT INTO playlist_songs (playlist_id, song_id) VALUES
 (1500, 2485),
 (1500, 2755),
 (1500, 3727);
+
+-- Row versions for the delta-sync RPCs (see ROW_VERSIONING in init_sql-gen.py)
+CREATE SEQUENCE row_version_seq;
+
+ALTER TABLE songs
+    ADD COLUMN version BIGINT NOT NULL DEFAULT nextval('row_version_seq'),
+    ADD COLUMN created_version BIGINT;
+UPDATE songs SET created_version = version;
+ALTER TABLE songs ALTER COLUMN created_version SET NOT NULL;
+ALTER TABLE playlists
+    ADD COLUMN version BIGINT NOT NULL DEFAULT nextval('row_version_seq'),
+    ADD COLUMN created_version BIGINT;
+UPDATE playlists SET created_version = version;
+ALTER TABLE playlists ALTER COLUMN created_version SET NOT NULL;
+ALTER TABLE playlist_songs
+    ADD COLUMN version BIGINT NOT NULL DEFAULT nextval('row_version_seq'),
+    ADD COLUMN created_version BIGINT;
+UPDATE playlist_songs SET created_version = version;
+ALTER TABLE playlist_songs ALTER COLUMN created_version SET NOT NULL;
+
+CREATE INDEX songs_version_idx ON songs (version);
+CREATE INDEX playlists_version_idx ON playlists (version);
+CREATE INDEX playlist_songs_version_idx ON playlist_songs (version);
+
+CREATE TABLE row_tombstones (
+    version BIGINT PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    row_key INTEGER[] NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION bump_row_version() RETURNS trigger AS $$
+BEGIN
+    NEW.version := nextval('row_version_seq');
+    IF TG_OP = 'INSERT' THEN
+        NEW.created_version := NEW.version;
+    ELSE
+        NEW.created_version := OLD.created_version;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+-- trigger arguments: the key columns of the table
+CREATE OR REPLACE FUNCTION record_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO row_tombstones (version, table_name, row_key)
+    SELECT nextval('row_version_seq'), TG_TABLE_NAME,
+           ARRAY(SELECT (to_jsonb(OLD) ->> k.col)::int
+                 FROM unnest(TG_ARGV) WITH ORDINALITY AS k(col, n) ORDER BY k.n);
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER songs_insert_version BEFORE INSERT ON songs
+    FOR EACH ROW EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER songs_update_version BEFORE UPDATE ON songs
+    FOR EACH ROW WHEN (OLD IS DISTINCT FROM NEW) EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER songs_tombstone AFTER DELETE ON songs
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone('id');
+
+CREATE TRIGGER playlists_insert_version BEFORE INSERT ON playlists
+    FOR EACH ROW EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER playlists_update_version BEFORE UPDATE ON playlists
+    FOR EACH ROW WHEN (OLD IS DISTINCT FROM NEW) EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER playlists_tombstone AFTER DELETE ON playlists
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone('id');
+
+CREATE TRIGGER playlist_songs_insert_version BEFORE INSERT ON playlist_songs
+    FOR EACH ROW EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER playlist_songs_update_version BEFORE UPDATE ON playlist_songs
+    FOR EACH ROW WHEN (OLD IS DISTINCT FROM NEW) EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER playlist_songs_tombstone AFTER DELETE ON playlist_songs
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone('playlist_id', 'song_id');
+
+ANALYZE;
@@ -0,0 +1,7 @@
+-- Generated by init_sql-gen.py --write-variants; do not edit.
+-- schema variant: baseline
+
+DROP MATERIALIZED VIEW IF EXISTS playlist_with_songs;
+DROP INDEX IF EXISTS playlist_songs_song_id_idx;
+DROP INDEX IF EXISTS playlists_user_id_idx;
+ANALYZE;
@@ -0,0 +1,10 @@
+-- Generated by init_sql-gen.py --write-variants; do not edit.
+-- schema variant: indexes
+
+DROP MATERIALIZED VIEW IF EXISTS playlist_with_songs;
+DROP INDEX IF EXISTS playlist_songs_song_id_idx;
+DROP INDEX IF EXISTS playlists_user_id_idx;
+
+CREATE INDEX playlist_songs_song_id_idx ON playlist_songs (song_id, playlist_id);
+CREATE INDEX playlists_user_id_idx ON playlists (user_id);
+ANALYZE;
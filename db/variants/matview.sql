@@ -0,0 +1,22 @@
+-- Generated by init_sql-gen.py --write-variants; do not edit.
+-- schema variant: matview
+
+DROP MATERIALIZED VIEW IF EXISTS playlist_with_songs;
+DROP INDEX IF EXISTS playlist_songs_song_id_idx;
+DROP INDEX IF EXISTS playlists_user_id_idx;
+
+CREATE INDEX playlist_songs_song_id_idx ON playlist_songs (song_id, playlist_id);
+CREATE INDEX playlists_user_id_idx ON playlists (user_id);
+
+CREATE MATERIALIZED VIEW playlist_with_songs AS
+SELECT p.id, p.user_id, p.name,
+       COALESCE(json_agg(json_build_object('id', s.id, 'title', s.title, 'artist', s.artist))
+                FILTER (WHERE s.id IS NOT NULL), '[]'::json) AS songs
+FROM playlists p
+LEFT JOIN playlist_songs ps ON ps.playlist_id = p.id
+LEFT JOIN songs s ON s.id = ps.song_id
+GROUP BY p.id;
+
+CREATE UNIQUE INDEX playlist_with_songs_id_idx ON playlist_with_songs (id);
+CREATE INDEX playlist_with_songs_user_id_idx ON playlist_with_songs (user_id);
+ANALYZE;
@@ -1,14 +1,25 @@
+import asyncio
 import strawberry
-from fastapi import FastAPI, Request, Response
-from strawberry.fastapi import GraphQLRouter
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from prometheus_client import make_asgi_app
 from starlette.requests import ClientDisconnect
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, ForeignKey, Table
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship, joinedload
 import os
 from typing import List
-
+from common.backend import DataBackend, make_backend
+from common import profiling, tracing, transport
+from common.db_pool import create_pooled_engine
+from common.metrics import MetricsExtension, MetricsGraphQLRouter, MetricsMiddleware
+from common.json_backend import JsonAggBackend, MatviewBackend
+from common.writes import SqlPlaylistWrites
+
+# before the engine is created, so it gets the statement spans
+tracing.setup_tracing("graphql")
 DB_URL = f"postgresql+psycopg2://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-engine = create_engine(DB_URL)
+engine = create_pooled_engine(DB_URL)
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
 
@@ -59,60 +70,141 @@ class User:
     age: int
     playlists: List[Playlist]
 
-@strawberry.type
-class Query:
-    @strawberry.field
-    def users(self) -> List[User]:
+# Returns the eagerly loaded models themselves: they already have the
+# attributes the resolvers read, so no extra copy is made per row.
+# Playlist edits go through the shared single-statement SQL of common/writes.py
+# rather than the ORM's unit of work, which would insert one row at a time.
+class OrmBackend(SqlPlaylistWrites, DataBackend):
+    engine = engine
+
+    def all_users(self):
         db = SessionLocal()
-        users = db.query(UserModel).options(joinedload(UserModel.playlists).joinedload(PlaylistModel.songs)).all()
+        users = db.query(UserModel).all()
         db.close()
+        return users
 
-        res = []
-        for u in users:
-            pl_list = [
-                Playlist(id=p.id, name=p.name, songs=[
-                    Song(id=s.id, title=s.title, artist=s.artist) for s in p.songs
-                ]) for p in u.playlists
-            ]
-            res.append(User(id=u.id, name=u.name, age=u.age, playlists=pl_list))
-        return res
+    def all_users_with_playlists(self):
+        db = SessionLocal()
+        users = db.query(UserModel).options(joinedload(UserModel.playlists).joinedload(PlaylistModel.songs)).all()
+        db.close()
+        return users
 
-    @strawberry.field
-    def songs(self) -> List[Song]:
+    def all_songs(self):
         db = SessionLocal()
         songs = db.query(SongModel).all()
         db.close()
-        return [Song(id=s.id, title=s.title, artist=s.artist) for s in songs]
+        return songs
 
-    @strawberry.field
-    def user_playlists(self, user_id: int) -> List[Playlist]:
+    def user_playlists(self, user_id):
         db = SessionLocal()
         playlists = db.query(PlaylistModel).filter(PlaylistModel.user_id == user_id).options(joinedload(PlaylistModel.songs)).all()
         db.close()
-        return [Playlist(id=p.id, name=p.name, songs=[
-            Song(id=s.id, title=s.title, artist=s.artist) for s in p.songs
-        ]) for p in playlists]
+        return playlists
 
-    @strawberry.field
-    def playlist_songs(self, playlist_id: int) -> List[Song]:
+    def playlist_songs(self, playlist_id):
         db = SessionLocal()
         playlist = db.query(PlaylistModel).filter(PlaylistModel.id == playlist_id).options(joinedload(PlaylistModel.songs)).first()
         db.close()
         if not playlist: return []
-        return [Song(id=s.id, title=s.title, artist=s.artist) for s in playlist.songs]
+        return playlist.songs
 
-    @strawberry.field
-    def playlists_by_song(self, song_id: int) -> List[Playlist]:
+    def playlists_by_song(self, song_id):
         db = SessionLocal()
         playlists = db.query(PlaylistModel).join(PlaylistModel.songs).filter(SongModel.id == song_id).options(joinedload(PlaylistModel.songs)).all()
         db.close()
-        return [Playlist(id=p.id, name=p.name, songs=[
-             Song(id=s.id, title=s.title, artist=s.artist) for s in p.songs
-        ]) for p in playlists]
+        return playlists
+
+backend = make_backend({
+    "sql": OrmBackend,
+    "jsonagg": lambda: JsonAggBackend(engine),
+    "matview": lambda: MatviewBackend(engine),
+})
+
+def song_from_row(s):
+    return Song(id=s.id, title=s.title, artist=s.artist)
+
+def playlist_from_row(p):
+    return Playlist(id=p.id, name=p.name, songs=[song_from_row(s) for s in p.songs])
+
+def user_from_row(u):
+    return User(id=u.id, name=u.name, age=u.age, playlists=[playlist_from_row(p) for p in u.playlists])
+
+# JSON backends return dicts whose keys are the field names
+def song_from_dict(s):
+    return Song(**s)
+
+def playlist_from_dict(p):
+    return Playlist(id=p["id"], name=p["name"], songs=[Song(**s) for s in p["songs"]])
 
-schema = strawberry.Schema(query=Query)
-graphql_app = GraphQLRouter(schema)
-app = FastAPI()
+def user_from_dict(u):
+    return User(id=u["id"], name=u["name"], age=u["age"], playlists=[playlist_from_dict(p) for p in u["playlists"]])
+
+if backend.returns_dicts:
+    to_song, to_playlist, to_user = song_from_dict, playlist_from_dict, user_from_dict
+else:
+    to_song, to_playlist, to_user = song_from_row, playlist_from_row, user_from_row
+
+@strawberry.type
+class Query:
+    @strawberry.field
+    def users(self) -> List[User]:
+        return [to_user(u) for u in backend.all_users_with_playlists()]
+
+    @strawberry.field
+    def songs(self) -> List[Song]:
+        return [to_song(s) for s in backend.all_songs()]
+
+    @strawberry.field
+    def user_playlists(self, user_id: int) -> List[Playlist]:
+        return [to_playlist(p) for p in backend.user_playlists(user_id)]
+
+    @strawberry.field
+    def playlist_songs(self, playlist_id: int) -> List[Song]:
+        return [to_song(s) for s in backend.playlist_songs(playlist_id)]
+
+    @strawberry.field
+    def playlists_by_song(self, song_id: int) -> List[Playlist]:
+        return [to_playlist(p) for p in backend.playlists_by_song(song_id)]
+
+@strawberry.type
+class WriteResult:
+    playlist_id: int
+    rows: int
+
+def write(edit, *args):
+    try:
+        result = edit(*args)
+    except NotImplementedError:
+        raise ValueError(f"{type(backend).__name__} does not take writes; use DATA_BACKEND=sql or jsonagg")
+    return WriteResult(playlist_id=result.playlist_id, rows=result.rows)
+
+@strawberry.type
+class Mutation:
+    @strawberry.mutation
+    def create_playlist(self, user_id: int, name: str, song_ids: List[int]) -> WriteResult:
+        return write(backend.create_playlist, user_id, name, song_ids)
+
+    @strawberry.mutation
+    def add_playlist_songs(self, playlist_id: int, song_ids: List[int]) -> WriteResult:
+        return write(backend.add_playlist_songs, playlist_id, song_ids)
+
+    @strawberry.mutation
+    def remove_playlist_songs(self, playlist_id: int, song_ids: List[int]) -> WriteResult:
+        return write(backend.remove_playlist_songs, playlist_id, song_ids)
+
+schema = strawberry.Schema(query=Query, mutation=Mutation, extensions=[MetricsExtension])
+graphql_app = MetricsGraphQLRouter(schema)
+# TracingMiddleware opens the server span; recent FastAPI releases would add
+# their own HTTP spans once a tracer provider is set (older ones ignore this)
+app = FastAPI(telemetry={"tracing": False})
+# HTTP_COMPRESSION (common/transport.py); added first so it runs inside the
+# metrics and tracing middlewares and its CPU counts in the request time
+print("HTTP compression:", transport.add_http_compression(app))
+app.add_middleware(MetricsMiddleware)
+if tracing.enabled():
+    app.add_middleware(tracing.TracingMiddleware)
+    # uvicorn re-raises SIGTERM after shutting down, so atexit hooks never run
+    app.router.add_event_handler("shutdown", tracing.flush)
 
 @app.exception_handler(ClientDisconnect)
 async def client_disconnect_handler(request: Request, exc: ClientDisconnect):
@@ -120,3 +212,25 @@ async def client_disconnect_handler(request: Request, exc: ClientDisconnect):
     return Response(status_code=499)
 
 app.include_router(graphql_app, prefix="/graphql")
+app.mount("/metrics", make_asgi_app())
+
+if profiling.enabled():
+    profiling.setup_profiling()
+
+    @app.get("/debug/profile")
+    async def debug_profile(request: Request):
+        """Samples all threads and the event loop's tasks (common/profiling.py)."""
+        params = dict(request.query_params)
+        try:
+            kwargs = profiling.parse_params(params)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # the sampler sleeps between ticks, so it runs off the event loop it samples
+        try:
+            result = await run_in_threadpool(profiling.profile, service="graphql",
+                                             loop=asyncio.get_running_loop(), **kwargs)
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if params.get("format") == "collapsed":
+            return PlainTextResponse(result["collapsed"])
+        return result
@@ -3,93 +3,261 @@ from concurrent import futures
 import demo_pb2
 import demo_pb2_grpc
 import os
-from sqlalchemy import create_engine, text
+import signal
+import threading
+from sqlalchemy import text
 from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+from common.backend import DataBackend, Song, Playlist, User, make_backend
+from common.arrow_export import export_table
+from common.changes import PlaylistChange, SqlChangeFeed
+from common.writes import SqlPlaylistWrites
+from common.db_pool import create_pooled_engine
+from common import profiling, tracing, transport
+from common.metrics import MetricsInterceptor, db_timer
+from common.json_backend import JsonAggBackend, MatviewBackend
 
-class UserService(demo_pb2_grpc.UserServiceServicer):
+class SqlBackend(SqlChangeFeed, SqlPlaylistWrites, DataBackend):
     def __init__(self):
         try:
             DB_URL = f"postgresql+psycopg2://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-            self.engine = create_engine(DB_URL)
+            self.engine = create_pooled_engine(DB_URL)
         except Exception as e:
             print(f"Failed to connect to DB: {e}")
 
-    def GetAllUsers(self, request, context):
+    def _songs_of(self, conn, playlist_id):
+        songs = conn.execute(text("""
+            SELECT s.id, s.title, s.artist
+            FROM songs s
+            JOIN playlist_songs ps ON s.id = ps.song_id
+            WHERE ps.playlist_id = :pid
+        """), {"pid": playlist_id}).fetchall()
+        return [Song(s[0], s[1], s[2]) for s in songs]
+
+    def all_users(self):
         with self.engine.connect() as conn:
             users = conn.execute(text("SELECT id, name, age FROM users")).fetchall()
-            response = []
-            for u in users:
-                response.append(demo_pb2.UserResponse(id=u[0], name=u[1], age=u[2]))
-            return demo_pb2.UserList(users=response)
+            return [User(u[0], u[1], u[2], []) for u in users]
 
-    def GetAllSongs(self, request, context):
+    def all_songs(self):
         with self.engine.connect() as conn:
             songs = conn.execute(text("SELECT id, title, artist FROM songs")).fetchall()
-            return demo_pb2.SongList(songs=[
-                demo_pb2.Song(id=s[0], title=s[1], artist=s[2]) for s in songs
-            ])
+            return [Song(s[0], s[1], s[2]) for s in songs]
 
-    def GetUserPlaylists(self, request, context):
+    def user_playlists(self, user_id):
         with self.engine.connect() as conn:
-            playlists = conn.execute(text("SELECT id, name FROM playlists WHERE user_id = :uid"), {"uid": request.id}).fetchall()
-            pl_protos = []
-            for p in playlists:
-                songs = conn.execute(text("""
-                    SELECT s.id, s.title, s.artist 
-                    FROM songs s 
-                    JOIN playlist_songs ps ON s.id = ps.song_id 
-                    WHERE ps.playlist_id = :pid
-                """), {"pid": p[0]}).fetchall()
-                
-                s_protos = [demo_pb2.Song(id=s[0], title=s[1], artist=s[2]) for s in songs]
-                pl_protos.append(demo_pb2.Playlist(id=p[0], name=p[1], songs=s_protos))
-            return demo_pb2.PlaylistList(playlists=pl_protos)
+            playlists = conn.execute(text("SELECT id, name FROM playlists WHERE user_id = :uid"), {"uid": user_id}).fetchall()
+            return [Playlist(p[0], p[1], self._songs_of(conn, p[0])) for p in playlists]
 
-    def GetPlaylistSongs(self, request, context):
+    def playlist_songs(self, playlist_id):
         with self.engine.connect() as conn:
-            songs = conn.execute(text("""
-                SELECT s.id, s.title, s.artist 
-                FROM songs s 
-                JOIN playlist_songs ps ON s.id = ps.song_id 
-                WHERE ps.playlist_id = :pid
-            """), {"pid": request.id}).fetchall()
-            return demo_pb2.SongList(songs=[
-                demo_pb2.Song(id=s[0], title=s[1], artist=s[2]) for s in songs
-            ])
+            return self._songs_of(conn, playlist_id)
 
-    def GetPlaylistsBySong(self, request, context):
+    def playlists_by_song(self, song_id):
         with self.engine.connect() as conn:
             playlists = conn.execute(text("""
-                SELECT p.id, p.name 
-                FROM playlists p 
-                JOIN playlist_songs ps ON p.id = ps.playlist_id 
+                SELECT p.id, p.name
+                FROM playlists p
+                JOIN playlist_songs ps ON p.id = ps.playlist_id
                 WHERE ps.song_id = :sid
-            """), {"sid": request.id}).fetchall()
-            
-            pl_protos = []
-            for p in playlists:
-                songs = conn.execute(text("""
-                    SELECT s.id, s.title, s.artist 
-                    FROM songs s 
-                    JOIN playlist_songs ps ON s.id = ps.song_id 
-                    WHERE ps.playlist_id = :pid
-                """), {"pid": p[0]}).fetchall()
-                s_protos = [demo_pb2.Song(id=s[0], title=s[1], artist=s[2]) for s in songs]
-                pl_protos.append(demo_pb2.Playlist(id=p[0], name=p[1], songs=s_protos))
-            return demo_pb2.PlaylistList(playlists=pl_protos)
+            """), {"sid": song_id}).fetchall()
+            return [Playlist(p[0], p[1], self._songs_of(conn, p[0])) for p in playlists]
+
+SONGS_OF_PLAYLIST = """
+    SELECT s.id, s.title, s.artist
+    FROM songs s
+    JOIN playlist_songs ps ON s.id = ps.song_id
+    WHERE ps.playlist_id = %s
+"""
+
+# Same queries as SqlBackend, run straight on psycopg 3 (no SQLAlchemy text()
+# or Row objects) on one connection per worker thread. With prepare=True every
+# statement is prepared on first use, so later calls skip parsing and planning;
+# DATA_BACKEND=psycopg runs the same path unprepared for comparison.
+class PreparedBackend(DataBackend):
+    def __init__(self, prepare=True):
+        self.dsn = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+        self.prepare = prepare
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            import psycopg
+
+            conn = psycopg.connect(self.dsn, autocommit=True)
+            if not self.prepare:
+                conn.prepare_threshold = None  # psycopg 3 prepares after 5 runs by default
+            self._local.conn = conn
+        return conn
+
+    def _fetch(self, query, params=()):
+        with db_timer(), tracing.db_span(query):
+            return self._conn().execute(query, params, prepare=self.prepare or None).fetchall()
+
+    def _playlists(self, rows):
+        return [Playlist(p[0], p[1], list(map(Song._make, self._fetch(SONGS_OF_PLAYLIST, (p[0],))))) for p in rows]
+
+    def all_users(self):
+        return [User(u[0], u[1], u[2], []) for u in self._fetch("SELECT id, name, age FROM users")]
+
+    def all_songs(self):
+        return list(map(Song._make, self._fetch("SELECT id, title, artist FROM songs")))
+
+    def user_playlists(self, user_id):
+        return self._playlists(self._fetch("SELECT id, name FROM playlists WHERE user_id = %s", (user_id,)))
+
+    def playlist_songs(self, playlist_id):
+        return list(map(Song._make, self._fetch(SONGS_OF_PLAYLIST, (playlist_id,))))
+
+    def playlists_by_song(self, song_id):
+        return self._playlists(self._fetch("""
+            SELECT p.id, p.name
+            FROM playlists p
+            JOIN playlist_songs ps ON p.id = ps.playlist_id
+            WHERE ps.song_id = %s
+        """, (song_id,)))
+
+def song_proto(s):
+    return demo_pb2.Song(id=s.id, title=s.title, artist=s.artist)
+
+def playlist_proto(p):
+    return demo_pb2.Playlist(id=p.id, name=p.name, songs=[song_proto(s) for s in p.songs])
+
+def user_proto(u):
+    return demo_pb2.UserResponse(id=u.id, name=u.name, age=u.age)
+
+def song_change_proto(c):
+    # DELETE changes only carry the key; None leaves the other fields unset
+    return demo_pb2.SongChange(kind=c.kind, version=c.version,
+                               song=demo_pb2.Song(id=c.id, title=c.title, artist=c.artist))
+
+def playlist_change_proto(c):
+    return demo_pb2.PlaylistChange(kind=c.kind, version=c.version, id=c.id, user_id=c.user_id, name=c.name)
+
+def playlist_song_change_proto(c):
+    return demo_pb2.PlaylistSongChange(kind=c.kind, version=c.version, playlist_id=c.playlist_id, song_id=c.song_id)
+
+def protos(convert):
+    return lambda rows: [convert(r) for r in rows]
+
+def as_is(rows):
+    # message constructors accept dicts (nested ones too) for message fields
+    return rows
+
+class UserService(demo_pb2_grpc.UserServiceServicer):
+    def __init__(self, backend):
+        self.backend = backend
+        if backend.returns_dicts:
+            self.songs = self.playlists = self.users = as_is
+        else:
+            self.songs, self.playlists, self.users = protos(song_proto), protos(playlist_proto), protos(user_proto)
+
+    def GetAllUsers(self, request, context):
+        return demo_pb2.UserList(users=self.users(self.backend.all_users()))
+
+    def GetAllSongs(self, request, context):
+        return demo_pb2.SongList(songs=self.songs(self.backend.all_songs()))
+
+    def GetUserPlaylists(self, request, context):
+        return demo_pb2.PlaylistList(playlists=self.playlists(self.backend.user_playlists(request.id)))
+
+    def GetPlaylistSongs(self, request, context):
+        return demo_pb2.SongList(songs=self.songs(self.backend.playlist_songs(request.id)))
+
+    def GetPlaylistsBySong(self, request, context):
+        return demo_pb2.PlaylistList(playlists=self.playlists(self.backend.playlists_by_song(request.id)))
+
+    def _changes(self, fetch, request, context):
+        try:
+            return fetch(request.since_version, request.limit)
+        except NotImplementedError:
+            context.abort(grpc.StatusCode.UNIMPLEMENTED,
+                          f"{type(self.backend).__name__} keeps no row versions; use DATA_BACKEND=sql")
+
+    def GetSongChanges(self, request, context):
+        batch = self._changes(self.backend.song_changes, request, context)
+        return demo_pb2.SongChanges(changes=[song_change_proto(c) for c in batch.changes],
+                                    version=batch.version, has_more=batch.has_more)
+
+    def GetPlaylistChanges(self, request, context):
+        batch = self._changes(self.backend.playlist_changes, request, context)
+        playlists, songs = [], []
+        for c in batch.changes:
+            if isinstance(c, PlaylistChange):
+                playlists.append(playlist_change_proto(c))
+            else:
+                songs.append(playlist_song_change_proto(c))
+        return demo_pb2.PlaylistChanges(playlists=playlists, songs=songs,
+                                        version=batch.version, has_more=batch.has_more)
+
+    def ExportTable(self, request, context):
+        engine = getattr(self.backend, "engine", None)
+        if engine is None:
+            context.abort(grpc.StatusCode.UNIMPLEMENTED,
+                          f"{type(self.backend).__name__} has no SQLAlchemy engine; use DATA_BACKEND=sql")
+        try:
+            chunks = export_table(engine, request.table, request.columns, request.batch_rows)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        for data in chunks:
+            yield demo_pb2.ArrowChunk(data=data)
+
+    def _write(self, write, context, *args):
+        try:
+            result = write(*args)
+        except NotImplementedError:
+            context.abort(grpc.StatusCode.UNIMPLEMENTED,
+                          f"{type(self.backend).__name__} does not take writes; use DATA_BACKEND=sql or jsonagg")
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        return demo_pb2.WriteReply(playlist_id=result.playlist_id, rows=result.rows)
+
+    def CreatePlaylist(self, request, context):
+        return self._write(self.backend.create_playlist, context, request.user_id, request.name, request.song_ids)
+
+    def AddPlaylistSongs(self, request, context):
+        return self._write(self.backend.add_playlist_songs, context, request.playlist_id, request.song_ids)
+
+    def RemovePlaylistSongs(self, request, context):
+        return self._write(self.backend.remove_playlist_songs, context, request.playlist_id, request.song_ids)
+
+BACKENDS = {
+    "sql": SqlBackend,
+    "prepared": PreparedBackend,
+    "psycopg": lambda: PreparedBackend(prepare=False),
+    "jsonagg": lambda: JsonAggBackend(SqlBackend().engine),
+    "matview": lambda: MatviewBackend(SqlBackend().engine),
+}
 
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    
+    # match DB_POOL_SIZE + DB_MAX_OVERFLOW to this so workers never queue for a connection
+    workers = int(os.getenv("GRPC_WORKERS", "10"))
+    interceptors = [MetricsInterceptor()]
+    # before make_backend, so the engine gets the statement spans
+    if tracing.setup_tracing("grpc"):
+        interceptors.append(tracing.TracingInterceptor())
+    # GRPC_COMPRESSION, message size, HTTP/2 windows and keepalive (common/transport.py)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers), interceptors=interceptors,
+                         options=transport.grpc_options(server=True), compression=transport.grpc_compression())
+
     health_servicer = health.HealthServicer()
     health_servicer.set("", health_pb2.HealthCheckResponse.SERVING)
     health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
-    
-    demo_pb2_grpc.add_UserServiceServicer_to_server(UserService(), server)
-    
+
+    backend = make_backend(BACKENDS)
+    demo_pb2_grpc.add_UserServiceServicer_to_server(UserService(backend), server)
+
+    # /metrics, plus /debug/profile with PROFILING=1
+    metrics_port = int(os.getenv("METRICS_PORT", "9100"))
+    profiling.setup_profiling()
+    profiling.start_http_server(metrics_port, service="grpc")
+
     server.add_insecure_port("[::]:50051")
-    print("Server started on port 50051")
-    
+    print(f"Server started on port 50051 with {workers} workers, metrics on port {metrics_port}, "
+          f"{transport.describe_grpc()}")
+
+    # stop on SIGTERM (docker stop) instead of dying, so atexit hooks flush the traces
+    signal.signal(signal.SIGTERM, lambda *_: server.stop(5))
     server.start()
     server.wait_for_termination()
 
@@ -1,21 +1,36 @@
-import random
-from faker import Faker
+import argparse
+import io
+import json
+import os
+import struct
+import sys
+import time
 
-fake = Faker()
+import numpy as np
+from faker import Faker
 
-NUM_USERS = 1000
-NUM_SONGS = 5000
-NUM_PLAYLISTS = 1500
-AVG_SONGS_PER_PLAYLIST = 20
+# Scale factor 1 has the row counts of db/init.sql, not its rows: the committed
+# dataset comes from an earlier unseeded Faker script, which no seed of this
+# generator reproduces.
+BASE_USERS = 1000
+BASE_SONGS = 5000
+BASE_PLAYLISTS = 1500
+MIN_SONGS_PER_PLAYLIST = 10
+MAX_SONGS_PER_PLAYLIST = 40
 
-output = []
+# rounds of re-drawing songs that repeat inside a playlist (skewed
+# popularity makes the same hit song come up several times)
+MAX_REDRAWS = 8
 
-# DROP + CREATE
-output.append("""
+SCHEMA = """
+DROP MATERIALIZED VIEW IF EXISTS playlist_with_songs;
+DROP TABLE IF EXISTS row_tombstones;
 DROP TABLE IF EXISTS playlist_songs;
 DROP TABLE IF EXISTS songs;
 DROP TABLE IF EXISTS playlists;
 DROP TABLE IF EXISTS users;
+-- after the tables: their version defaults use it
+DROP SEQUENCE IF EXISTS row_version_seq;
 
 CREATE TABLE users (
     id SERIAL PRIMARY KEY,
@@ -31,63 +46,641 @@ CREATE TABLE songs (
 
 CREATE TABLE playlists (
     id SERIAL PRIMARY KEY,
-    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL,
     name VARCHAR(200) NOT NULL
 );
 
 CREATE TABLE playlist_songs (
-    playlist_id INTEGER NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
-    song_id INTEGER NOT NULL REFERENCES songs(id) ON DELETE CASCADE,
-    PRIMARY KEY (playlist_id, song_id)
+    playlist_id INTEGER NOT NULL,
+    song_id INTEGER NOT NULL
+);
+"""
+
+# Runs after the data is in: building the key and checking the foreign keys
+# once is much faster than maintaining them row by row during COPY. The end
+# result is the same schema as db/init.sql. ids are written explicitly, so
+# the SERIAL sequences have to catch up too.
+POST_LOAD = """
+ALTER TABLE playlists
+    ADD FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+ALTER TABLE playlist_songs
+    ADD PRIMARY KEY (playlist_id, song_id),
+    ADD FOREIGN KEY (playlist_id) REFERENCES playlists(id) ON DELETE CASCADE,
+    ADD FOREIGN KEY (song_id) REFERENCES songs(id) ON DELETE CASCADE;
+
+SELECT setval('users_id_seq', (SELECT COALESCE(MAX(id), 1) FROM users));
+SELECT setval('songs_id_seq', (SELECT COALESCE(MAX(id), 1) FROM songs));
+SELECT setval('playlists_id_seq', (SELECT COALESCE(MAX(id), 1) FROM playlists));
+"""
+
+# Row versions for the delta-sync RPCs (GetSongChanges / GetPlaylistChanges in
+# grpc/server.py, common/changes.py). Every row gets a distinct version from
+# row_version_seq: the loaded rows when this runs, later ones on every insert
+# or real update (created_version tells inserts from updates), and every
+# delete leaves a row_tombstones entry with the deleted key, so a client
+# holding version N only needs the rows and tombstones above N. Added after
+# the load, so COPY does not fire a trigger per row; TRUNCATE leaves no
+# tombstones. The same block closes db/init.sql.
+ROW_VERSIONING = """
+CREATE SEQUENCE row_version_seq;
+
+ALTER TABLE songs
+    ADD COLUMN version BIGINT NOT NULL DEFAULT nextval('row_version_seq'),
+    ADD COLUMN created_version BIGINT;
+UPDATE songs SET created_version = version;
+ALTER TABLE songs ALTER COLUMN created_version SET NOT NULL;
+ALTER TABLE playlists
+    ADD COLUMN version BIGINT NOT NULL DEFAULT nextval('row_version_seq'),
+    ADD COLUMN created_version BIGINT;
+UPDATE playlists SET created_version = version;
+ALTER TABLE playlists ALTER COLUMN created_version SET NOT NULL;
+ALTER TABLE playlist_songs
+    ADD COLUMN version BIGINT NOT NULL DEFAULT nextval('row_version_seq'),
+    ADD COLUMN created_version BIGINT;
+UPDATE playlist_songs SET created_version = version;
+ALTER TABLE playlist_songs ALTER COLUMN created_version SET NOT NULL;
+
+CREATE INDEX songs_version_idx ON songs (version);
+CREATE INDEX playlists_version_idx ON playlists (version);
+CREATE INDEX playlist_songs_version_idx ON playlist_songs (version);
+
+CREATE TABLE row_tombstones (
+    version BIGINT PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    row_key INTEGER[] NOT NULL
 );
-""")
 
-print("Generating users...")
-user_rows = []
-for i in range(NUM_USERS):
-    name = fake.name().replace("'", "")
-    age = random.randint(18, 70)
-    user_rows.append(f"('{name}', {age})")
+CREATE OR REPLACE FUNCTION bump_row_version() RETURNS trigger AS $$
+BEGIN
+    NEW.version := nextval('row_version_seq');
+    IF TG_OP = 'INSERT' THEN
+        NEW.created_version := NEW.version;
+    ELSE
+        NEW.created_version := OLD.created_version;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+-- trigger arguments: the key columns of the table
+CREATE OR REPLACE FUNCTION record_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO row_tombstones (version, table_name, row_key)
+    SELECT nextval('row_version_seq'), TG_TABLE_NAME,
+           ARRAY(SELECT (to_jsonb(OLD) ->> k.col)::int
+                 FROM unnest(TG_ARGV) WITH ORDINALITY AS k(col, n) ORDER BY k.n);
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER songs_insert_version BEFORE INSERT ON songs
+    FOR EACH ROW EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER songs_update_version BEFORE UPDATE ON songs
+    FOR EACH ROW WHEN (OLD IS DISTINCT FROM NEW) EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER songs_tombstone AFTER DELETE ON songs
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone('id');
+
+CREATE TRIGGER playlists_insert_version BEFORE INSERT ON playlists
+    FOR EACH ROW EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER playlists_update_version BEFORE UPDATE ON playlists
+    FOR EACH ROW WHEN (OLD IS DISTINCT FROM NEW) EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER playlists_tombstone AFTER DELETE ON playlists
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone('id');
+
+CREATE TRIGGER playlist_songs_insert_version BEFORE INSERT ON playlist_songs
+    FOR EACH ROW EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER playlist_songs_update_version BEFORE UPDATE ON playlist_songs
+    FOR EACH ROW WHEN (OLD IS DISTINCT FROM NEW) EXECUTE FUNCTION bump_row_version();
+CREATE TRIGGER playlist_songs_tombstone AFTER DELETE ON playlist_songs
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone('playlist_id', 'song_id');
+
+ANALYZE;
+"""
+
+# Optional schema variants, applied after POST_LOAD. Every variant starts by
+# dropping the objects of the others, so a variant file can also be run
+# against a live database to switch between them (see db/variants/).
+VARIANT_RESET = """
+DROP MATERIALIZED VIEW IF EXISTS playlist_with_songs;
+DROP INDEX IF EXISTS playlist_songs_song_id_idx;
+DROP INDEX IF EXISTS playlists_user_id_idx;
+"""
+
+VARIANT_INDEXES = """
+CREATE INDEX playlist_songs_song_id_idx ON playlist_songs (song_id, playlist_id);
+CREATE INDEX playlists_user_id_idx ON playlists (user_id);
+"""
+
+# One row per playlist with its songs already nested as JSON; read by the
+# matview data backend of the Python services (common/json_backend.py).
+VARIANT_MATVIEW = """
+CREATE MATERIALIZED VIEW playlist_with_songs AS
+SELECT p.id, p.user_id, p.name,
+       COALESCE(json_agg(json_build_object('id', s.id, 'title', s.title, 'artist', s.artist))
+                FILTER (WHERE s.id IS NOT NULL), '[]'::json) AS songs
+FROM playlists p
+LEFT JOIN playlist_songs ps ON ps.playlist_id = p.id
+LEFT JOIN songs s ON s.id = ps.song_id
+GROUP BY p.id;
+
+CREATE UNIQUE INDEX playlist_with_songs_id_idx ON playlist_with_songs (id);
+CREATE INDEX playlist_with_songs_user_id_idx ON playlist_with_songs (user_id);
+"""
+
+SCHEMA_VARIANTS = {
+    "baseline": "",
+    "indexes": VARIANT_INDEXES,
+    "matview": VARIANT_INDEXES + VARIANT_MATVIEW,
+}
+
+
+def variant_sql(name):
+    return f"\n-- schema variant: {name}\n" + VARIANT_RESET + SCHEMA_VARIANTS[name] + "ANALYZE;\n"
+
+
+COLUMNS = {
+    "users": ("id", "name", "age"),
+    "songs": ("id", "title", "artist"),
+    "playlists": ("id", "user_id", "name"),
+    "playlist_songs": ("playlist_id", "song_id"),
+}
+
+
+# =====================================================================
+# Text pools (Faker is slow per row, so rows pick from pre-built pools)
+# =====================================================================
+def build_pools(seed, size):
+    Faker.seed(seed)
+    fake = Faker()
+    return {
+        "person": np.array([fake.name() for _ in range(size)], dtype=object),
+        "title": np.array([fake.sentence(nb_words=3) for _ in range(size)], dtype=object),
+        "playlist": np.array([fake.catch_phrase() for _ in range(size)], dtype=object),
+    }
+
+
+# =====================================================================
+# Row batches: dict column -> numpy array, generated batch by batch
+# =====================================================================
+def user_batches(rng, pools, n, batch_size):
+    for start in range(0, n, batch_size):
+        count = min(batch_size, n - start)
+        yield {
+            "id": np.arange(start + 1, start + count + 1),
+            "name": pools["person"][rng.integers(len(pools["person"]), size=count)],
+            "age": rng.integers(18, 71, size=count),
+        }
+
+
+def song_batches(rng, pools, n, batch_size):
+    for start in range(0, n, batch_size):
+        count = min(batch_size, n - start)
+        yield {
+            "id": np.arange(start + 1, start + count + 1),
+            "title": pools["title"][rng.integers(len(pools["title"]), size=count)],
+            "artist": pools["person"][rng.integers(len(pools["person"]), size=count)],
+        }
+
+
+def playlist_batches(rng, pools, n, user_sampler, batch_size, dist):
+    for start in range(0, n, batch_size):
+        count = min(batch_size, n - start)
+        user_ids = user_sampler(count)
+        dist.add_playlists(user_ids)
+        yield {
+            "id": np.arange(start + 1, start + count + 1),
+            "user_id": user_ids,
+            "name": pools["playlist"][rng.integers(len(pools["playlist"]), size=count)],
+        }
+
+
+def playlist_song_batches(num_playlists, num_songs, length_sampler, song_sampler, batch_size, dist):
+    """batch_size counts playlists. Each playlist gets length_sampler() distinct
+    songs drawn with song_sampler()."""
+    stride = np.int64(num_songs + 1)
+    for start in range(0, num_playlists, batch_size):
+        count = min(batch_size, num_playlists - start)
+        batch_pids = np.arange(start + 1, start + count + 1)
+        lengths = np.minimum(length_sampler(count), num_songs)
+
+        # (playlist_id, song_id) is the primary key: drop repeated draws and
+        # draw again for the playlists that came up short
+        keys = np.empty(0, dtype=np.int64)
+        missing = lengths
+        for _ in range(MAX_REDRAWS):
+            pids = np.repeat(batch_pids, missing).astype(np.int64)
+            keys = np.unique(np.concatenate([keys, pids * stride + song_sampler(len(pids))]))
+            have = np.bincount(keys // stride - start - 1, minlength=count)
+            missing = np.maximum(lengths - have, 0)
+            if not missing.any():
+                break
+
+        playlist_ids = keys // stride
+        song_ids = keys % stride
+        dist.add_playlist_songs(np.bincount(playlist_ids - start - 1, minlength=count), song_ids)
+        yield {
+            "playlist_id": playlist_ids,
+            "song_id": song_ids,
+        }
+
+
+# =====================================================================
+# Distributions
+# =====================================================================
+def song_sampler(rng, num_songs, kind, zipf_s):
+    """uniform, or Zipf over popularity rank. Rank 1 is song id 1, so the
+    song the Locust tasks query (songId=1) is the one with the biggest fan-out."""
+    if kind == "uniform":
+        return lambda k: rng.integers(1, num_songs + 1, size=k)
+    cdf = np.cumsum(1.0 / np.arange(1, num_songs + 1) ** zipf_s)
+    cdf /= cdf[-1]
+    return lambda k: np.searchsorted(cdf, rng.random(k), side="right") + 1
+
+
+def user_sampler(rng, num_users, kind, pareto_alpha):
+    """uniform, or Pareto-distributed playlists per user. Weights are sorted so
+    user id 1 (queried by the Locust tasks) owns the most playlists."""
+    if kind == "uniform":
+        return lambda k: rng.integers(1, num_users + 1, size=k)
+    weights = np.sort(rng.pareto(pareto_alpha, size=num_users) + 1.0)[::-1]
+    cdf = np.cumsum(weights)
+    cdf /= cdf[-1]
+    return lambda k: np.searchsorted(cdf, rng.random(k), side="right") + 1
+
+
+def length_sampler(rng, kind, mu, sigma, max_length):
+    """uniform 10-40 songs, or log-normal (median exp(mu)) clipped to max_length."""
+    if kind == "uniform":
+        return lambda k: rng.integers(MIN_SONGS_PER_PLAYLIST, MAX_SONGS_PER_PLAYLIST + 1, size=k)
+    return lambda k: np.clip(np.rint(rng.lognormal(mu, sigma, size=k)), 1, max_length).astype(np.int64)
+
+
+class DistributionStats:
+    """Counts kept while generating, bounded by the number of users/songs/
+    playlists rather than rows."""
+
+    def __init__(self, num_users, num_songs):
+        self.playlists_per_user = np.zeros(num_users + 1, dtype=np.int64)
+        self.playlists_per_song = np.zeros(num_songs + 1, dtype=np.int64)
+        self.lengths = []
+
+    def add_playlists(self, user_ids):
+        self.playlists_per_user += np.bincount(user_ids, minlength=len(self.playlists_per_user))
+
+    def add_playlist_songs(self, lengths, song_ids):
+        self.lengths.append(lengths)
+        self.playlists_per_song += np.bincount(song_ids, minlength=len(self.playlists_per_song))
+
+    @staticmethod
+    def describe(values):
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        return {
+            "min": int(values.min()), "p50": float(p50), "p90": float(p90), "p99": float(p99),
+            "max": int(values.max()), "mean": round(float(values.mean()), 2),
+            "zeros": int((values == 0).sum()),
+        }
+
+    def summary(self):
+        per_song = self.playlists_per_song[1:]
+        top = np.argsort(per_song)[::-1][:5]
+        return {
+            "playlist_length": self.describe(np.concatenate(self.lengths)),
+            "playlists_per_user": self.describe(self.playlists_per_user[1:]),
+            "playlists_per_song": self.describe(per_song),
+            "top_songs": [{"song_id": int(i + 1), "playlists": int(per_song[i])} for i in top],
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print("Distribution summary:")
+        print(f"  {'':<20} {'min':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'mean':>9} {'zeros':>8}")
+        for name in ("playlist_length", "playlists_per_user", "playlists_per_song"):
+            d = summary[name]
+            print(f"  {name:<20} {d['min']:>6} {d['p50']:>8.0f} {d['p90']:>8.0f} {d['p99']:>8.0f} "
+                  f"{d['max']:>8} {d['mean']:>9.2f} {d['zeros']:>8}")
+        print("  most playlisted songs: " + ", ".join(
+            f"#{t['song_id']} ({t['playlists']})" for t in summary["top_songs"]))
+        return summary
+
+
+# =====================================================================
+# Sinks
+# =====================================================================
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_text(batch, columns):
+    """Rows of a batch in Postgres COPY text format."""
+    cols = [
+        [str(v).translate(COPY_ESCAPES) for v in batch[c]] if batch[c].dtype == object
+        else batch[c].tolist()
+        for c in columns
+    ]
+    fmt = "\t".join(["{}"] * len(columns)) + "\n"
+    return "".join(fmt.format(*row) for row in zip(*cols))
+
+
+def sql_literal_rows(batch, columns):
+    cols = [
+        ["'" + str(v).replace("'", "''") + "'" for v in batch[c]] if batch[c].dtype == object
+        else batch[c].tolist()
+        for c in columns
+    ]
+    fmt = "(" + ", ".join(["{}"] * len(columns)) + ")"
+    return ",\n".join(fmt.format(*row) for row in zip(*cols))
+
+
+class SqlScriptSink:
+    """One psql script: schema, then a COPY ... FROM stdin block (or multi-row
+    INSERTs, one per batch) per table. Loadable with psql -f or by dropping it
+    into /docker-entrypoint-initdb.d."""
+
+    def __init__(self, path, post_load, use_copy=True):
+        self.path = path
+        self.post_load = post_load
+        self.use_copy = use_copy
+        self.f = open(path, "w", encoding="utf-8")
+        self.f.write(SCHEMA + "\n")
+
+    def begin_table(self, table):
+        if self.use_copy:
+            self.f.write(f"COPY {table} ({', '.join(COLUMNS[table])}) FROM stdin;\n")
+
+    def write_batch(self, table, batch):
+        if self.use_copy:
+            data = copy_text(batch, COLUMNS[table])
+        else:
+            data = (f"INSERT INTO {table} ({', '.join(COLUMNS[table])}) VALUES\n"
+                    + sql_literal_rows(batch, COLUMNS[table]) + ";\n")
+        self.f.write(data)
+        return len(data.encode("utf-8"))
+
+    def end_table(self, table):
+        if self.use_copy:
+            self.f.write("\\.\n\n")
+
+    def close(self):
+        self.f.write(self.post_load)
+        self.f.close()
+
+
+class BinaryCopySink:
+    """One PGCOPY binary file per table plus a load.sql that creates the
+    schema and \\copy's them in (run psql -f load.sql from that folder)."""
+
+    HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+
+    def __init__(self, directory, post_load):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.files = {}
+        with open(os.path.join(directory, "load.sql"), "w") as f:
+            f.write(SCHEMA + "\n")
+            for table, columns in COLUMNS.items():
+                f.write(f"\\copy {table} ({', '.join(columns)}) FROM '{table}.bin' WITH (FORMAT binary)\n")
+            f.write(post_load)
+
+    def begin_table(self, table):
+        f = open(os.path.join(self.directory, f"{table}.bin"), "wb")
+        f.write(self.HEADER)
+        self.files[table] = f
+
+    def write_batch(self, table, batch):
+        columns = COLUMNS[table]
+        if all(batch[c].dtype != object for c in columns):
+            data = self._int_rows(batch, columns)
+        else:
+            data = self._mixed_rows(batch, columns)
+        self.files[table].write(data)
+        return len(data)
+
+    @staticmethod
+    def _int_rows(batch, columns):
+        # every field is int4: build the whole batch as one structured array
+        fields = [("n", ">i2")]
+        for c in columns:
+            fields += [(f"{c}_len", ">i4"), (c, ">i4")]
+        rows = np.empty(len(batch[columns[0]]), dtype=fields)
+        rows["n"] = len(columns)
+        for c in columns:
+            rows[f"{c}_len"] = 4
+            rows[c] = batch[c]
+        return rows.tobytes()
+
+    @staticmethod
+    def _mixed_rows(batch, columns):
+        out = io.BytesIO()
+        head = struct.pack("!h", len(columns))
+        int4 = struct.Struct("!ii")
+        cols = [batch[c].tolist() for c in columns]
+        for row in zip(*cols):
+            out.write(head)
+            for v in row:
+                if isinstance(v, str):
+                    raw = v.encode("utf-8")
+                    out.write(struct.pack("!i", len(raw)))
+                    out.write(raw)
+                else:
+                    out.write(int4.pack(4, v))
+        return out.getvalue()
+
+    def end_table(self, table):
+        f = self.files.pop(table)
+        f.write(struct.pack("!h", -1))
+        f.close()
+
+    def close(self):
+        pass
+
+
+class PostgresSink:
+    """Streams COPY text straight into a live database (psycopg 3)."""
+
+    def __init__(self, dsn, post_load):
+        import psycopg
+
+        self.post_load = post_load
+        self.conn = psycopg.connect(dsn)
+        self.conn.execute(SCHEMA)
+        self.copy_cm = None
+        self.copy = None
+
+    def begin_table(self, table):
+        self.cur = self.conn.cursor()
+        self.copy_cm = self.cur.copy(f"COPY {table} ({', '.join(COLUMNS[table])}) FROM STDIN")
+        self.copy = self.copy_cm.__enter__()
+
+    def write_batch(self, table, batch):
+        data = copy_text(batch, COLUMNS[table]).encode("utf-8")
+        self.copy.write(data)
+        return len(data)
+
+    def end_table(self, table):
+        self.copy_cm.__exit__(None, None, None)
+        self.cur.close()
+
+    def close(self):
+        self.conn.execute(self.post_load)
+        self.conn.commit()
+        self.conn.close()
+
+
+# =====================================================================
+# Main
+# =====================================================================
+def write_table(sink, table, batches, stats):
+    rows = 0
+    nbytes = 0
+    gen_s = 0.0
+    write_s = 0.0
+
+    sink.begin_table(table)
+    it = iter(batches)
+    while True:
+        t0 = time.perf_counter()
+        batch = next(it, None)
+        t1 = time.perf_counter()
+        gen_s += t1 - t0
+        if batch is None:
+            break
+        nbytes += sink.write_batch(table, batch)
+        write_s += time.perf_counter() - t1
+        rows += len(batch[COLUMNS[table][0]])
+
+    t0 = time.perf_counter()
+    sink.end_table(table)
+    write_s += time.perf_counter() - t0
+
+    stats.append((table, rows, nbytes, gen_s, write_s))
+    print(f"  {table:<15} {rows:>12,} rows  {nbytes / 2**20:>9.1f} MB  "
+          f"gen {rows / max(gen_s, 1e-9):>12,.0f} rows/s  write {rows / max(write_s, 1e-9):>12,.0f} rows/s")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generates the benchmark dataset.")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiplies 1000 users / 5000 songs / 1500 playlists")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["copy", "insert", "binary"], default="copy",
+                        help="copy: psql script with COPY blocks; insert: multi-row INSERTs; "
+                             "binary: PGCOPY files + load.sql in --out")
+    parser.add_argument("--out", default="dataset.sql", help="output file (folder for --format binary)")
+    parser.add_argument("--dsn", default=None, help="load straight into this database instead of a file")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="rows per generated batch")
+    parser.add_argument("--pool-size", type=int, default=5000, help="Faker strings per pool")
+    parser.add_argument("--report", default=None, help="append a JSON line with the throughput numbers here")
+    parser.add_argument("--schema-variant", choices=list(SCHEMA_VARIANTS), default="baseline",
+                        help="baseline: keys only; indexes: + playlist_songs(song_id), playlists(user_id); "
+                             "matview: + playlist_with_songs JSON view")
+    parser.add_argument("--write-variants", metavar="DIR", default=None,
+                        help="only write one <variant>.sql per schema variant into DIR and exit")
+
+    dist = parser.add_argument_group("distributions (default: all uniform, like db/init.sql)")
+    dist.add_argument("--skewed", action="store_true",
+                      help="shortcut for zipf popularity, lognormal lengths and pareto playlists per user")
+    dist.add_argument("--song-popularity", choices=["uniform", "zipf"], default=None)
+    dist.add_argument("--zipf-s", type=float, default=1.1, help="Zipf exponent for song popularity")
+    dist.add_argument("--playlist-length", choices=["uniform", "lognormal"], default=None)
+    dist.add_argument("--length-mu", type=float, default=3.0, help="log-normal mu (median length = e^mu)")
+    dist.add_argument("--length-sigma", type=float, default=0.8, help="log-normal sigma")
+    dist.add_argument("--max-playlist-length", type=int, default=2000)
+    dist.add_argument("--playlists-per-user", choices=["uniform", "pareto"], default=None)
+    dist.add_argument("--pareto-alpha", type=float, default=1.2, help="Pareto shape; lower = heavier tail")
+    args = parser.parse_args(argv)
+
+    skewed = {"song_popularity": "zipf", "playlist_length": "lognormal", "playlists_per_user": "pareto"}
+    for option, value in skewed.items():
+        if getattr(args, option) is None:
+            setattr(args, option, value if args.skewed else "uniform")
+    return args
+
+
+def write_variant_files(directory):
+    os.makedirs(directory, exist_ok=True)
+    for name in SCHEMA_VARIANTS:
+        path = os.path.join(directory, f"{name}.sql")
+        with open(path, "w") as f:
+            f.write(f"-- Generated by init_sql-gen.py --write-variants; do not edit.{variant_sql(name)}")
+        print("Wrote", path)
 
-output.append("INSERT INTO users (name, age) VALUES\n" +
-              ",\n".join(user_rows) + ";\n")
 
+def main(argv=None):
+    args = parse_args(argv)
+    if args.write_variants:
+        write_variant_files(args.write_variants)
+        return 0
 
-print("Generating songs...")
-song_rows = []
-for i in range(NUM_SONGS):
-    title = fake.sentence(nb_words=3).replace("'", "")
-    artist = fake.name().replace("'", "")
-    song_rows.append(f"('{title}', '{artist}')")
+    num_users = max(1, round(BASE_USERS * args.scale))
+    num_songs = max(MAX_SONGS_PER_PLAYLIST, round(BASE_SONGS * args.scale))
+    num_playlists = max(1, round(BASE_PLAYLISTS * args.scale))
 
-output.append("INSERT INTO songs (title, artist) VALUES\n" +
-              ",\n".join(song_rows) + ";\n")
+    rng = np.random.default_rng(args.seed)
+    print(f"Building Faker pools (seed={args.seed})...")
+    pools = build_pools(args.seed, args.pool_size)
 
+    dist = DistributionStats(num_users, num_songs)
+    pick_user = user_sampler(rng, num_users, args.playlists_per_user, args.pareto_alpha)
+    pick_song = song_sampler(rng, num_songs, args.song_popularity, args.zipf_s)
+    pick_length = length_sampler(rng, args.playlist_length, args.length_mu, args.length_sigma,
+                                 min(args.max_playlist_length, num_songs))
 
-print("Generating playlists...")
-playlist_rows = []
-for i in range(NUM_PLAYLISTS):
-    user_id = random.randint(1, NUM_USERS)
-    name = fake.catch_phrase().replace("'", "")
-    playlist_rows.append(f"({user_id}, '{name}')")
+    post_load = POST_LOAD + ROW_VERSIONING + variant_sql(args.schema_variant)
+    if args.dsn:
+        sink, target = PostgresSink(args.dsn, post_load), "database"
+    elif args.format == "binary":
+        sink, target = BinaryCopySink(args.out, post_load), args.out
+    else:
+        sink, target = SqlScriptSink(args.out, post_load, use_copy=args.format == "copy"), args.out
 
-output.append("INSERT INTO playlists (user_id, name) VALUES\n" +
-              ",\n".join(playlist_rows) + ";\n")
+    # playlist_songs batches count playlists, ~25 rows each
+    ps_batch = max(1, args.batch_size // 25)
 
+    print(f"Generating scale={args.scale}: {num_users:,} users, {num_songs:,} songs, "
+          f"{num_playlists:,} playlists -> {target}")
+    print(f"  song popularity={args.song_popularity}, playlist length={args.playlist_length}, "
+          f"playlists per user={args.playlists_per_user}, schema variant={args.schema_variant}")
+    started = time.perf_counter()
+    stats = []
+    write_table(sink, "users", user_batches(rng, pools, num_users, args.batch_size), stats)
+    write_table(sink, "songs", song_batches(rng, pools, num_songs, args.batch_size), stats)
+    write_table(sink, "playlists", playlist_batches(rng, pools, num_playlists, pick_user, args.batch_size, dist), stats)
+    write_table(sink, "playlist_songs", playlist_song_batches(num_playlists, num_songs, pick_length, pick_song,
+                                                              ps_batch, dist), stats)
+    t0 = time.perf_counter()
+    sink.close()
+    post_s = time.perf_counter() - t0
+    if args.dsn:
+        print(f"  keys, foreign keys and ANALYZE: {post_s:.1f}s")
+    elapsed = time.perf_counter() - started
 
-print("Generating playlist-song relationships...")
-ps_rows = []
-for pid in range(1, NUM_PLAYLISTS + 1):
-    num_songs = random.randint(10, 40)
-    songs = random.sample(range(1, NUM_SONGS + 1), num_songs)
-    for sid in songs:
-        ps_rows.append(f"({pid}, {sid})")
+    total_rows = sum(s[1] for s in stats)
+    total_bytes = sum(s[2] for s in stats)
+    print(f"DONE! {total_rows:,} rows, {total_bytes / 2**20:.1f} MB in {elapsed:.1f}s "
+          f"({total_rows / elapsed:,.0f} rows/s, {total_bytes / 2**20 / elapsed:.1f} MB/s)")
+    distribution = dist.print_summary()
 
-output.append("INSERT INTO playlist_songs (playlist_id, song_id) VALUES\n" +
-              ",\n".join(ps_rows) + ";\n")
+    if args.report:
+        with open(args.report, "a") as f:
+            f.write(json.dumps({
+                "scale": args.scale,
+                "seed": args.seed,
+                "target": "database" if args.dsn else args.format,
+                "schema_variant": args.schema_variant,
+                "seconds": round(elapsed, 3),
+                "post_load_seconds": round(post_s, 3),
+                "distributions": {
+                    "song_popularity": args.song_popularity,
+                    "playlist_length": args.playlist_length,
+                    "playlists_per_user": args.playlists_per_user,
+                    **distribution,
+                },
+                "tables": [
+                    {"table": t, "rows": r, "bytes": b, "gen_seconds": round(g, 4), "write_seconds": round(w, 4)}
+                    for t, r, b, g, w in stats
+                ],
+            }) + "\n")
+    return 0
 
-print("Saving to dataset.sql...")
-with open("dataset.sql", "w") as f:
-    f.write("\n".join(output))
 
-print("DONE! dataset.sql generated successfully.")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,269 +0,0 @@
-# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
-"""Client and server classes corresponding to protobuf-defined services."""
-import grpc
-import warnings
-
-import demo_pb2 as demo__pb2
-
-GRPC_GENERATED_VERSION = '1.76.0'
-GRPC_VERSION = grpc.__version__
-_version_not_supported = False
-
-try:
-    from grpc._utilities import first_version_is_lower
-    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
-except ImportError:
-    _version_not_supported = True
-
-if _version_not_supported:
-    raise RuntimeError(
-        f'The grpc package installed is at version {GRPC_VERSION},'
-        + ' but the generated code in demo_pb2_grpc.py depends on'
-        + f' grpcio>={GRPC_GENERATED_VERSION}.'
-        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
-        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
-    )
-
-
-class UserServiceStub(object):
-    """Missing associated documentation comment in .proto file."""
-
-    def __init__(self, channel):
-        """Constructor.
-
-        Args:
-            channel: A grpc.Channel.
-        """
-        self.GetAllUsers = channel.unary_unary(
-                '/demo.UserService/GetAllUsers',
-                request_serializer=demo__pb2.Empty.SerializeToString,
-                response_deserializer=demo__pb2.UserList.FromString,
-                _registered_method=True)
-        self.GetAllSongs = channel.unary_unary(
-                '/demo.UserService/GetAllSongs',
-                request_serializer=demo__pb2.Empty.SerializeToString,
-                response_deserializer=demo__pb2.SongList.FromString,
-                _registered_method=True)
-        self.GetUserPlaylists = channel.unary_unary(
-                '/demo.UserService/GetUserPlaylists',
-                request_serializer=demo__pb2.IdRequest.SerializeToString,
-                response_deserializer=demo__pb2.PlaylistList.FromString,
-                _registered_method=True)
-        self.GetPlaylistSongs = channel.unary_unary(
-                '/demo.UserService/GetPlaylistSongs',
-                request_serializer=demo__pb2.IdRequest.SerializeToString,
-                response_deserializer=demo__pb2.SongList.FromString,
-                _registered_method=True)
-        self.GetPlaylistsBySong = channel.unary_unary(
-                '/demo.UserService/GetPlaylistsBySong',
-                request_serializer=demo__pb2.IdRequest.SerializeToString,
-                response_deserializer=demo__pb2.PlaylistList.FromString,
-                _registered_method=True)
-
-
-class UserServiceServicer(object):
-    """Missing associated documentation comment in .proto file."""
-
-    def GetAllUsers(self, request, context):
-        """Missing associated documentation comment in .proto file."""
-        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
-        context.set_details('Method not implemented!')
-        raise NotImplementedError('Method not implemented!')
-
-    def GetAllSongs(self, request, context):
-        """Missing associated documentation comment in .proto file."""
-        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
-        context.set_details('Method not implemented!')
-        raise NotImplementedError('Method not implemented!')
-
-    def GetUserPlaylists(self, request, context):
-        """Missing associated documentation comment in .proto file."""
-        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
-        context.set_details('Method not implemented!')
-        raise NotImplementedError('Method not implemented!')
-
-    def GetPlaylistSongs(self, request, context):
-        """Missing associated documentation comment in .proto file."""
-        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
-        context.set_details('Method not implemented!')
-        raise NotImplementedError('Method not implemented!')
-
-    def GetPlaylistsBySong(self, request, context):
-        """Missing associated documentation comment in .proto file."""
-        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
-        context.set_details('Method not implemented!')
-        raise NotImplementedError('Method not implemented!')
-
-
-def add_UserServiceServicer_to_server(servicer, server):
-    rpc_method_handlers = {
-            'GetAllUsers': grpc.unary_unary_rpc_method_handler(
-                    servicer.GetAllUsers,
-                    request_deserializer=demo__pb2.Empty.FromString,
-                    response_serializer=demo__pb2.UserList.SerializeToString,
-            ),
-            'GetAllSongs': grpc.unary_unary_rpc_method_handler(
-                    servicer.GetAllSongs,
-                    request_deserializer=demo__pb2.Empty.FromString,
-                    response_serializer=demo__pb2.SongList.SerializeToString,
-            ),
-            'GetUserPlaylists': grpc.unary_unary_rpc_method_handler(
-                    servicer.GetUserPlaylists,
-                    request_deserializer=demo__pb2.IdRequest.FromString,
-                    response_serializer=demo__pb2.PlaylistList.SerializeToString,
-            ),
-            'GetPlaylistSongs': grpc.unary_unary_rpc_method_handler(
-                    servicer.GetPlaylistSongs,
-                    request_deserializer=demo__pb2.IdRequest.FromString,
-                    response_serializer=demo__pb2.SongList.SerializeToString,
-            ),
-            'GetPlaylistsBySong': grpc.unary_unary_rpc_method_handler(
-                    servicer.GetPlaylistsBySong,
-                    request_deserializer=demo__pb2.IdRequest.FromString,
-                    response_serializer=demo__pb2.PlaylistList.SerializeToString,
-            ),
-    }
-    generic_handler = grpc.method_handlers_generic_handler(
-            'demo.UserService', rpc_method_handlers)
-    server.add_generic_rpc_handlers((generic_handler,))
-    server.add_registered_method_handlers('demo.UserService', rpc_method_handlers)
-
-
- # This class is part of an EXPERIMENTAL API.
-class UserService(object):
-    """Missing associated documentation comment in .proto file."""
-
-    @staticmethod
-    def GetAllUsers(request,
-            target,
-            options=(),
-            channel_credentials=None,
-            call_credentials=None,
-            insecure=False,
-            compression=None,
-            wait_for_ready=None,
-            timeout=None,
-            metadata=None):
-        return grpc.experimental.unary_unary(
-            request,
-            target,
-            '/demo.UserService/GetAllUsers',
-            demo__pb2.Empty.SerializeToString,
-            demo__pb2.UserList.FromString,
-            options,
-            channel_credentials,
-            insecure,
-            call_credentials,
-            compression,
-            wait_for_ready,
-            timeout,
-            metadata,
-            _registered_method=True)
-
-    @staticmethod
-    def GetAllSongs(request,
-            target,
-            options=(),
-            channel_credentials=None,
-            call_credentials=None,
-            insecure=False,
-            compression=None,
-            wait_for_ready=None,
-            timeout=None,
-            metadata=None):
-        return grpc.experimental.unary_unary(
-            request,
-            target,
-            '/demo.UserService/GetAllSongs',
-            demo__pb2.Empty.SerializeToString,
-            demo__pb2.SongList.FromString,
-            options,
-            channel_credentials,
-            insecure,
-            call_credentials,
-            compression,
-            wait_for_ready,
-            timeout,
-            metadata,
-            _registered_method=True)
-
-    @staticmethod
-    def GetUserPlaylists(request,
-            target,
-            options=(),
-            channel_credentials=None,
-            call_credentials=None,
-            insecure=False,
-            compression=None,
-            wait_for_ready=None,
-            timeout=None,
-            metadata=None):
-        return grpc.experimental.unary_unary(
-            request,
-            target,
-            '/demo.UserService/GetUserPlaylists',
-            demo__pb2.IdRequest.SerializeToString,
-            demo__pb2.PlaylistList.FromString,
-            options,
-            channel_credentials,
-            insecure,
-            call_credentials,
-            compression,
-            wait_for_ready,
-            timeout,
-            metadata,
-            _registered_method=True)
-
-    @staticmethod
-    def GetPlaylistSongs(request,
-            target,
-            options=(),
-            channel_credentials=None,
-            call_credentials=None,
-            insecure=False,
-            compression=None,
-            wait_for_ready=None,
-            timeout=None,
-            metadata=None):
-        return grpc.experimental.unary_unary(
-            request,
-            target,
-            '/demo.UserService/GetPlaylistSongs',
-            demo__pb2.IdRequest.SerializeToString,
-            demo__pb2.SongList.FromString,
-            options,
-            channel_credentials,
-            insecure,
-            call_credentials,
-            compression,
-            wait_for_ready,
-            timeout,
-            metadata,
-            _registered_method=True)
-
-    @staticmethod
-    def GetPlaylistsBySong(request,
-            target,
-            options=(),
-            channel_credentials=None,
-            call_credentials=None,
-            insecure=False,
-            compression=None,
-            wait_for_ready=None,
-            timeout=None,
-            metadata=None):
-        return grpc.experimental.unary_unary(
-            request,
-            target,
-            '/demo.UserService/GetPlaylistsBySong',
-            demo__pb2.IdRequest.SerializeToString,
-            demo__pb2.PlaylistList.FromString,
-            options,
-            channel_credentials,
-            insecure,
-            call_credentials,
-            compression,
-            wait_for_ready,
-            timeout,
-            metadata,
-            _registered_method=True)
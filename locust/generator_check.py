@@ -0,0 +1,127 @@
+"""Self-check of the load generator: tells when the Locust process, not the
+service, is the bottleneck.
+
+While users run, a greenlet samples every PROBE_SECONDS
+
+- the gevent hub lag: how late a gevent.sleep() wakes up. Every simulated
+  user waits for the hub the same way, so this delay ends up, unchanged, in
+  the response times Locust records;
+- the CPU of this process (psutil, like Locust's own 90% warning), gRPC's
+  core threads included.
+
+When either stays over its limit for SUSTAIN_SECONDS it logs a warning, and
+at test stop the run gets a verdict (saturated when over a limit for at
+least SATURATED_SHARE of the time), written to <csv prefix>_generator.json
+when there is a prefix:
+
+    LOCUST_SELFCHECK          0 turns it off (default 1)
+    LOCUST_SELFCHECK_CPU      CPU % considered saturated (default 90)
+    LOCUST_SELFCHECK_LAG_MS   hub lag considered saturated (default 20)
+"""
+import json
+import os
+import time
+
+import gevent
+import psutil
+
+PROBE_SECONDS = 0.1
+SUSTAIN_SECONDS = 5
+# a warning at most this often while the condition lasts
+WARN_EVERY_SECONDS = 30
+# verdict at stop: over a limit for at least this share of the run
+SATURATED_SHARE = 0.1
+
+
+def enabled():
+    return os.getenv("LOCUST_SELFCHECK", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class GeneratorCheck:
+    def __init__(self, cpu_limit=None, lag_limit_ms=None):
+        self.cpu_limit = cpu_limit if cpu_limit is not None else float(os.getenv("LOCUST_SELFCHECK_CPU", "90"))
+        self.lag_limit_ms = (lag_limit_ms if lag_limit_ms is not None
+                             else float(os.getenv("LOCUST_SELFCHECK_LAG_MS", "20")))
+        self.process = psutil.Process()
+        self.lags_ms = []
+        self.cpu = []
+        self.saturated_seconds = 0.0
+        self.started = self.last_probe = None
+        self._greenlet = None
+
+    def start(self):
+        self.process.cpu_percent(None)  # the first reading only sets the reference
+        self.started = self.last_probe = time.perf_counter()
+        self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill(block=False)
+            self._greenlet = None
+
+    def _run(self):
+        over_since = None
+        last_warning = 0.0
+        next_cpu = time.perf_counter() + 1
+        cpu = 0.0
+        while True:
+            start = time.perf_counter()
+            gevent.sleep(PROBE_SECONDS)
+            now = time.perf_counter()
+            lag_ms = max(0.0, (now - start - PROBE_SECONDS) * 1000)
+            self.lags_ms.append(lag_ms)
+            self.last_probe = now
+            if now >= next_cpu:
+                cpu = self.process.cpu_percent(None)
+                self.cpu.append(cpu)
+                next_cpu = now + 1
+
+            if cpu >= self.cpu_limit or lag_ms >= self.lag_limit_ms:
+                over_since = over_since or now
+                self.saturated_seconds += now - start
+                if now - over_since >= SUSTAIN_SECONDS and now - last_warning >= WARN_EVERY_SECONDS:
+                    last_warning = now
+                    print(f"[Generator] Saturated for {now - over_since:.0f}s: CPU {cpu:.0f}%, "
+                          f"hub lag {lag_ms:.0f} ms. Response times include this delay; "
+                          f"use fewer users per process or more Locust workers.")
+            else:
+                over_since = None
+
+    def summary(self):
+        lag_p99 = _percentile(self.lags_ms, 0.99)
+        cpu_p90 = _percentile(self.cpu, 0.90)
+        elapsed = (self.last_probe - self.started) if self.started is not None else 0
+        share = self.saturated_seconds / elapsed if elapsed else 0.0
+        return {
+            "pid": os.getpid(),
+            "cpu_avg": sum(self.cpu) / len(self.cpu) if self.cpu else None,
+            "cpu_p90": cpu_p90,
+            "cpu_max": max(self.cpu, default=None),
+            "lag_ms_p50": _percentile(self.lags_ms, 0.50),
+            "lag_ms_p99": lag_p99,
+            "lag_ms_max": max(self.lags_ms, default=None),
+            "saturated_seconds": round(self.saturated_seconds, 1),
+            "saturated_share": round(share, 3),
+            "cpu_limit": self.cpu_limit,
+            "lag_limit_ms": self.lag_limit_ms,
+            # a lasting condition, not the spike while users spawn
+            "saturated": share >= SATURATED_SHARE,
+        }
+
+    def report(self, prefix=None):
+        s = self.summary()
+        verdict = "SATURATED: latencies include generator delay" if s["saturated"] else "ok"
+        fmt = lambda v: "-" if v is None else f"{v:.0f}"
+        print(f"[Generator] CPU avg {fmt(s['cpu_avg'])}% p90 {fmt(s['cpu_p90'])}%, hub lag p50 "
+              f"{fmt(s['lag_ms_p50'])} ms p99 {fmt(s['lag_ms_p99'])} ms max {fmt(s['lag_ms_max'])} ms: {verdict}")
+        if prefix:
+            with open(f"{prefix}_generator.json", "w") as f:
+                json.dump(s, f, indent=2)
+        return s
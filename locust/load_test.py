@@ -1,27 +1,38 @@
 # load_test.py
 import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import json
+import os
+import sys
 import requests
 import random
+from concurrent.futures import ThreadPoolExecutor
 from locust import HttpUser, User, task, between, events
+from locust.runners import MasterRunner
+
+import generator_check
+import service_metrics
 
+# common/ is mounted at /opt/shared/common in the locust container (see docker-compose.yaml)
+from common import tracing, transport
+
+# Stubs are compiled once at image build (see Dockerfile); importing them here
+# keeps worker start-up free of protoc runs.
 try:
-    from grpc_tools import protoc
-    protoc.main((
-        '',
-        '-I.',
-        '--python_out=.',
-        '--grpc_python_out=.',
-        'demo.proto',
-    ))
     import grpc
+    # grpcio is not gevent-aware: a blocking stub call would stall every user
+    # of the process until the reply arrives. init_gevent() makes the calls
+    # yield to the hub instead; it has to run before any channel exists.
+    if os.getenv("LOCUST_GRPC_GEVENT", "1").lower() not in ("0", "false", "no"):
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
     import demo_pb2
     import demo_pb2_grpc
     from grpc_health.v1 import health_pb2, health_pb2_grpc
 except ImportError as e:
-    print(f"[ERROR] Could not import grpc/protoc. Dependencies missing? {e}")
-    sys.exit(1)
-except Exception as e:
-    print(f"[ERROR] Failed to compile proto file. Is demo.proto in the locust folder? {e}")
+    print(f"[ERROR] Could not import grpc stubs. Were they compiled at image build? {e}")
     sys.exit(1)
 
 HOSTS = {
@@ -31,6 +42,23 @@ HOSTS = {
     "grpc": "grpc-api:50051"
 }
 
+# Prometheus endpoints of the Python services (common/metrics.py)
+METRICS_URLS = {
+    "graphql": "http://graphql-api:8000/metrics/",
+    "grpc": "http://grpc-api:9100/metrics",
+}
+
+# Discovery tuning. The cache file lives next to this locustfile, which is the
+# volume shared by master and workers in docker-compose.
+READY_TIMEOUT = float(os.getenv("LOCUST_READY_TIMEOUT", "50"))
+READY_GRACE = float(os.getenv("LOCUST_READY_GRACE", "3"))
+PROBE_DELAY = float(os.getenv("LOCUST_PROBE_DELAY", "1"))
+DISCOVERY_TTL = float(os.getenv("LOCUST_DISCOVERY_TTL", "60"))
+DISCOVERY_CACHE = os.getenv(
+    "LOCUST_DISCOVERY_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".active_services.json"),
+)
+
 def is_grpc_active(timeout=2):
     try:
         target = HOSTS["grpc"]
@@ -64,55 +92,193 @@ def is_service_active(service: str) -> bool:
     except requests.exceptions.RequestException:
         return False
 
-def detect_active_services(max_attempts=10, delay=5):
+def is_worker_process():
+    return "--worker" in sys.argv or os.getenv("LOCUST_MODE_WORKER", "").lower() in ("1", "true")
+
+def parse_active_override(value):
+    enabled = {s.strip().lower() for s in value.split(",") if s.strip()}
+    return {k: k in enabled for k in HOSTS}
+
+def read_discovery_cache(max_age=DISCOVERY_TTL):
+    try:
+        if time.time() - os.path.getmtime(DISCOVERY_CACHE) > max_age:
+            return None
+        with open(DISCOVERY_CACHE) as f:
+            cached = json.load(f)
+        return {k: bool(cached["active"].get(k)) for k in HOSTS}
+    except (OSError, ValueError, KeyError, AttributeError):
+        return None
+
+def write_discovery_cache(active, elapsed):
+    tmp_path = f"{DISCOVERY_CACHE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"active": active, "discovery_seconds": round(elapsed, 3)}, f)
+        os.replace(tmp_path, DISCOVERY_CACHE)
+    except OSError as e:
+        print(f"[Locust Init] Could not write discovery cache {DISCOVERY_CACHE}: {e}")
+
+def wait_for_service(service, deadline, first_ready):
+    """Polls one service until it answers, the deadline passes, or another
+    service came up more than READY_GRACE seconds ago (only one compose
+    profile normally runs, so the others will never answer)."""
+    while True:
+        if is_service_active(service):
+            print(f" >> {service} is active at {HOSTS[service]}")
+            first_ready.setdefault("at", time.monotonic())
+            return True
+
+        now = time.monotonic()
+        if now >= deadline:
+            return False
+        if "at" in first_ready and now - first_ready["at"] >= READY_GRACE:
+            return False
+        time.sleep(PROBE_DELAY)
+
+def detect_active_services(timeout=READY_TIMEOUT):
     print("[Locust Init] Starting service discovery...")
-    
-    for attempt in range(1, max_attempts + 1):
-        active = {}
-        for service in HOSTS.keys():
-            is_active = is_service_active(service)
-            active[service] = is_active
-            if is_active:
-                print(f" >> {service} is active at {HOSTS[service]}")
-            
-        if any(active.values()):
-            print("[Locust Init] Active services found!")
-            return active
-
-        if attempt < max_attempts:
-            print(f"[Locust Init] No services yet. Waiting {delay}s...")
-            time.sleep(delay)
-
-    print("[Locust Init] No services found after all attempts.")
-    return {k: False for k in HOSTS}
-
-ACTIVE_SERVICES = detect_active_services()
+    deadline = time.monotonic() + timeout
+    first_ready = {}
+
+    with ThreadPoolExecutor(max_workers=len(HOSTS)) as pool:
+        futures = {s: pool.submit(wait_for_service, s, deadline, first_ready) for s in HOSTS}
+        active = {s: f.result() for s, f in futures.items()}
+
+    if any(active.values()):
+        print("[Locust Init] Active services found!")
+    else:
+        print(f"[Locust Init] No services found after {timeout:.0f}s.")
+    return active
+
+def wait_for_master_discovery(timeout=READY_TIMEOUT):
+    """Workers reuse the master's discovery result instead of probing again."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        cached = read_discovery_cache()
+        if cached is not None:
+            return cached
+        time.sleep(PROBE_DELAY)
+    return None
+
+def resolve_active_services():
+    override = os.getenv("LOCUST_ACTIVE_SERVICES")
+    if override:
+        return parse_active_override(override), "env"
+
+    cached = wait_for_master_discovery() if is_worker_process() else read_discovery_cache()
+    if cached is not None:
+        return cached, "cache"
+
+    started = time.perf_counter()
+    active = detect_active_services()
+    if any(active.values()):
+        write_discovery_cache(active, time.perf_counter() - started)
+    return active, "probe"
+
+ACTIVE_SERVICES, DISCOVERY_SOURCE = resolve_active_services()
+STARTUP_SECONDS = time.perf_counter() - _IMPORT_STARTED
 print("Final active services:", ACTIVE_SERVICES)
+print(f"[Locust Init] Startup took {STARTUP_SECONDS:.2f}s (discovery source: {DISCOVERY_SOURCE})")
+
+# Service metrics: scraped at test start and stop (master/standalone only) and
+# stored next to the CSVs as <csv prefix>_metrics.prom (last scrape) and
+# <csv prefix>_metrics.csv (per method/phase summary of this run).
+_metrics_before = {}
+
+def _metrics_targets():
+    return {s: url for s, url in METRICS_URLS.items() if ACTIVE_SERVICES.get(s)}
+
+@events.test_start.add_listener
+def scrape_metrics_at_start(environment, **kwargs):
+    if is_worker_process():
+        return
+    for service, url in _metrics_targets().items():
+        try:
+            _metrics_before[service] = service_metrics.parse(service_metrics.scrape(url))
+        except Exception as e:
+            print(f"[Metrics] Could not scrape {url}: {e}")
+
+@events.test_stop.add_listener
+def scrape_metrics_at_stop(environment, **kwargs):
+    prefix = getattr(environment.parsed_options, "csv_prefix", None) if environment.parsed_options else None
+    if is_worker_process() or not prefix:
+        return
+    rows, raw = [], []
+    for service, url in _metrics_targets().items():
+        try:
+            text = service_metrics.scrape(url)
+        except Exception as e:
+            print(f"[Metrics] Could not scrape {url}: {e}")
+            continue
+        raw.append(text)
+        rows += service_metrics.summarize(_metrics_before.get(service, {}), service_metrics.parse(text))
+    if raw:
+        with open(f"{prefix}_metrics.prom", "w") as f:
+            f.write("".join(raw))
+    if rows:
+        service_metrics.write_csv(rows, f"{prefix}_metrics.csv")
+        print(f"[Metrics] Saved {len(rows)} rows to {prefix}_metrics.csv")
+
+# Generator self-check (generator_check.py): in every process that runs users,
+# warns when its CPU or gevent hub lag, not the service, limits the test.
+_generator_check = None
+
+@events.test_start.add_listener
+def start_generator_check(environment, **kwargs):
+    global _generator_check
+    if not generator_check.enabled() or isinstance(environment.runner, MasterRunner):
+        return
+    _generator_check = generator_check.GeneratorCheck()
+    _generator_check.start()
+
+@events.test_stop.add_listener
+def report_generator_check(environment, **kwargs):
+    global _generator_check
+    if _generator_check is None:
+        return
+    _generator_check.stop()
+    prefix = getattr(environment.parsed_options, "csv_prefix", None) if environment.parsed_options else None
+    _generator_check.report(prefix)
+    _generator_check = None
+
+# Tracing (TRACING=1, common/tracing.py): each request gets a client span whose
+# context is sent as a traceparent header / gRPC metadata entry. Only the
+# processes that generate load write spans.
+if "--master" not in sys.argv:
+    tracing.setup_tracing("locust")
+
+@events.test_stop.add_listener
+def flush_traces(environment, **kwargs):
+    tracing.flush()
 
 if ACTIVE_SERVICES.get("rest"):
     class RestApiUser(HttpUser):
         host = HOSTS["rest"]
         wait_time = between(1, 2)
 
+        def get(self, path):
+            with tracing.client_span(f"GET {path}", **{"url.path": path}) as (headers, _):
+                self.client.get(path, name=path, headers=headers)
+
         @task(1)
         def list_all_users(self):
-            self.client.get("/users", name="/users")
+            self.get("/users")
 
         @task(1)
         def list_all_songs(self):
-            self.client.get("/songs", name="/songs")
+            self.get("/songs")
 
         @task(2)
         def list_user_playlists(self):
-            self.client.get("/users/1/playlists", name="/users/1/playlists")
+            self.get("/users/1/playlists")
 
         @task(2)
         def list_playlist_songs(self):
-            self.client.get("/playlists/1/songs", name="/playlists/1/songs")
+            self.get("/playlists/1/songs")
 
         @task(2)
         def list_playlists_containing_song(self):
-            self.client.get("/playlists/search?songId=1", name="/playlists/search?songId=1")
+            self.get("/playlists/search?songId=1")
 
 if ACTIVE_SERVICES.get("soap"):
     class SoapApiUser(HttpUser):
@@ -132,7 +298,9 @@ if ACTIVE_SERVICES.get("soap"):
                     </demo:{request_name}>
                 </soapenv:Body>
             </soapenv:Envelope>"""
-            self.client.post("/ws", data=payload, headers=self.headers, name=f"SOAP: {request_name}")
+            with tracing.client_span(f"SOAP: {request_name}") as (trace_headers, _):
+                self.client.post("/ws", data=payload, headers={**self.headers, **trace_headers},
+                                 name=f"SOAP: {request_name}")
 
         @task(1)
         def list_users(self): 
@@ -163,35 +331,140 @@ if ACTIVE_SERVICES.get("soap"):
                 "<demo:songId>1</demo:songId>"
             )
 
+# Mixed read/write workload (gRPC and GraphQL, the services with playlist
+# edits): LOCUST_WRITE_SHARE of the tasks (default 0) are writes. The read
+# task weights are 10/20 rather than 1/2 so the share has 1% steps.
+READ_WEIGHT = 80  # sum of the read task weights of GraphqlApiUser / GrpcApiUser
+WRITE_SHARE = min(float(os.getenv("LOCUST_WRITE_SHARE", "0")), 0.99)
+WRITE_BATCH = int(os.getenv("LOCUST_WRITE_BATCH", "20"))  # songs per write
+USER_ID_MAX = int(os.getenv("LOCUST_USER_ID_MAX", "1000"))
+SONG_ID_MAX = int(os.getenv("LOCUST_SONG_ID_MAX", "5000"))
+# the playlist and the batch added to it draw from songs 2..SONG_ID_MAX without overlap
+WRITE_BATCH = min(WRITE_BATCH, (SONG_ID_MAX - 1) // 2)
+# share = w / (READ_WEIGHT + w)
+WRITE_WEIGHT = max(1, round(READ_WEIGHT * WRITE_SHARE / (1 - WRITE_SHARE))) if WRITE_SHARE > 0 else 0
+
+class PlaylistEdits:
+    """The writes of one simulated user. The first creates a playlist with
+    WRITE_BATCH random songs; the next ones alternately add another batch,
+    drawn from songs not in the playlist, and remove it again, so the tables
+    keep their size while the rows, their index entries and the dead tuples
+    keep changing. User 1 and song 1, the targets of the read tasks, are left
+    alone."""
+
+    def __init__(self):
+        self.playlist_id = None
+        self.songs = set()  # the songs the playlist was created with
+        self.added = None
+
+    def batch(self, exclude=()):
+        """WRITE_BATCH distinct songs, none of them in `exclude`."""
+        songs = set()
+        while len(songs) < WRITE_BATCH:
+            song = random.randint(2, SONG_ID_MAX)
+            if song not in exclude:
+                songs.add(song)
+        return sorted(songs)
+
+    def next(self):
+        """("create", user_id, name, song_ids) or ("add"/"remove", playlist_id, song_ids)."""
+        if self.playlist_id is None:
+            songs = self.batch()
+            self.songs = set(songs)
+            return "create", random.randint(2, USER_ID_MAX), f"locust {random.getrandbits(32):08x}", songs
+        if self.added is None:
+            # songs already there would be skipped by the insert and then
+            # removed, shrinking the playlist on every cycle
+            self.added = self.batch(exclude=self.songs)
+            return "add", self.playlist_id, self.added
+        removed, self.added = self.added, None
+        return "remove", self.playlist_id, removed
+
 if ACTIVE_SERVICES.get("graphql"):
     class GraphqlApiUser(HttpUser):
 
         host = HOSTS["graphql"]
         wait_time = between(1, 2)
 
-        def run_query(self, name, query):
-            self.client.post("/graphql", json={"query": query}, name=f"GQL: {name}")
+        def on_start(self):
+            self.edits = PlaylistEdits()
+            # requests already sends "gzip, deflate" (and "br" when brotli is installed)
+            accept_encoding = os.getenv("HTTP_ACCEPT_ENCODING")
+            if accept_encoding:
+                self.client.headers["Accept-Encoding"] = accept_encoding
 
-        @task(1)
+        def run_query(self, name, query):
+            with tracing.client_span(f"GQL: {name}", **{"graphql.document": query}) as (headers, _):
+                self.client.post("/graphql", json={"query": query}, headers=headers, name=f"GQL: {name}")
+
+        def run_mutation(self, name, query):
+            """Like run_query, but a reply with GraphQL errors counts as a failure."""
+            with tracing.client_span(f"GQL: {name}", **{"graphql.document": query}) as (headers, span):
+                with self.client.post("/graphql", json={"query": query}, headers=headers,
+                                      name=f"GQL: {name}", catch_response=True) as response:
+                    try:
+                        body = response.json()
+                    except ValueError:
+                        body = {}
+                    if body.get("errors") or not body.get("data"):
+                        message = (body.get("errors") or [{}])[0].get("message", response.text[:200])
+                        tracing.record_error(span, RuntimeError(message))
+                        response.failure(message)
+                        return None
+                    return body["data"]
+
+        @task(10)
         def list_users(self):
             self.run_query("List Users", "{ users { id name } }")
 
-        @task(1)
+        @task(10)
         def list_songs(self):
             self.run_query("List Songs", "{ songs { id title } }")
 
-        @task(2)
+        @task(20)
         def user_playlists(self):
             self.run_query("User Playlists", "{ userPlaylists(userId: 1) { id name } }")
 
-        @task(2)
+        @task(20)
         def playlist_songs(self):
             self.run_query("Playlist Songs", "{ playlistSongs(playlistId: 1) { id title } }")
 
-        @task(2)
+        @task(20)
         def playlists_by_song(self):
             self.run_query("Playlists by Song", "{ playlistsBySong(songId: 1) { id name } }")
 
+        @task(WRITE_WEIGHT)
+        def edit_playlist(self):
+            edits = self.edits
+            kind, *args = edits.next()
+            if kind == "create":
+                user_id, name, song_ids = args
+                data = self.run_mutation("Create Playlist", f'mutation {{ createPlaylist(userId: {user_id}, '
+                                         f'name: "{name}", songIds: {song_ids}) {{ playlistId rows }} }}')
+                if data:
+                    edits.playlist_id = data["createPlaylist"]["playlistId"]
+            else:
+                field = "addPlaylistSongs" if kind == "add" else "removePlaylistSongs"
+                playlist_id, song_ids = args
+                self.run_mutation("Add Playlist Songs" if kind == "add" else "Remove Playlist Songs",
+                                  f"mutation {{ {field}(playlistId: {playlist_id}, songIds: {song_ids}) {{ rows }} }}")
+
+# Channels shared by the gRPC users of this process, LOCUST_GRPC_CHANNELS of
+# them (default 4) handed out round-robin; 0 gives every user its own. Each
+# pooled channel gets its own subchannel pool, hence its own HTTP/2
+# connection: channels with equal arguments would otherwise share one.
+GRPC_CHANNELS = int(os.getenv("LOCUST_GRPC_CHANNELS", "4"))
+_grpc_channels = []
+_grpc_next_channel = 0
+
+def pooled_grpc_channel():
+    global _grpc_next_channel
+    if len(_grpc_channels) < GRPC_CHANNELS:
+        _grpc_channels.append(transport.grpc_channel(HOSTS["grpc"], options=[("grpc.use_local_subchannel_pool", 1)]))
+    channel = _grpc_channels[_grpc_next_channel % len(_grpc_channels)]
+    _grpc_next_channel += 1
+    return channel
+
 if ACTIVE_SERVICES.get("grpc"):
     class GrpcApiUser(User):
         host = HOSTS["grpc"]
@@ -209,56 +482,62 @@ if ACTIVE_SERVICES.get("grpc"):
 
         def on_start(self):
             self.address = HOSTS["grpc"]
-            self.channel = grpc.insecure_channel(self.address)
+            # GRPC_COMPRESSION and the channel options of common/transport.py
+            self.own_channel = GRPC_CHANNELS <= 0
+            self.channel = transport.grpc_channel(self.address) if self.own_channel else pooled_grpc_channel()
             self.stub = demo_pb2_grpc.UserServiceStub(self.channel)
+            self.edits = PlaylistEdits()
 
-        @task(1)
-        def get_all_users(self):
+        def call(self, name, request):
             start = time.time()
-            try:
-                response = self.stub.GetAllUsers(demo_pb2.Empty())
-                self.record_metrics("GetAllUsers", start, response=response)
-            except grpc.RpcError as e:
-                self.record_metrics("GetAllUsers", start, exception=e)
-        
-        @task(1)
+            with tracing.client_span(f"gRPC {name}", **{"rpc.method": name}) as (headers, span):
+                try:
+                    response = getattr(self.stub, name)(request, metadata=tuple(headers.items()))
+                    self.record_metrics(name, start, response=response)
+                    return response
+                except grpc.RpcError as e:
+                    tracing.record_error(span, e)
+                    self.record_metrics(name, start, exception=e)
+                    return None
+
+        @task(10)
+        def get_all_users(self):
+            self.call("GetAllUsers", demo_pb2.Empty())
+
+        @task(10)
         def get_all_songs(self):
-            start = time.time()
-            try:
-                response = self.stub.GetAllSongs(demo_pb2.Empty())
-                self.record_metrics("GetAllSongs", start, response=response)
-            except grpc.RpcError as e:
-                self.record_metrics("GetAllSongs", start, exception=e)
-        
-        @task(2)
+            self.call("GetAllSongs", demo_pb2.Empty())
+
+        @task(20)
         def get_user_playlists(self):
             uid = 1
-            start = time.time()
-            try:
-                response = self.stub.GetUserPlaylists(demo_pb2.IdRequest(id=uid))
-                self.record_metrics("GetUserPlaylists", start, response=response)
-            except grpc.RpcError as e:
-                self.record_metrics("GetUserPlaylists", start, exception=e)
-        
-        @task(2)
+            self.call("GetUserPlaylists", demo_pb2.IdRequest(id=uid))
+
+        @task(20)
         def get_playlist_songs(self):
             pid = 1
-            start = time.time()
-            try:
-                response = self.stub.GetPlaylistSongs(demo_pb2.IdRequest(id=pid))
-                self.record_metrics("GetPlaylistSongs", start, response=response)
-            except grpc.RpcError as e:
-                self.record_metrics("GetPlaylistSongs", start, exception=e)
-        
-        @task(2)
+            self.call("GetPlaylistSongs", demo_pb2.IdRequest(id=pid))
+
+        @task(20)
         def get_playlists_by_song(self):
             sid = 1
-            start = time.time()
-            try:
-                response = self.stub.GetPlaylistsBySong(demo_pb2.IdRequest(id=sid))
-                self.record_metrics("GetPlaylistsBySong", start, response=response)
-            except grpc.RpcError as e:
-                self.record_metrics("GetPlaylistsBySong", start, exception=e)
-        
+            self.call("GetPlaylistsBySong", demo_pb2.IdRequest(id=sid))
+
+        @task(WRITE_WEIGHT)
+        def edit_playlist(self):
+            edits = self.edits
+            kind, *args = edits.next()
+            if kind == "create":
+                user_id, name, song_ids = args
+                reply = self.call("CreatePlaylist",
+                                  demo_pb2.CreatePlaylistRequest(user_id=user_id, name=name, song_ids=song_ids))
+                if reply is not None:
+                    edits.playlist_id = reply.playlist_id
+            else:
+                playlist_id, song_ids = args
+                self.call("AddPlaylistSongs" if kind == "add" else "RemovePlaylistSongs",
+                          demo_pb2.PlaylistSongsRequest(playlist_id=playlist_id, song_ids=song_ids))
+
         def on_stop(self):
-            self.channel.close()
+            if self.own_channel:
+                self.channel.close()
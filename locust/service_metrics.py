@@ -0,0 +1,103 @@
+"""Scrapes the Prometheus metrics of the Python services around a Locust run.
+
+The services expose rpc_request_seconds and rpc_phase_seconds histograms
+(common/metrics.py). Their counters only grow, so the run is summarized as
+the difference between a scrape at test start and one at test stop: one row
+per service, method and phase (total, queue, db, build, encode) with count,
+mean and p50/p95/p99 estimated from the buckets, like histogram_quantile().
+"""
+import csv
+import re
+import requests
+
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})?\s+(\S+)')
+LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+PHASES = ["total", "queue", "db", "build", "encode"]
+FIELDS = ["service", "method", "phase", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"]
+
+
+def parse(text):
+    """{(name, ((label, value), ...)): float} for every sample line."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        m = SAMPLE_RE.match(line)
+        if not m:
+            continue
+        name, labels, value = m.groups()
+        key = tuple(sorted(LABEL_RE.findall(labels or "")))
+        samples[(name, key)] = float(value)
+    return samples
+
+
+def scrape(url, timeout=5):
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+
+def _quantile(q, buckets, count):
+    """Linear interpolation inside the bucket holding the q-th observation."""
+    if count <= 0:
+        return None
+    rank = q * count
+    prev_le, prev_count = 0.0, 0.0
+    for le, cum in buckets:
+        if cum >= rank:
+            if le == float("inf"):
+                return prev_le
+            if cum == prev_count:
+                return le
+            return prev_le + (le - prev_le) * (rank - prev_count) / (cum - prev_count)
+        prev_le, prev_count = le, cum
+    return prev_le
+
+
+def _histograms(samples, name):
+    """{labels without le: {"buckets": {le: n}, "sum": s, "count": n}}"""
+    out = {}
+    for (sample, labels), value in samples.items():
+        if sample == f"{name}_bucket":
+            le = dict(labels)["le"]
+            key = tuple(kv for kv in labels if kv[0] != "le")
+            out.setdefault(key, {"buckets": {}, "sum": 0.0, "count": 0.0})["buckets"][float(le)] = value
+        elif sample in (f"{name}_sum", f"{name}_count"):
+            out.setdefault(labels, {"buckets": {}, "sum": 0.0, "count": 0.0})[sample.rsplit("_", 1)[1]] = value
+    return out
+
+
+def summarize(before, after):
+    """Rows (dicts with FIELDS) for what happened between two scrapes."""
+    rows = []
+    for name in ("rpc_request_seconds", "rpc_phase_seconds"):
+        old = _histograms(before, name)
+        for labels, hist in _histograms(after, name).items():
+            base = old.get(labels, {"buckets": {}, "sum": 0.0, "count": 0.0})
+            count = hist["count"] - base["count"]
+            if count <= 0:
+                continue
+            buckets = sorted((le, n - base["buckets"].get(le, 0.0)) for le, n in hist["buckets"].items())
+            label = dict(labels)
+            row = {
+                "service": label.get("service", ""),
+                "method": label.get("method", ""),
+                "phase": label.get("phase", "total"),
+                "count": int(count),
+                "mean_ms": 1000 * (hist["sum"] - base["sum"]) / count,
+            }
+            for q in (0.5, 0.95, 0.99):
+                value = _quantile(q, buckets, count)
+                row[f"p{int(q * 100)}_ms"] = 1000 * value if value is not None else None
+            rows.append(row)
+    rows.sort(key=lambda r: (r["service"], r["method"], PHASES.index(r["phase"]) if r["phase"] in PHASES else 99))
+    return rows
+
+
+def write_csv(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: (f"{v:.3f}" if isinstance(v, float) else v) for k, v in row.items()})
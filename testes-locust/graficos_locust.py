@@ -1,5 +1,7 @@
 import os
 import re
+import sys
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
@@ -7,11 +9,10 @@ import numpy as np
 # =====================================================================
 # ARQUIVOS DE ENTRADA
 # =====================================================================
-CSV_FILES = [
-    "rest-50.csv", "soap-50.csv", "graphql-50.csv", "grpc-50.csv",
-    "rest-200.csv", "soap-200.csv", "graphql-200.csv", "grpc-200.csv",
-    "rest-500.csv", "soap-500.csv", "graphql-500.csv", "grpc-500.csv",
-]
+# <tech>-<usuarios>.csv de cada carga (run_benchmark.py --loads aceita qualquer
+# número de usuários); os -recursos.csv, -metricas.csv etc. ficam de fora
+CSV_PATTERN = re.compile(r"^(rest|soap|graphql|grpc)-(\d+)\.csv$")
+TECH_ORDER = ["rest", "soap", "graphql", "grpc"]
 
 TECH_LABEL = {
     "rest": "REST",
@@ -21,12 +22,27 @@ TECH_LABEL = {
 }
 
 # pasta do script
-BASE_DIR = os.path.dirname(__file__)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # subpasta para salvar TUDO
 OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-print("Saída será salva em:", OUTPUT_DIR)
+
+SUMMARY_FILE = "resumo_geral.csv"
+
+# ordem bonitinha das tecnologias no eixo X
+ALL_TECHS = ["REST", "SOAP", "GraphQL", "gRPC"]
+
+
+def locust_csvs(run_dir):
+    """(arquivo, tech, usuarios) dos CSVs do Locust da pasta, por carga e tecnologia."""
+    found = []
+    for fname in os.listdir(run_dir) if os.path.isdir(run_dir) else []:
+        m = CSV_PATTERN.match(fname)
+        if m:
+            found.append((fname, m.group(1), int(m.group(2))))
+    if not found:
+        print("[AVISO] Nenhum <tech>-<usuarios>.csv em:", run_dir)
+    return sorted(found, key=lambda f: (f[2], TECH_ORDER.index(f[1])))
 
 
 # =====================================================================
@@ -74,42 +90,127 @@ def summarize_locust_csv(path, tech, users):
     }
 
 
+# =====================================================================
+# RECURSOS (bench/resource_sampler.py) E MÉTRICAS DE EFICIÊNCIA
+# =====================================================================
+def summarize_resources(path):
+    """
+    Converte as amostras brutas do sampler (contadores acumulados) em médias
+    da execução. Vários alvos com o mesmo papel são somados a cada instante.
+    """
+    df = pd.read_csv(path)
+    out = {}
+
+    for role, prefix in (("service", ""), ("postgres", "pg_")):
+        part = df[df["role"] == role]
+        if part["timestamp"].nunique() < 2:
+            continue
+
+        per_ts = part.groupby("timestamp")[["cpu_seconds", "rss_bytes", "ctx_switches"]].sum()
+        elapsed = per_ts.index.max() - per_ts.index.min()
+
+        out[f"{prefix}cpu_cores"] = (per_ts["cpu_seconds"].iloc[-1] - per_ts["cpu_seconds"].iloc[0]) / elapsed
+        out[f"{prefix}rss_mb"] = per_ts["rss_bytes"].mean() / 2**20
+        out[f"{prefix}rss_mb_max"] = per_ts["rss_bytes"].max() / 2**20
+        out[f"{prefix}ctx_switches_s"] = (per_ts["ctx_switches"].iloc[-1] - per_ts["ctx_switches"].iloc[0]) / elapsed
+
+        # bytes na rede do contêiner do serviço (amostras antigas não têm as colunas)
+        if role == "service" and "net_tx_bytes" in part.columns and part["net_tx_bytes"].notna().all():
+            net = part.groupby("timestamp")[["net_rx_bytes", "net_tx_bytes"]].sum()
+            out["net_tx_bytes_s"] = (net["net_tx_bytes"].iloc[-1] - net["net_tx_bytes"].iloc[0]) / elapsed
+            out["net_rx_bytes_s"] = (net["net_rx_bytes"].iloc[-1] - net["net_rx_bytes"].iloc[0]) / elapsed
+
+        if role == "postgres":
+            conns = part.groupby("timestamp")["pg_connections"].sum()
+            out["pg_connections_avg"] = conns.mean()
+            out["pg_connections_max"] = conns.max()
+
+    return out
+
+
+# fases medidas dentro dos serviços Python (common/metrics.py)
+SERVER_PHASES = ["queue", "db", "build", "encode"]
+PHASE_LABEL = {
+    "queue": "Fila",
+    "db": "Banco",
+    "build": "Montagem dos objetos",
+    "encode": "Codificação",
+}
+
+
+def summarize_service_metrics(path):
+    """
+    Média de cada fase no servidor (ponderada pelo número de requisições de
+    cada método), a partir do <tech>-<usuarios>-metricas.csv do Locust.
+    """
+    df = pd.read_csv(path)
+    out = {}
+    for phase in ["total"] + SERVER_PHASES:
+        part = df[df["phase"] == phase]
+        if part.empty or part["count"].sum() == 0:
+            continue
+        out[f"srv_{phase}_ms"] = (part["mean_ms"] * part["count"]).sum() / part["count"].sum()
+    return out
+
+
+def add_efficiency_columns(summary_df):
+    if "cpu_cores" not in summary_df.columns:
+        return summary_df
+
+    df = summary_df.copy()
+    df["rps_per_core"] = df["rps"] / df["cpu_cores"]
+    if "pg_cpu_cores" in df.columns:
+        df["rps_per_core_total"] = df["rps"] / (df["cpu_cores"] + df["pg_cpu_cores"])
+    df["mem_mb_per_100rps"] = df["rss_mb"] / (df["rps"] / 100)
+    return df
+
+
 # =====================================================================
 # CARREGAR TODOS OS CSV E MONTAR RESUMO
 # =====================================================================
-rows = []
+def build_summary(run_dir):
+    rows = []
+
+    for fname, tech, users in locust_csvs(run_dir):
+        path = os.path.join(run_dir, fname)
+        row = summarize_locust_csv(path, tech, users)
 
-for fname in CSV_FILES:
-    path = os.path.join(BASE_DIR, fname)
-    if not os.path.exists(path):
-        print("[AVISO] Arquivo não encontrado:", fname)
-        continue
+        # amostras de CPU/memória gravadas ao lado do CSV do Locust, se houver
+        resources = os.path.join(run_dir, f"{tech}-{users}-recursos.csv")
+        if os.path.exists(resources):
+            row.update(summarize_resources(resources))
 
-    m = re.match(r"([a-zA-Z]+)-(\d+)\.csv", fname)
-    if not m:
-        print("[AVISO] Nome inesperado:", fname)
-        continue
+        # tempos por fase coletados dos serviços ao final da execução, se houver
+        metrics = os.path.join(run_dir, f"{tech}-{users}-metricas.csv")
+        if os.path.exists(metrics):
+            row.update(summarize_service_metrics(metrics))
 
-    tech = m.group(1).lower()
-    users = int(m.group(2))
-    rows.append(summarize_locust_csv(path, tech, users))
+        rows.append(row)
 
-summary_df = pd.DataFrame(rows)
-summary_df = summary_df.sort_values(["tech", "users"]).reset_index(drop=True)
+    summary_df = pd.DataFrame(rows)
+    if summary_df.empty:
+        return summary_df
+    summary_df = add_efficiency_columns(summary_df)
+    return summary_df.sort_values(["tech", "users"]).reset_index(drop=True)
 
-print("\n==== RESUMO GERAL ====")
-print(summary_df)
-print()
 
-# salva resumo em CSV
-summary_df.to_csv(os.path.join(OUTPUT_DIR, "resumo_geral.csv"), index=False)
-print("Resumo geral salvo em resumo_geral.csv")
+def load_summary(path):
+    """
+    Aceita um resumo_geral.csv ou uma pasta de execução
+    (com resumo_geral.csv pronto ou com os CSVs brutos do Locust).
+    """
+    if os.path.isdir(path):
+        ready = os.path.join(path, SUMMARY_FILE)
+        if os.path.exists(ready):
+            return pd.read_csv(ready)
+        return build_summary(path)
+    return pd.read_csv(path)
 
 
 # =====================================================================
 # 1) GRÁFICOS INDIVIDUAIS POR TECNOLOGIA (50/200/500)
 # =====================================================================
-def plot_metric_per_tech(df, tech_label, metric_col, ylabel, filename):
+def plot_metric_per_tech(df, tech_label, metric_col, ylabel, filename, output_dir=OUTPUT_DIR):
     subset = df[df["tech"] == tech_label].sort_values("users")
     if subset.empty:
         print(f"[AVISO] Sem dados para {tech_label}")
@@ -127,64 +228,43 @@ def plot_metric_per_tech(df, tech_label, metric_col, ylabel, filename):
     plt.grid(True, linestyle="--", alpha=0.5)
     plt.tight_layout()
 
-    output_path = os.path.join(OUTPUT_DIR, filename)
+    output_path = os.path.join(output_dir, filename)
     plt.savefig(output_path, dpi=300)
     plt.close()
     print("Gráfico salvo em:", output_path)
 
 
-for tech_label in summary_df["tech"].unique():
-    tech_key = tech_label.lower()
-
-    plot_metric_per_tech(
-        summary_df, tech_label,
-        "avg_ms", "Latência média (ms)",
-        f"{tech_key}_latencia_media.png"
-    )
-    plot_metric_per_tech(
-        summary_df, tech_label,
-        "p95_ms", "Latência p95 (ms)",
-        f"{tech_key}_latencia_p95.png"
-    )
-    plot_metric_per_tech(
-        summary_df, tech_label,
-        "rps", "RPS",
-        f"{tech_key}_rps.png"
-    )
-
-
 # =====================================================================
 # 2) GRÁFICOS COMPARATIVOS (todas as tecnologias juntas)
 #    → “os outros gráficos que comparam os 3”
 # =====================================================================
-
-# ordem bonitinha das tecnologias no eixo X
-all_techs = ["REST", "SOAP", "GraphQL", "gRPC"]
-# filtra só as que realmente existem no DF
-techs_present = [t for t in all_techs if t in summary_df["tech"].unique()]
-
-# cargas (50, 200, 500)
-cargas = sorted(summary_df["users"].unique())
-
-
-def plot_grouped_bar(metric_col, ylabel, title, filename):
+def plot_grouped_bar(df, metric_col, ylabel, title, filename, output_dir=OUTPUT_DIR, hlines=(),
+                     group_col="users", group_label="{} usuários"):
     """
     Gera gráfico de barras agrupadas:
       - eixo X: tecnologias
-      - barras: cada carga (50, 200, 500)
+      - barras: cada valor de group_col (padrão: cargas 50, 200, 500)
     """
+    # filtra só as tecnologias que realmente existem no DF
+    techs_present = [t for t in ALL_TECHS if t in df["tech"].unique()]
+    # cargas (50, 200, 500) ou outro agrupamento, na ordem em que aparecem
+    grupos = sorted(df[group_col].unique()) if group_col == "users" else list(df[group_col].unique())
+
     x = np.arange(len(techs_present))
     width = 0.2
 
     plt.figure(figsize=(10, 6))
 
-    for i, carga in enumerate(cargas):
-        subset = summary_df[summary_df["users"] == carga]
+    for i, grupo in enumerate(grupos):
+        subset = df[df[group_col] == grupo]
         # garante ordem das tecnologias
         subset = subset.set_index("tech").reindex(techs_present).reset_index()
         values = subset[metric_col].values
 
-        plt.bar(x + i * width, values, width=width, label=f"{carga} usuários")
+        plt.bar(x + i * width, values, width=width, label=group_label.format(grupo))
+
+    for y in hlines:
+        plt.axhline(y, color="red", linestyle="--", linewidth=1)
 
     plt.xticks(x + width, techs_present)
     plt.ylabel(ylabel)
@@ -193,32 +273,475 @@ def plot_grouped_bar(metric_col, ylabel, title, filename):
     plt.grid(axis="y", linestyle="--", alpha=0.5)
     plt.tight_layout()
 
-    output_path = os.path.join(OUTPUT_DIR, filename)
+    output_path = os.path.join(output_dir, filename)
     plt.savefig(output_path, dpi=300)
     plt.close()
     print("Gráfico comparativo salvo em:", output_path)
 
 
-# gráfico comparando tecnologias x cargas para cada métrica
-plot_grouped_bar(
-    metric_col="avg_ms",
-    ylabel="Latência média (ms)",
-    title="Latência média por tecnologia e carga",
-    filename="comparativo_latencia_media.png",
-)
-
-plot_grouped_bar(
-    metric_col="p95_ms",
-    ylabel="Latência p95 (ms)",
-    title="Latência p95 por tecnologia e carga",
-    filename="comparativo_latencia_p95.png",
-)
-
-plot_grouped_bar(
-    metric_col="rps",
-    ylabel="Requests por segundo (RPS)",
-    title="RPS por tecnologia e carga",
-    filename="comparativo_rps.png",
-)
-
-print("\n✅ Gráficos individuais + comparativos gerados em:", OUTPUT_DIR)
+def generate_report(run_dir, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    print("Saída será salva em:", output_dir)
+
+    summary_df = build_summary(run_dir)
+
+    print("\n==== RESUMO GERAL ====")
+    print(summary_df)
+    print()
+
+    # salva resumo em CSV
+    summary_df.to_csv(os.path.join(output_dir, SUMMARY_FILE), index=False)
+    print("Resumo geral salvo em", SUMMARY_FILE)
+
+    for tech_label in summary_df["tech"].unique():
+        tech_key = tech_label.lower()
+
+        plot_metric_per_tech(
+            summary_df, tech_label,
+            "avg_ms", "Latência média (ms)",
+            f"{tech_key}_latencia_media.png", output_dir
+        )
+        plot_metric_per_tech(
+            summary_df, tech_label,
+            "p95_ms", "Latência p95 (ms)",
+            f"{tech_key}_latencia_p95.png", output_dir
+        )
+        plot_metric_per_tech(
+            summary_df, tech_label,
+            "rps", "RPS",
+            f"{tech_key}_rps.png", output_dir
+        )
+
+    # gráfico comparando tecnologias x cargas para cada métrica
+    plot_grouped_bar(
+        summary_df,
+        metric_col="avg_ms",
+        ylabel="Latência média (ms)",
+        title="Latência média por tecnologia e carga",
+        filename="comparativo_latencia_media.png",
+        output_dir=output_dir,
+    )
+
+    plot_grouped_bar(
+        summary_df,
+        metric_col="p95_ms",
+        ylabel="Latência p95 (ms)",
+        title="Latência p95 por tecnologia e carga",
+        filename="comparativo_latencia_p95.png",
+        output_dir=output_dir,
+    )
+
+    plot_grouped_bar(
+        summary_df,
+        metric_col="rps",
+        ylabel="Requests por segundo (RPS)",
+        title="RPS por tecnologia e carga",
+        filename="comparativo_rps.png",
+        output_dir=output_dir,
+    )
+
+    if "rps_per_core" in summary_df.columns:
+        plot_efficiency(summary_df, output_dir)
+
+    if "srv_total_ms" in summary_df.columns:
+        plot_phase_breakdown(summary_df, output_dir)
+
+    print("\n✅ Gráficos individuais + comparativos gerados em:", output_dir)
+
+
+def plot_efficiency(summary_df, output_dir):
+    plot_grouped_bar(
+        summary_df,
+        metric_col="cpu_cores",
+        ylabel="CPU (cores)",
+        title="Uso de CPU do serviço por tecnologia e carga",
+        filename="comparativo_cpu_cores.png",
+        output_dir=output_dir,
+    )
+
+    plot_grouped_bar(
+        summary_df,
+        metric_col="rps_per_core",
+        ylabel="RPS por core",
+        title="RPS por core de CPU do serviço",
+        filename="comparativo_rps_por_core.png",
+        output_dir=output_dir,
+    )
+
+    if "rps_per_core_total" in summary_df.columns:
+        plot_grouped_bar(
+            summary_df,
+            metric_col="rps_per_core_total",
+            ylabel="RPS por core (serviço + Postgres)",
+            title="RPS por core de CPU (serviço + Postgres)",
+            filename="comparativo_rps_por_core_total.png",
+            output_dir=output_dir,
+        )
+
+    plot_grouped_bar(
+        summary_df,
+        metric_col="mem_mb_per_100rps",
+        ylabel="Memória (MB) por 100 RPS",
+        title="Memória residente por 100 RPS",
+        filename="comparativo_mem_por_100rps.png",
+        output_dir=output_dir,
+    )
+
+
+def plot_phase_breakdown(summary_df, output_dir):
+    """
+    Barras empilhadas com o tempo médio de cada fase no servidor
+    (fila, banco, montagem, codificação), uma figura por carga.
+    """
+    df = summary_df.dropna(subset=["srv_total_ms"])
+    for carga in sorted(df["users"].unique()):
+        subset = df[df["users"] == carga]
+        techs_present = [t for t in ALL_TECHS if t in subset["tech"].unique()]
+        subset = subset.set_index("tech").reindex(techs_present)
+        x = np.arange(len(techs_present))
+
+        plt.figure(figsize=(8, 6))
+        bottom = np.zeros(len(techs_present))
+        for phase in SERVER_PHASES:
+            col = f"srv_{phase}_ms"
+            if col not in subset.columns:
+                continue
+            values = subset[col].fillna(0).values
+            plt.bar(x, values, bottom=bottom, width=0.5, label=PHASE_LABEL[phase])
+            bottom += values
+
+        plt.xticks(x, techs_present)
+        plt.ylabel("Tempo médio no servidor (ms)")
+        plt.title(f"Composição do tempo no servidor ({carga} usuários)")
+        plt.legend()
+        plt.grid(axis="y", linestyle="--", alpha=0.5)
+        plt.tight_layout()
+
+        output_path = os.path.join(output_dir, f"fases_servidor_{carga}.png")
+        plt.savefig(output_path, dpi=300)
+        plt.close()
+        print("Gráfico de fases salvo em:", output_path)
+
+
+# =====================================================================
+# 3) MODO COMPARAÇÃO (gate de regressão contra um baseline)
+# =====================================================================
+# métrica -> (limite relativo padrão, True se "maior é pior")
+GATE_METRICS = {
+    "p95_ms": (0.10, True),
+    "avg_ms": (0.15, True),
+    "rps": (0.10, False),
+}
+
+# fator que transforma MAD em desvio padrão (distribuição normal)
+MAD_TO_SIGMA = 1.4826
+
+
+def aggregate_repetitions(summaries):
+    """
+    Junta várias repetições (uma por baseline/execução) em mediana
+    por tecnologia e carga, com o ruído relativo de cada métrica (MAD/mediana).
+    """
+    df = pd.concat(summaries, ignore_index=True)
+    metrics = list(GATE_METRICS) + ["failures"]
+    grouped = df.groupby(["tech", "users"])[metrics]
+
+    median = grouped.median()
+    mad = grouped.agg(lambda s: (s - s.median()).abs().median())
+    noise = (MAD_TO_SIGMA * mad / median.where(median != 0)).fillna(0.0)
+
+    out = median.copy()
+    for m in GATE_METRICS:
+        out[f"{m}_noise"] = noise[m]
+    out["reps"] = grouped.size()
+    return out
+
+
+def compare_summaries(baseline, current, thresholds, sigmas, min_abs_ms):
+    joined = baseline.join(current, how="inner", lsuffix="_base", rsuffix="_atual")
+
+    rows = []
+    for (tech, users), r in joined.iterrows():
+        row = {"tech": tech, "users": users}
+        status = []
+
+        for metric, (_, higher_is_worse) in GATE_METRICS.items():
+            base, cur = r[f"{metric}_base"], r[f"{metric}_atual"]
+            delta = (cur - base) / base if base else 0.0
+
+            # tolerância = max(limite configurado, k * ruído combinado das duas amostras)
+            noise = np.hypot(r[f"{metric}_noise_base"], r[f"{metric}_noise_atual"])
+            tolerance = max(thresholds[metric], sigmas * noise)
+
+            worse = delta if higher_is_worse else -delta
+            if metric.endswith("_ms") and abs(cur - base) < min_abs_ms:
+                worse = 0.0
+
+            row[f"{metric}_base"] = base
+            row[f"{metric}_atual"] = cur
+            row[f"{metric}_delta_pct"] = 100 * delta
+            row[f"{metric}_tol_pct"] = 100 * tolerance
+            if worse > tolerance:
+                status.append(f"{metric}↑" if higher_is_worse else f"{metric}↓")
+
+        row["failures_base"] = int(r["failures_base"])
+        row["failures_atual"] = int(r["failures_atual"])
+        if r["failures_atual"] > r["failures_base"]:
+            status.append("failures↑")
+
+        row["regressao"] = bool(status)
+        row["motivo"] = ",".join(status)
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def run_comparison(args):
+    output_dir = args.saida or os.path.join(OUTPUT_DIR, "comparacao")
+    os.makedirs(output_dir, exist_ok=True)
+
+    baseline = aggregate_repetitions([load_summary(p) for p in args.comparar])
+    current = aggregate_repetitions([load_summary(p) for p in args.atual])
+
+    thresholds = {
+        "p95_ms": args.limite_p95,
+        "avg_ms": args.limite_media,
+        "rps": args.limite_rps,
+    }
+    delta_df = compare_summaries(baseline, current, thresholds, args.sigmas, args.min_abs_ms)
+    if delta_df.empty:
+        print("[ERRO] Nenhuma combinação tecnologia/carga em comum entre baseline e atual.")
+        return 2
+
+    delta_df.to_csv(os.path.join(output_dir, "delta.csv"), index=False)
+
+    compact = delta_df[[
+        "tech", "users",
+        "p95_ms_base", "p95_ms_atual", "p95_ms_delta_pct",
+        "rps_base", "rps_atual", "rps_delta_pct",
+        "motivo",
+    ]]
+    print("\n==== DELTA vs BASELINE ====")
+    print(compact.to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+    print()
+
+    plot_grouped_bar(
+        delta_df,
+        metric_col="p95_ms_delta_pct",
+        ylabel="Δ p95 (%)",
+        title="Variação da latência p95 vs baseline",
+        filename="delta_latencia_p95.png",
+        output_dir=output_dir,
+        hlines=(100 * args.limite_p95,),
+    )
+    plot_grouped_bar(
+        delta_df,
+        metric_col="avg_ms_delta_pct",
+        ylabel="Δ latência média (%)",
+        title="Variação da latência média vs baseline",
+        filename="delta_latencia_media.png",
+        output_dir=output_dir,
+        hlines=(100 * args.limite_media,),
+    )
+    plot_grouped_bar(
+        delta_df,
+        metric_col="rps_delta_pct",
+        ylabel="Δ RPS (%)",
+        title="Variação de RPS vs baseline",
+        filename="delta_rps.png",
+        output_dir=output_dir,
+        hlines=(-100 * args.limite_rps,),
+    )
+
+    regressions = delta_df[delta_df["regressao"]]
+    if not regressions.empty:
+        print(f"❌ {len(regressions)} regressão(ões) detectada(s):")
+        for _, r in regressions.iterrows():
+            print(f"   {r['tech']} @ {r['users']} usuários: {r['motivo']}")
+        return 1
+
+    print("✅ Nenhuma regressão acima dos limites.")
+    return 0
+
+
+# =====================================================================
+# VARIANTES (esquema do banco, tamanho do pool de conexões...)
+# =====================================================================
+def summarize_endpoints(run_dir):
+    """p50, p95, média e número de requisições por endpoint de cada
+    <tech>-<users>.csv da pasta."""
+    rows = []
+    for fname, tech, users in locust_csvs(run_dir):
+        df = pd.read_csv(os.path.join(run_dir, fname))
+        df = df[df["Name"] != "Aggregated"]
+        col_avg = next(c for c in df.columns if "Average" in c and "Time" in c)
+        col_req = next(c for c in df.columns if "Request Count" in c or "# Requests" in c)
+        for _, r in df.iterrows():
+            rows.append({
+                "tech": TECH_LABEL.get(tech, tech),
+                "users": users,
+                "endpoint": r["Name"],
+                "requests": int(r[col_req]),
+                "avg_ms": float(r[col_avg]),
+                "p50_ms": float(r["50%"]),
+                "p95_ms": float(r["95%"]),
+            })
+    return pd.DataFrame(rows)
+
+
+# endpoints de edição de playlist e de leitura das músicas da playlist (locust/load_test.py)
+WRITE_ENDPOINTS = {"CreatePlaylist", "AddPlaylistSongs", "RemovePlaylistSongs",
+                   "GQL: Create Playlist", "GQL: Add Playlist Songs", "GQL: Remove Playlist Songs"}
+PLAYLIST_READ_ENDPOINTS = {"GetPlaylistSongs", "GQL: Playlist Songs"}
+
+
+def plot_playlist_reads(ep_df, output_dir):
+    """Latência da leitura de playlist por variante, com a parcela de escritas
+    medida, quando alguma variante tem escritas."""
+    writes = ep_df[ep_df["endpoint"].isin(WRITE_ENDPOINTS)]
+    if writes.empty:
+        return
+
+    keys = ["variante", "tech", "users"]
+    total = ep_df.groupby(keys, sort=False)["requests"].sum()
+    escritas = writes.groupby(keys, sort=False)["requests"].sum().reindex(total.index, fill_value=0)
+    reads = ep_df[ep_df["endpoint"].isin(PLAYLIST_READ_ENDPOINTS)].set_index(keys)
+    reads = reads.join((100 * escritas / total).rename("escritas_pct")).reset_index()
+
+    reads.to_csv(os.path.join(output_dir, "variantes_leitura_playlist.csv"), index=False)
+    print("\n==== LEITURA DE PLAYLIST x ESCRITAS ====")
+    print(reads[["variante", "tech", "users", "escritas_pct", "p50_ms", "p95_ms"]].to_string(
+        index=False, float_format=lambda v: f"{v:.1f}"))
+    print()
+
+    for carga in sorted(reads["users"].unique()):
+        subset = reads[reads["users"] == carga]
+        for col, label in [("p50_ms", "p50"), ("p95_ms", "p95")]:
+            plot_grouped_bar(subset, col, f"Latência {label} (ms)",
+                             f"Leitura de playlist, {label} por variante ({carga} usuários)",
+                             f"variantes_leitura_playlist_{label}_{carga}.png", output_dir,
+                             group_col="variante", group_label="{}")
+
+
+def run_variants(args):
+    """
+    Compara execuções da mesma bateria com configurações diferentes (esquema
+    do banco, pool de conexões, compressão e opções de transporte, parcela
+    de escritas). A primeira pasta é a referência. O custo de CPU por
+    requisição é separado em lado do banco (Postgres) e lado do protocolo
+    (serviço), quando há amostras de recursos. Com escritas na carga
+    (bench/run_benchmark.py --write-shares), mostra também a latência da
+    leitura de playlist em cada variante.
+    """
+    output_dir = args.saida or os.path.join(OUTPUT_DIR, "variantes")
+    os.makedirs(output_dir, exist_ok=True)
+
+    summaries, endpoints = [], []
+    for path in args.variantes:
+        name = os.path.basename(os.path.normpath(path))
+        df = load_summary(path)
+        if df.empty:
+            print("[AVISO] Sem dados em:", path)
+            continue
+        df.insert(0, "variante", name)
+        summaries.append(df)
+        ep = summarize_endpoints(path)
+        if not ep.empty:
+            ep.insert(0, "variante", name)
+            endpoints.append(ep)
+
+    if len(summaries) < 2:
+        print("[ERRO] Preciso de pelo menos duas variantes com dados.")
+        return 2
+
+    df = pd.concat(summaries, ignore_index=True)
+    if "cpu_cores" in df.columns:
+        df["cpu_servico_ms_req"] = 1000 * df["cpu_cores"] / df["rps"]
+    if "pg_cpu_cores" in df.columns:
+        df["cpu_banco_ms_req"] = 1000 * df["pg_cpu_cores"] / df["rps"]
+    # enviado pelo serviço (respostas + consultas ao Postgres): mostra o efeito da compressão
+    if "net_tx_bytes_s" in df.columns:
+        df["kb_enviados_req"] = df["net_tx_bytes_s"] / df["rps"] / 1024
+
+    reference = df[df["variante"] == df["variante"].iloc[0]].set_index(["tech", "users"])
+    for col in ["p95_ms", "avg_ms", "rps", "cpu_servico_ms_req", "cpu_banco_ms_req", "kb_enviados_req"]:
+        if col in df.columns:
+            base = df.set_index(["tech", "users"]).index.map(reference[col].to_dict())
+            df[f"{col}_delta_pct"] = 100 * (df[col].values - base) / base
+
+    df.to_csv(os.path.join(output_dir, "variantes.csv"), index=False)
+    if endpoints:
+        ep_df = pd.concat(endpoints, ignore_index=True)
+        ep_df.pivot_table(index=["tech", "users", "endpoint"], columns="variante",
+                          values="p95_ms", sort=False).to_csv(
+            os.path.join(output_dir, "variantes_endpoints_p95.csv"))
+
+    cols = [c for c in ["variante", "tech", "users", "p95_ms", "p95_ms_delta_pct", "rps",
+                        "cpu_servico_ms_req", "cpu_banco_ms_req", "kb_enviados_req"] if c in df.columns]
+    print("\n==== VARIANTES ====")
+    print(df[cols].to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    print()
+
+    # um conjunto de gráficos por carga (ex.: 200 e 500 usuários)
+    for carga in sorted(df["users"].unique()):
+        subset = df[df["users"] == carga]
+        plot_grouped_bar(subset, "p95_ms", "Latência p95 (ms)", f"p95 por variante ({carga} usuários)",
+                         f"variantes_p95_{carga}.png", output_dir, group_col="variante", group_label="{}")
+        plot_grouped_bar(subset, "rps", "Requisições/s", f"RPS por variante ({carga} usuários)",
+                         f"variantes_rps_{carga}.png", output_dir, group_col="variante", group_label="{}")
+        for col, label in [("cpu_servico_ms_req", "CPU do serviço (ms/req)"),
+                           ("cpu_banco_ms_req", "CPU do Postgres (ms/req)"),
+                           ("kb_enviados_req", "Enviado pelo serviço (KB/req)")]:
+            if col in subset.columns:
+                plot_grouped_bar(subset, col, label, f"{label} por variante ({carga} usuários)",
+                                 f"variantes_{col}_{carga}.png", output_dir,
+                                 group_col="variante", group_label="{}")
+    if endpoints:
+        plot_playlist_reads(ep_df, output_dir)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Resume os CSVs do Locust e gera gráficos; com --comparar, "
+                    "age como gate de regressão contra um baseline."
+    )
+    parser.add_argument("--dados", default=BASE_DIR,
+                        help="pasta com os CSVs do Locust (padrão: pasta do script)")
+    parser.add_argument("--saida", default=None,
+                        help="pasta de saída (padrão: outputs/ ou outputs/comparacao/)")
+    parser.add_argument("--comparar", nargs="+", metavar="BASELINE",
+                        help="resumo_geral.csv ou pasta de execução do baseline (várias = repetições)")
+    parser.add_argument("--atual", nargs="+", metavar="EXECUCAO",
+                        help="resumo_geral.csv ou pasta da execução nova (padrão: --dados)")
+    parser.add_argument("--limite-p95", type=float, default=GATE_METRICS["p95_ms"][0],
+                        help="piora relativa máxima do p95 (0.10 = 10%%)")
+    parser.add_argument("--limite-media", type=float, default=GATE_METRICS["avg_ms"][0],
+                        help="piora relativa máxima da latência média")
+    parser.add_argument("--limite-rps", type=float, default=GATE_METRICS["rps"][0],
+                        help="queda relativa máxima de RPS")
+    parser.add_argument("--sigmas", type=float, default=2.0,
+                        help="quantos desvios de ruído (MAD das repetições) toleram antes de acusar regressão")
+    parser.add_argument("--min-abs-ms", type=float, default=2.0,
+                        help="ignora variações de latência menores que isso em ms")
+    parser.add_argument("--variantes", nargs="+", metavar="PASTA",
+                        help="pastas de execução por variante (esquema, pool...); a primeira é a referência")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.comparar:
+        args.atual = args.atual or [args.dados]
+        return run_comparison(args)
+
+    if args.variantes:
+        return run_variants(args)
+
+    generate_report(args.dados, args.saida or OUTPUT_DIR)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())